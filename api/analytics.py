@@ -0,0 +1,209 @@
+# Campaign analytics over a columnar copy of the email log. New emails and
+# events are appended to Parquet part files, so an export only reads rows
+# written since the last one. Exports run in the background (AnalyticsExporter)
+# and queries only read the parts. Aggregations are pyarrow group-bys over the few
+# dimension columns they need; subjects, bodies and details are never
+# exported. pyarrow is optional and imported on first use.
+import os
+import sys
+import threading
+from typing import Dict, List, Optional
+from .utils import get_email_connection
+
+ANALYTICS_DIR = os.getenv("ANALYTICS_DIR", "./analytics")
+ANALYTICS_EXPORT_BATCH_SIZE = int(os.getenv("ANALYTICS_EXPORT_BATCH_SIZE", "50000"))
+# Seconds between background exports; 0 leaves exporting to `python -m api.analytics export`.
+ANALYTICS_EXPORT_INTERVAL = float(os.getenv("ANALYTICS_EXPORT_INTERVAL", "60"))
+
+ANALYTICS_DIMENSIONS = ('email_type', 'recipient_company', 'recipient_role', 'sender', 'day')
+ANALYTICS_METRICS = ('generated', 'queued', 'sent', 'failed', 'bounced')
+
+# Dataset -> query for the rows after a given ID. Legacy CSV rows were marked
+# sent without an event, which legacy_sent keeps.
+EXPORT_QUERIES = {
+    'emails': (
+        "SELECT id, substr(timestamp, 1, 10) AS day, coalesce(user_email, '') AS sender, "
+        "coalesce(recipient_company, '') AS recipient_company, coalesce(recipient_role, '') AS recipient_role, "
+        "coalesce(email_type, '') AS email_type, variant_group, variant, "
+        "(sent = 1 AND NOT EXISTS (SELECT 1 FROM email_events ev WHERE ev.email_id = e.id AND ev.event = 'sent')) AS legacy_sent "
+        "FROM emails e WHERE id > ? ORDER BY id LIMIT ?"
+    ),
+    'events': "SELECT id, email_id, event FROM email_events WHERE id > ? AND event != 'generated' ORDER BY id LIMIT ?",
+}
+
+_export_lock = threading.Lock()
+# Held only while parts are swapped or read, so a query never waits on an export's SQLite scan.
+_parts_lock = threading.Lock()
+
+class AnalyticsUnavailable(RuntimeError):
+    pass
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.dataset
+        import pyarrow.parquet
+    except ImportError:
+        raise AnalyticsUnavailable("Analytics needs pyarrow: pip install pyarrow")
+    return pyarrow
+
+def _schemas(pa):
+    string = pa.string()
+    return {
+        'emails': pa.schema([
+            ('id', pa.int64()), ('day', string), ('sender', string), ('recipient_company', string), ('recipient_role', string),
+            ('email_type', string), ('variant_group', string), ('variant', pa.int64()), ('legacy_sent', pa.bool_()),
+        ]),
+        'events': pa.schema([('id', pa.int64()), ('email_id', pa.int64()), ('event', string)]),
+    }
+
+def _parts(path) -> List[str]:
+    """Part files in ID order. A part rewritten with more rows replaces the
+    one it grew from; a leftover of the smaller one is ignored."""
+    if not os.path.isdir(path):
+        return []
+    latest = {}
+    for name in sorted(os.listdir(path)):
+        if name.startswith("part-") and name.endswith(".parquet"):
+            latest[name.split("-")[1]] = name
+    return sorted(latest.values())
+
+def _last_id(part):
+    return int(part[:-len(".parquet")].split("-")[2])
+
+def _export(pa, conn, name, directory, batch_size) -> int:
+    schema = _schemas(pa)[name]
+    path = os.path.join(directory, name)
+    os.makedirs(path, exist_ok=True)
+    exported = 0
+    while True:
+        # The part names are the watermark: every row up to the last part's last ID is exported.
+        parts = _parts(path)
+        tail_rows = pa.parquet.read_metadata(os.path.join(path, parts[-1])).num_rows if parts else batch_size
+        if tail_rows >= batch_size:
+            tail_rows = 0
+        rows = conn.execute(EXPORT_QUERIES[name], (_last_id(parts[-1]) if parts else 0, batch_size - tail_rows)).fetchall()
+        if not rows:
+            return exported
+        tail = pa.parquet.read_table(os.path.join(path, parts[-1]), schema=schema) if tail_rows else None
+        # SQLite has no boolean type; the cast turns legacy_sent's 0/1 into one.
+        table = pa.table({column: [row[column] for row in rows] for column in schema.names}).cast(schema)
+        # A partly filled last part is rewritten with the new rows rather
+        # than followed by another small file.
+        if tail is not None:
+            table = pa.concat_tables([tail, table])
+        part = f"part-{table['id'][0].as_py():012d}-{rows[-1]['id']:012d}.parquet"
+        # Dot-prefixed files are never picked up as parts, even half written.
+        temp_path = os.path.join(path, f".{part}.tmp")
+        pa.parquet.write_table(table, temp_path)
+        with _parts_lock:
+            os.replace(temp_path, os.path.join(path, part))
+            if tail is not None:
+                os.remove(os.path.join(path, parts[-1]))
+        exported += len(rows)
+
+def export_analytics(directory: str = ANALYTICS_DIR, batch_size: int = ANALYTICS_EXPORT_BATCH_SIZE) -> Dict[str, int]:
+    """Append emails and events written since the last export; returns rows exported per dataset."""
+    pa = _pyarrow()
+    conn = get_email_connection()
+    with _export_lock:
+        return {name: _export(pa, conn, name, directory, batch_size) for name in EXPORT_QUERIES}
+
+class AnalyticsExporter:
+    """Background thread that periodically exports new emails and events."""
+
+    def __init__(self, interval: float = ANALYTICS_EXPORT_INTERVAL, directory: str = ANALYTICS_DIR):
+        self.interval = interval
+        self.directory = directory
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="analytics-exporter", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while self.run_once() and not self._stop.wait(self.interval):
+            pass
+
+    def run_once(self) -> bool:
+        """Export once; False when analytics are unavailable and there is nothing to keep doing."""
+        try:
+            export_analytics(self.directory)
+        except AnalyticsUnavailable:
+            return False
+        except Exception as e:
+            print(f"Error exporting analytics: {e}")
+        return True
+
+def _read(pa, directory, name, columns, condition=None):
+    schema = _schemas(pa)[name]
+    path = os.path.join(directory, name)
+    parts = [os.path.join(path, part) for part in _parts(path)]
+    dataset = pa.dataset.dataset(parts, format="parquet", schema=schema) if parts else pa.dataset.dataset(schema.empty_table())
+    return dataset.to_table(columns=columns, filter=condition)
+
+def query_analytics(group_by: List[str], since: Optional[str] = None, until: Optional[str] = None,
+                    limit: Optional[int] = None, directory: str = ANALYTICS_DIR) -> List[Dict]:
+    """Email counts per combination of ``group_by`` dimensions.
+
+    Each row holds the dimension values, a count of emails per metric in
+    ``ANALYTICS_METRICS`` and the sent rate. Emails are attributed to the
+    day they were generated; ``since``/``until`` are inclusive YYYY-MM-DD
+    bounds on that day. Rows are ordered by emails generated, most first.
+    Counts cover what has been exported, so they trail the email log by up
+    to ``ANALYTICS_EXPORT_INTERVAL``.
+    """
+    unknown = set(group_by) - set(ANALYTICS_DIMENSIONS)
+    if unknown:
+        raise ValueError(f"Unknown analytics dimensions: {', '.join(sorted(unknown))}")
+    group_by = list(dict.fromkeys(group_by))
+    pa = _pyarrow()
+    pc = pa.compute
+
+    day = pa.dataset.field('day')
+    condition = None
+    for bound in ((day >= since) if since else None, (day <= until) if until else None):
+        if bound is not None:
+            condition = bound if condition is None else condition & bound
+    # Parts are only swapped under the lock, so a read never sees one twice.
+    with _parts_lock:
+        emails = _read(pa, directory, 'emails', ['id', 'legacy_sent'] + group_by, condition)
+        events = _read(pa, directory, 'events', ['email_id', 'event'])
+
+    # Joins need a key, so the overall total groups by a constant column.
+    keys = group_by or ['_all']
+    if not group_by:
+        emails = emails.append_column('_all', pa.array([0] * emails.num_rows, pa.int8()))
+    dimensions = emails.select(['id'] + keys)
+    legacy = emails.filter(emails['legacy_sent'])
+    events = pa.concat_tables([
+        events,
+        pa.table({'email_id': legacy['id'], 'event': pa.array(['sent'] * legacy.num_rows, pa.string())}),
+    ])
+    by_event = (
+        events.join(dimensions, keys='email_id', right_keys='id', join_type='inner')
+        .group_by(keys + ['event'])
+        .aggregate([('email_id', 'count_distinct')])
+    )
+    table = dimensions.group_by(keys).aggregate([('id', 'count')]).rename_columns(keys + ['generated'])
+    for metric in ANALYTICS_METRICS[1:]:
+        counts = by_event.filter(pc.equal(by_event['event'], metric)).select(keys + ['email_id_count_distinct'])
+        table = table.join(counts.rename_columns(keys + [metric]), keys=keys, join_type='left outer')
+        table = table.set_column(table.schema.get_field_index(metric), metric, pc.fill_null(table[metric], 0))
+    generated = pc.cast(table['generated'], pa.float64())
+    table = table.append_column('sent_rate', pc.round(pc.divide(pc.cast(table['sent'], pa.float64()), generated), 4))
+    table = table.sort_by([('generated', 'descending')] + [(key, 'ascending') for key in keys])
+    if limit:
+        table = table.slice(0, limit)
+    return table.select(group_by + list(ANALYTICS_METRICS) + ['sent_rate']).to_pylist()
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["export"]:
+        sys.exit("usage: python -m api.analytics export")
+    print(export_analytics())
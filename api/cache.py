@@ -0,0 +1,109 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+from .storage import get_connection
+
+GENERATION_CACHE_ENABLED = os.getenv("GENERATION_CACHE_ENABLED", "true").lower() != "false"
+GENERATION_CACHE_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_MAX_ENTRIES", "1024"))
+GENERATION_CACHE_DISK_MAX_ENTRIES = int(os.getenv("GENERATION_CACHE_DISK_MAX_ENTRIES", "100000"))
+# Trim the disk tier once every this many writes rather than on each one.
+DISK_PRUNE_INTERVAL = 100
+
+def _normalize(value):
+    if isinstance(value, str):
+        return " ".join(value.split())
+    return value
+
+def cache_key(prompt_variables: Dict, model_name: str) -> str:
+    """Hash the prompt variables (whitespace-normalized) together with the model name."""
+    payload = {key: _normalize(value) for key, value in prompt_variables.items()}
+    encoded = json.dumps({"model": model_name, "prompt": payload}, sort_keys=True, default=str)
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
+class GenerationCache:
+    """Two-tier cache of generated emails: an in-process LRU over a SQLite table."""
+
+    def __init__(self, max_entries=GENERATION_CACHE_MAX_ENTRIES, disk_max_entries=GENERATION_CACHE_DISK_MAX_ENTRIES, enabled=GENERATION_CACHE_ENABLED):
+        self.max_entries = max_entries
+        self.disk_max_entries = disk_max_entries
+        self.enabled = enabled
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return value
+        row = get_connection().execute("SELECT value FROM generation_cache WHERE key = ?", (key,)).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.disk_hits += 1
+        value = json.loads(row[0])
+        self._remember(key, value)
+        return value
+
+    def set(self, key: str, value: Dict, model_name: str = ""):
+        if not self.enabled:
+            return
+        self._remember(key, value)
+        conn = get_connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO generation_cache (key, model, value, created_at) VALUES (?, ?, ?, ?)",
+                (key, model_name, json.dumps(value), time.time()),
+            )
+        with self._lock:
+            self._writes += 1
+            prune = self._writes % DISK_PRUNE_INTERVAL == 0
+        if prune:
+            self._prune_disk()
+
+    def _remember(self, key, value):
+        with self._lock:
+            self._memory[key] = value
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _prune_disk(self):
+        conn = get_connection()
+        with conn:
+            conn.execute(
+                "DELETE FROM generation_cache WHERE key IN (SELECT key FROM generation_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                (self.disk_max_entries,),
+            )
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+        conn = get_connection()
+        with conn:
+            conn.execute("DELETE FROM generation_cache")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+            }
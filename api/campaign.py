@@ -0,0 +1,192 @@
+# Campaign mode: recipients who share an industry, role, email type and
+# sender get one skeleton email from the model, with placeholder slots that
+# are filled in locally per recipient. Model calls scale with the number of
+# segments rather than the number of recipients.
+import asyncio
+import re
+from collections import OrderedDict
+from datetime import datetime
+from functools import partial
+from .email_generator import (
+    GENERATION_MAX_CONCURRENCY, PERSONALIZATION_MAX_TOKENS, PERSONALIZATION_MODEL_NAME, build_chain_input, cache_lookup, cache_store,
+    chain_call, estimated_tokens, generation_cache, get_email_generation_chain, get_personalization_model, get_resource, instrumented, model_route,
+)
+from .cache import cache_key
+from .rate_limit import get_llm_limiter
+from .routing import model_router
+
+# Slot name -> recipient field it is filled from. The paragraph slot is
+# written per recipient (see ``personalize``).
+RECIPIENT_SLOTS = {
+    "recipient_name": "name",
+    "recipient_company": "company",
+    "recipient_role": "role",
+}
+PARAGRAPH_SLOT = "personalized_paragraph"
+SLOT_RE = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+FILLED_FIELDS = ("subject", "body", "greeting", "closing")
+
+SKELETON_INSTRUCTIONS = """
+    This email is a template for every {role} in this segment. Refer to the recipient only through the
+    placeholders {{{{recipient_name}}}}, {{{{recipient_company}}}} and {{{{recipient_role}}}}, written exactly like that,
+    and put a line containing only {{{{personalized_paragraph}}}} where a recipient-specific sentence belongs.
+"""
+
+PERSONALIZATION_INSTRUCTIONS = """
+    Write one or two sentences for a {email_type} email from {sender_name} ({sender_role}, {sender_company})
+    to {recipient_name}, {recipient_role} at {recipient_company}. Use these notes about the recipient: {details}
+    Return only the sentences, with no greeting or sign-off.
+"""
+
+def segment_key(email_info):
+    """Recipients with the same key share one skeleton."""
+    normalize = lambda value: " ".join(str(value).split()).lower()
+    return (
+        normalize(email_info["industry"]),
+        normalize(email_info["recipient_info"]["role"]),
+        normalize(email_info["email_type"]),
+        normalize(email_info["sender_email"]),
+    )
+
+def _skeleton_info(email_info):
+    recipient = email_info["recipient_info"]
+    return {
+        **email_info,
+        "recipient_info": {**recipient, "name": "{{recipient_name}}", "company": "{{recipient_company}}"},
+        "specific_details": email_info["specific_details"] + SKELETON_INSTRUCTIONS.format(role=recipient["role"]),
+    }
+
+def fill_slots(text, values):
+    """Replace ``{{slot}}`` placeholders; unknown slots are dropped."""
+    filled = SLOT_RE.sub(lambda match: values.get(match.group(1), ""), text)
+    # A removed paragraph slot leaves an empty line behind.
+    return re.sub(r"\n{3,}", "\n\n", filled).strip()
+
+def fill_skeleton(skeleton, recipient, paragraph=""):
+    values = {slot: " ".join(recipient[field].split()) for slot, field in RECIPIENT_SLOTS.items()}
+    values[PARAGRAPH_SLOT] = paragraph
+    fields = {field: fill_slots(getattr(skeleton, field), values) for field in FILLED_FIELDS}
+    if paragraph and not SLOT_RE.search(skeleton.body):
+        # The model left out the slot; keep the paragraph after the opening one.
+        head, _, tail = fields["body"].partition("\n\n")
+        fields["body"] = "\n\n".join(part for part in (head, paragraph, tail) if part)
+    return skeleton.copy(update={**fields, "timestamp": datetime.now().isoformat()})
+
+def get_personalization_chain():
+    def build():
+        from langchain_core.output_parsers import StrOutputParser
+        from langchain_core.prompts import ChatPromptTemplate
+        prompt = ChatPromptTemplate.from_messages([("system", PERSONALIZATION_INSTRUCTIONS)])
+        return instrumented(prompt | get_personalization_model() | StrOutputParser())
+    return get_resource("personalization_chain", build)
+
+def _personalization_input(email_info, details):
+    recipient = email_info["recipient_info"]
+    return {
+        "email_type": email_info["email_type"],
+        "sender_name": email_info["sender_name"],
+        "sender_role": email_info["sender_role"],
+        "sender_company": email_info["sender_company"],
+        "recipient_name": recipient["name"],
+        "recipient_role": recipient["role"],
+        "recipient_company": recipient["company"],
+        "details": details,
+    }
+
+async def _generate_skeletons(email_infos, max_concurrency):
+    """Return {segment key: skeleton EmailContent or exception}."""
+    segments = OrderedDict()
+    for email_info in email_infos:
+        segments.setdefault(segment_key(email_info), email_info)
+    chain_inputs = [build_chain_input(_skeleton_info(email_info)) for email_info in segments.values()]
+    lookups = await asyncio.to_thread(
+        lambda: [cache_lookup(email_info, chain_input) for email_info, chain_input in zip(segments.values(), chain_inputs)]
+    )
+    skeletons = dict(zip(segments, (cached for _, cached in lookups)))
+    pending = [index for index, (_, cached) in enumerate(lookups) if cached is None]
+    if pending:
+        keys = list(segments)
+        outputs = await model_router.amap(
+            [
+                (
+                    model_route(segments[keys[index]]),
+                    chain_call(get_email_generation_chain, {**chain_inputs[index], "chat_history": []}),
+                    estimated_tokens(chain_inputs[index]),
+                )
+                for index in pending
+            ],
+            max_concurrency,
+        )
+        generated = []
+        for index, output in zip(pending, outputs):
+            if isinstance(output, Exception):
+                skeletons[keys[index]] = output
+                continue
+            model_name, skeletons[keys[index]] = output
+            generated.append((lookups[index][0], skeletons[keys[index]], model_name))
+        await asyncio.to_thread(lambda: [cache_store(key, email, model_name) for key, email, model_name in generated])
+    return skeletons
+
+def _paragraph_lookup(personalization_input, use_cache=True):
+    key = cache_key(personalization_input, PERSONALIZATION_MODEL_NAME)
+    cached = generation_cache.get(key) if use_cache else None
+    return key, cached["paragraph"] if cached else None
+
+async def _personalize(email_infos, details, max_concurrency):
+    """Write the paragraph slot for each recipient that has notes, with the cheap model."""
+    paragraphs = ["" for _ in email_infos]
+    wanted = [index for index, note in enumerate(details) if note]
+    if not wanted:
+        return paragraphs
+    inputs = [_personalization_input(email_infos[index], details[index]) for index in wanted]
+    lookups = await asyncio.to_thread(lambda: [_paragraph_lookup(item, email_infos[index].get("use_cache", True)) for item, index in zip(inputs, wanted)])
+    pending = [position for position, (_, cached) in enumerate(lookups) if cached is None]
+    for position, (_, cached) in enumerate(lookups):
+        if cached is not None:
+            paragraphs[wanted[position]] = cached
+    if pending:
+        chain = get_personalization_chain()
+        outputs = await get_llm_limiter(PERSONALIZATION_MODEL_NAME).amap(
+            [
+                (partial(chain.ainvoke, inputs[position]), estimated_tokens(inputs[position], PERSONALIZATION_INSTRUCTIONS, PERSONALIZATION_MAX_TOKENS))
+                for position in pending
+            ],
+            max_concurrency,
+        )
+        generated = []
+        for position, output in zip(pending, outputs):
+            if isinstance(output, Exception):
+                # A missing paragraph still leaves a complete email.
+                print(f"Personalization failed for {email_infos[wanted[position]]['recipient_info']['email']}: {output}")
+                continue
+            paragraphs[wanted[position]] = output.strip()
+            generated.append((lookups[position][0], output.strip()))
+        await asyncio.to_thread(
+            lambda: [generation_cache.set(key, {"paragraph": text}, PERSONALIZATION_MODEL_NAME) for key, text in generated]
+        )
+    return paragraphs
+
+async def generate_campaign(email_infos, personalize=False, max_concurrency=None):
+    """Generate one email per entry from per-segment skeletons.
+
+    Each entry's ``recipient_info`` may carry ``details``: with
+    ``personalize`` they are turned into a short paragraph by the
+    personalization model, otherwise they fill the paragraph slot as given.
+    Returns (results aligned with ``email_infos``, each an ``EmailContent``
+    or the exception raised for its segment; number of segments).
+    """
+    max_concurrency = max_concurrency or GENERATION_MAX_CONCURRENCY
+    skeletons = await _generate_skeletons(email_infos, max_concurrency)
+    details = [(email_info["recipient_info"].get("details") or "").strip() for email_info in email_infos]
+    if personalize:
+        paragraphs = await _personalize(email_infos, details, max_concurrency)
+    else:
+        paragraphs = details
+    results = []
+    for email_info, paragraph in zip(email_infos, paragraphs):
+        skeleton = skeletons[segment_key(email_info)]
+        if isinstance(skeleton, Exception):
+            results.append(skeleton)
+        else:
+            results.append(fill_skeleton(skeleton, email_info["recipient_info"], paragraph))
+    return results, len(skeletons)
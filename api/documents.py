@@ -0,0 +1,113 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional
+from .storage import get_connection
+
+DOCUMENT_MAX_BYTES = int(os.getenv("DOCUMENT_MAX_BYTES", str(10 * 1024 * 1024)))
+DOCUMENT_MAX_PAGES = int(os.getenv("DOCUMENT_MAX_PAGES", "50"))
+# Documents with at least this many pages are split across worker processes;
+# PDF parsing is pure Python, so threads would not run it in parallel.
+DOCUMENT_PARALLEL_PAGES = int(os.getenv("DOCUMENT_PARALLEL_PAGES", "16"))
+DOCUMENT_WORKERS = int(os.getenv("DOCUMENT_WORKERS", str(os.cpu_count() or 1)))
+DOCUMENT_CACHE_MAX_ENTRIES = int(os.getenv("DOCUMENT_CACHE_MAX_ENTRIES", "64"))
+
+class DocumentTooLarge(ValueError):
+    pass
+
+_memory = OrderedDict()
+_memory_lock = threading.Lock()
+_pool = None
+_pool_lock = threading.Lock()
+
+def document_id(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def _reader(data: bytes):
+    from PyPDF2 import PdfReader
+    return PdfReader(io.BytesIO(data))
+
+def iter_pdf_pages(data: bytes, max_pages: int = DOCUMENT_MAX_PAGES, reader=None) -> Iterator[str]:
+    """Extract page text lazily, stopping after ``max_pages`` pages."""
+    reader = reader or _reader(data)
+    for index, page in enumerate(reader.pages):
+        if index >= max_pages:
+            return
+        yield page.extract_text() or ""
+
+def _extract_page_range(data: bytes, start: int, stop: int) -> List[str]:
+    reader = _reader(data)
+    return [reader.pages[index].extract_text() or "" for index in range(start, stop)]
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned rather than forked: uploads are parsed from server threads,
+            # and a fork would copy whatever locks those threads hold.
+            _pool = ProcessPoolExecutor(max_workers=DOCUMENT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _pool
+
+def shutdown_document_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(cancel_futures=True)
+
+def _extract_parallel(data: bytes, page_count: int) -> List[str]:
+    workers = min(DOCUMENT_WORKERS, page_count // DOCUMENT_PARALLEL_PAGES + 1)
+    step = -(-page_count // workers)
+    ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    futures = [_get_pool().submit(_extract_page_range, data, start, stop) for start, stop in ranges]
+    return [text for future in futures for text in future.result()]
+
+def _remember(doc_id: str, text: str):
+    with _memory_lock:
+        _memory[doc_id] = text
+        _memory.move_to_end(doc_id)
+        while len(_memory) > DOCUMENT_CACHE_MAX_ENTRIES:
+            _memory.popitem(last=False)
+
+def get_document_text(doc_id: str) -> Optional[str]:
+    with _memory_lock:
+        text = _memory.get(doc_id)
+        if text is not None:
+            _memory.move_to_end(doc_id)
+            return text
+    row = get_connection().execute("SELECT text FROM documents WHERE id = ?", (doc_id,)).fetchone()
+    if row is None:
+        return None
+    _remember(doc_id, row[0])
+    return row[0]
+
+def ingest_pdf(data: bytes, max_pages: int = DOCUMENT_MAX_PAGES, max_bytes: int = DOCUMENT_MAX_BYTES) -> Dict:
+    """Extract and cache a PDF's text by content hash; repeated uploads are never re-parsed."""
+    if len(data) > max_bytes:
+        raise DocumentTooLarge(f"Document is {len(data)} bytes; the limit is {max_bytes}")
+    doc_id = document_id(data)
+    text = get_document_text(doc_id)
+    if text is None:
+        reader = _reader(data)
+        page_count = min(len(reader.pages), max_pages)
+        if page_count >= DOCUMENT_PARALLEL_PAGES and DOCUMENT_WORKERS > 1:
+            pages = _extract_parallel(data, page_count)
+        else:
+            pages = list(iter_pdf_pages(data, max_pages, reader))
+        text = "\n".join(pages)
+        conn = get_connection()
+        with conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO documents (id, text, pages, size, created_at) VALUES (?, ?, ?, ?, ?)",
+                (doc_id, text, page_count, len(data), time.time()),
+            )
+        _remember(doc_id, text)
+    return {"document_id": doc_id, "characters": len(text), "text": text}
+
+def extract_pdf_text(data: bytes, max_pages: int = DOCUMENT_MAX_PAGES, max_bytes: int = DOCUMENT_MAX_BYTES) -> str:
+    return ingest_pdf(data, max_pages, max_bytes)["text"]
@@ -1,23 +1,51 @@
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.runnables import RunnableWithMessageHistory
-from langchain_community.chat_message_histories import ChatMessageHistory
-from .models import EmailContent
+# LangChain and the Groq client are imported on first use rather than at
+# module import, so serverless cold starts and endpoints that never call the
+# model (stats, documents) do not pay for them.
+from .cache import GenerationCache, cache_key
+from .metrics import stage
+from .models import EmailContent, EmailVariants
+from .rate_limit import get_llm_limiter
+from .relevance import estimate_tokens, select_context
+from .routing import model_router
 from datetime import datetime
+from functools import partial
+import asyncio
 import os
+import threading
 
-AI_MODEL = ChatGroq(
-    model="llama3-groq-70b-8192-tool-use-preview",
-    temperature=0,
-    base_url="https://api.groq.com/"
-)
+# Models for email generation in order of preference (comma separated). A
+# model whose circuit breaker is open is skipped, a failed call falls back to
+# the next one, and a slow one is hedged with it; see routing.py.
+GENERATION_MODELS = [name.strip() for name in os.getenv("GENERATION_MODELS", "llama3-groq-70b-8192-tool-use-preview").split(",") if name.strip()]
+AI_MODEL_NAME = GENERATION_MODELS[0]
+# Smaller model for the short per-recipient paragraphs of campaign mode.
+PERSONALIZATION_MODEL_NAME = os.getenv("PERSONALIZATION_MODEL_NAME", "llama3-8b-8192")
+PERSONALIZATION_MAX_TOKENS = int(os.getenv("PERSONALIZATION_MAX_TOKENS", "120"))
+# Email types (comma separated) tried on FAST_MODEL_NAME first, unless a document is attached.
+FAST_MODEL_NAME = os.getenv("FAST_MODEL_NAME", PERSONALIZATION_MODEL_NAME)
+FAST_EMAIL_TYPES = [name.strip() for name in os.getenv("FAST_EMAIL_TYPES", "").split(",") if name.strip()]
+
+GENERATION_MAX_CONCURRENCY = int(os.getenv("GENERATION_MAX_CONCURRENCY", "5"))
+# Room left for the reply when estimating a request's tokens for the rate limiter.
+EXPECTED_OUTPUT_TOKENS = 600
 
 EMAIL_TEMPLATES = {
-    "Sales Pitch": "Create a persuasive sales email...",
-    "Networking Introduction": "Craft a friendly networking email...",
-    "Job Enquiry": "Compose an engaging recruitment email...",
-    "Event Invitation": "Create a compelling invitation email...",
-    "Job Application": "Write a professional job application email...",
+    "Sales Pitch": """
+        Create a persuasive sales email that highlights the value proposition for the recipient's industry. 
+        Focus on addressing pain points and offering solutions.
+    """,
+    "Networking Introduction": """
+        Craft a friendly networking email that establishes common ground and suggests a mutually beneficial connection.
+    """,
+    "Job Enquiry": """
+        Compose an engaging recruitment email that showcases the opportunity and appeals to the candidate's background and aspirations.
+    """,
+    "Event Invitation": """
+        Create a compelling invitation email that highlights the value of attending the event and encourages participation.
+    """,
+    "Job Application": """
+        Write a professional job application email that highlights the applicant's qualifications, experience, and enthusiasm for the role.
+    """,
 }
 
 EMAIL_GENERATION_INSTRUCTIONS = """
@@ -40,7 +68,7 @@ EMAIL_GENERATION_INSTRUCTIONS = """
 
     To generate the most effective email, follow these steps:
 
-    1. Analyze the provided information, including the uploaded document content if available.
+    1. Analyze the provided information, including the uploaded document content if available. make use of the uploaded content to make the email more personal if its a available.
     2. Choose the appropriate email structure.
     3. Craft the email content, incorporating relevant details from the uploaded document if provided.
     4. Refine the email.
@@ -61,40 +89,418 @@ EMAIL_GENERATION_INSTRUCTIONS = """
     }}
 """
 
-email_template = ChatPromptTemplate.from_messages([
-    ("system", EMAIL_GENERATION_INSTRUCTIONS)
-])
-
-email_generation_chain = email_template | AI_MODEL.with_structured_output(EmailContent)
-
-conversation_history = ChatMessageHistory()
-
-email_generator_with_history = RunnableWithMessageHistory(
-    email_generation_chain,
-    lambda session_id: conversation_history,
-    input_messages_key="user_input",
-    history_messages_key="chat_history",
-)
-
-def generate_email(email_info, session_id="email_session"):
-    result = email_generator_with_history.invoke(
-        {
-            "industry": email_info["industry"],
-            "recipient_role": email_info["recipient_info"]["role"],
-            "details": f"Recipient: {email_info['recipient_info']['name']}, Company: {email_info['recipient_info']['company']}, Role: {email_info['recipient_info']['role']}. Additional details: {email_info['specific_details']}",
-            "purpose": email_info["email_type"],
-            "email_type": email_info["email_type"],
-            "tone": "professional",
-            "word_limit": "No limit",
-            "template": EMAIL_TEMPLATES.get(email_info["email_type"], ""),
-            "uploaded_content": email_info.get("uploaded_content", "No uploaded content"),
-            "sender_name": email_info["sender_name"],
-            "sender_email": email_info["sender_email"],
-            "sender_company": email_info["sender_company"],
-            "sender_role": email_info["sender_role"],
-            "user_input": f"Generate an email for {email_info['industry']} industry, {email_info['recipient_info']['role']} role, with details: {email_info['specific_details']}, purpose: {email_info['email_type']}, type: {email_info['email_type']}, tone: professional"
-        },
-        {"configurable": {"session_id": session_id}}
+VARIANT_INSTRUCTIONS = """
+    Instead of a single email, write {variants} distinct variants of it for an A/B test. Keep the facts and
+    the purpose the same, but give each variant its own subject line and opening, and return them all as
+    the variants list.
+"""
+
+generation_cache = GenerationCache()
+
+_resources = {}
+_resources_lock = threading.RLock()
+MODEL_DEPENDENT_RESOURCES = ("email_generation_chain", "email_streaming_chain", "personalization_chain", "email_variants_chain")
+
+def get_resource(name, factory):
+    """Build a process-wide resource once, on first use."""
+    resource = _resources.get(name)
+    if resource is None:
+        with _resources_lock:
+            resource = _resources.get(name)
+            if resource is None:
+                resource = _resources[name] = factory()
+    return resource
+
+def _build_model(model_name):
+    from langchain_groq import ChatGroq
+    # Retries are left to the rate limiter, which knows about the other calls in flight.
+    return ChatGroq(
+        model=model_name,
+        temperature=0,
+        max_retries=0,
+        base_url="https://api.groq.com/"
+    )
+
+def _build_personalization_model():
+    from langchain_groq import ChatGroq
+    return ChatGroq(
+        model=PERSONALIZATION_MODEL_NAME,
+        temperature=0,
+        max_tokens=PERSONALIZATION_MAX_TOKENS,
+        max_retries=0,
+        base_url="https://api.groq.com/"
     )
+
+def _build_email_template():
+    from langchain_core.prompts import ChatPromptTemplate
+    return ChatPromptTemplate.from_messages([
+        ("system", EMAIL_GENERATION_INSTRUCTIONS)
+    ])
+
+def _build_history_store():
+    from .history import SessionHistoryStore
+    return SessionHistoryStore()
+
+def _build_email_variants_template():
+    from langchain_core.prompts import ChatPromptTemplate
+    return ChatPromptTemplate.from_messages([
+        ("system", EMAIL_GENERATION_INSTRUCTIONS),
+        ("system", VARIANT_INSTRUCTIONS),
+    ])
+
+def get_model(model_name=AI_MODEL_NAME):
+    return get_resource(f"model:{model_name}", partial(_build_model, model_name))
+
+def get_personalization_model():
+    return get_resource("personalization_model", _build_personalization_model)
+
+def get_email_template():
+    return get_resource("email_template", _build_email_template)
+
+def get_history_store():
+    return get_resource("history_store", _build_history_store)
+
+def get_email_variants_template():
+    return get_resource("email_variants_template", _build_email_variants_template)
+
+def use_model(model, personalization_model=None):
+    """Swap in other chat models (e.g. fake ones for benchmarks); chains are rebuilt on next use.
+
+    ``model`` answers for every model name generation is routed to. The
+    personalization model defaults to ``model``.
+    """
+    with _resources_lock:
+        for name in list(_resources):
+            if name.partition(":")[0] in MODEL_DEPENDENT_RESOURCES + ("model",):
+                del _resources[name]
+        for model_name in GENERATION_MODELS + [FAST_MODEL_NAME]:
+            _resources[f"model:{model_name}"] = model
+        _resources["personalization_model"] = personalization_model or model
+
+def instrumented(chain):
+    """The chain with its model calls recorded in the LLM metrics."""
+    from .llm_metrics import metrics_callback_handler
+    return chain.with_config(callbacks=[metrics_callback_handler])
+
+def _history_message(email):
+    from langchain_core.messages import AIMessage
+    # Only the subject goes back into the history; the full body would
+    # inflate every later prompt in the session.
+    return AIMessage(content=f"Generated email with subject: {email.subject}")
+
+def _variants_history_message(variants):
+    from langchain_core.messages import AIMessage
+    subjects = "; ".join(email.subject for email in variants)
+    return AIMessage(content=f"Generated email variants with subjects: {subjects}")
+
+def get_email_generation_chain(model_name=AI_MODEL_NAME):
+    return get_resource(
+        f"email_generation_chain:{model_name}",
+        lambda: instrumented(get_email_template() | get_model(model_name).with_structured_output(EmailContent)),
+    )
+
+def get_email_variants_chain(model_name=AI_MODEL_NAME):
+    return get_resource(
+        f"email_variants_chain:{model_name}",
+        lambda: instrumented(get_email_variants_template() | get_model(model_name).with_structured_output(EmailVariants)),
+    )
+
+def get_email_streaming_chain(model_name=AI_MODEL_NAME):
+    # The prompt already asks for the JSON layout of EmailContent, so streaming
+    # parses the raw model output incrementally instead of using tool calling.
+    def build():
+        from langchain_core.output_parsers import JsonOutputParser
+        return instrumented(get_email_template() | get_model(model_name) | JsonOutputParser())
+    return get_resource(f"email_streaming_chain:{model_name}", build)
+
+def model_route(email_info):
+    """The models to try for an email, in order."""
+    if email_info["email_type"] in FAST_EMAIL_TYPES and not email_info.get("uploaded_content"):
+        return list(dict.fromkeys([FAST_MODEL_NAME] + GENERATION_MODELS))
+    return GENERATION_MODELS
+
+def chain_call(get_chain, *args, method="ainvoke"):
+    """For the model router: given a model name, a call of that model's chain with
+    ``args`` returning (model name, output), so the caller knows which model answered."""
+    def call_for(model_name):
+        call = partial(getattr(get_chain(model_name), method), *args)
+        if method != "ainvoke":
+            return lambda: (model_name, call())
+
+        async def answered():
+            return model_name, await call()
+        return answered
+    return call_for
+
+def _session_id(email_info, session_id=None):
+    return session_id or email_info.get("session_id") or email_info["sender_email"]
+
+# The chains themselves carry no history: a hedged call runs two of them at
+# once, so the session is read before the call and written once, for the
+# answer that won.
+def _history(email_info, session_id=None):
+    return get_history_store().get_history(_session_id(email_info, session_id))
+
+def _remember(history, chain_input, message):
+    from langchain_core.messages import HumanMessage
+    history.add_messages([HumanMessage(content=chain_input["user_input"]), message])
+
+def _uploaded_context(email_info):
+    content = email_info.get("uploaded_content")
+    if not content:
+        return "No uploaded content"
+    recipient = email_info["recipient_info"]
+    query = " ".join([recipient["role"], recipient["company"], email_info["industry"], email_info["email_type"], email_info["specific_details"]])
+    return select_context(content, query)[0]
+
+def build_chain_input(email_info):
+    """The prompt variables for one email request."""
+    return {
+        "industry": email_info["industry"],
+        "recipient_role": email_info["recipient_info"]["role"],
+        "details": f"Recipient: {email_info['recipient_info']['name']}, Company: {email_info['recipient_info']['company']}, Role: {email_info['recipient_info']['role']}. Additional details: {email_info['specific_details']}",
+        "purpose": email_info["email_type"],
+        "email_type": email_info["email_type"],
+        "tone": "professional",
+        "word_limit": "No limit",
+        "template": EMAIL_TEMPLATES.get(email_info["email_type"], ""),
+        "uploaded_content": _uploaded_context(email_info),
+        "sender_name": email_info["sender_name"],
+        "sender_email": email_info["sender_email"],
+        "sender_company": email_info["sender_company"],
+        "sender_role": email_info["sender_role"],
+        "user_input": f"Generate an email for {email_info['industry']} industry, {email_info['recipient_info']['role']} role, with details: {email_info['specific_details']}, purpose: {email_info['email_type']}, type: {email_info['email_type']}, tone: professional"
+    }
+
+def estimated_tokens(chain_input, instructions=EMAIL_GENERATION_INSTRUCTIONS, output_tokens=EXPECTED_OUTPUT_TOKENS):
+    """Rough prompt plus reply size of one model call, for the tokens-per-minute budget."""
+    return estimate_tokens(instructions) + sum(estimate_tokens(str(value)) for value in chain_input.values()) + output_tokens
+
+def cache_lookup(email_info, chain_input):
+    """Return (cache key, cached email); the key is None when caching is off for this request."""
+    with stage("cache_lookup"):
+        return _lookup(email_info, chain_input)
+
+def _cached_value(email_info, chain_input):
+    """Return (cache key, raw cached value); the key is None when caching is off."""
+    if not generation_cache.enabled:
+        return None, None
+    prompt_variables = {name: value for name, value in chain_input.items() if name != "user_input"}
+    # Keyed on the route rather than one model, so an answer is only reused
+    # for requests that would have been sent to the same models.
+    key = cache_key(prompt_variables, ",".join(model_route(email_info)))
+    if not email_info.get("use_cache", True):
+        return key, None
+    return key, generation_cache.get(key)
+
+def _lookup(email_info, chain_input):
+    key, cached = _cached_value(email_info, chain_input)
+    if cached is None:
+        return key, None
+    return key, EmailContent(**{**cached, "timestamp": datetime.now().isoformat()})
+
+def cache_store(key, email, model_name):
+    """Cache a generated email under ``key``, labelled with the model that wrote it."""
+    if key is not None:
+        generation_cache.set(key, email.dict(exclude={"timestamp"}), model_name)
+
+def _cache_lookup_all(email_infos, chain_inputs):
+    return [cache_lookup(email_info, chain_input) for email_info, chain_input in zip(email_infos, chain_inputs)]
+
+def _cache_store_all(generated):
+    for key, email, model_name in generated:
+        cache_store(key, email, model_name)
+
+def generate_email(email_info, session_id=None):
+    chain_input = build_chain_input(email_info)
+    key, cached = cache_lookup(email_info, chain_input)
+    if cached is not None:
+        return cached
+    history = _history(email_info, session_id)
+    model_name, result = model_router.call(
+        model_route(email_info),
+        chain_call(get_email_generation_chain, {**chain_input, "chat_history": history.messages}, method="invoke"),
+        estimated_tokens(chain_input),
+    )
+    _remember(history, chain_input, _history_message(result))
+    result.timestamp = datetime.now().isoformat()
+    cache_store(key, result, model_name)
+    return result
+
+async def agenerate_email(email_info, session_id=None):
+    chain_input = build_chain_input(email_info)
+    key, cached = await asyncio.to_thread(cache_lookup, email_info, chain_input)
+    if cached is not None:
+        return cached
+    history = _history(email_info, session_id)
+    model_name, result = await model_router.acall(
+        model_route(email_info),
+        chain_call(get_email_generation_chain, {**chain_input, "chat_history": history.messages}),
+        estimated_tokens(chain_input),
+    )
+    _remember(history, chain_input, _history_message(result))
     result.timestamp = datetime.now().isoformat()
-    return result
\ No newline at end of file
+    await asyncio.to_thread(cache_store, key, result, model_name)
+    return result
+
+async def generate_emails(email_infos, session_id=None, max_concurrency=None):
+    """Generate one email per entry concurrently.
+
+    Returns a list aligned with ``email_infos`` holding either an
+    ``EmailContent`` or the exception raised for that entry. Entries
+    answered by the generation cache never reach the model.
+    """
+    chain_inputs = [build_chain_input(email_info) for email_info in email_infos]
+    lookups = await asyncio.to_thread(_cache_lookup_all, email_infos, chain_inputs)
+    results = [cached for _, cached in lookups]
+    # Identical requests within the batch share one model call.
+    pending = {}
+    for index, (key, cached) in enumerate(lookups):
+        if cached is None:
+            pending.setdefault(key if key is not None else index, []).append(index)
+    if not pending:
+        return results
+
+    groups = list(pending.values())
+    histories = [_history(email_infos[group[0]], session_id) for group in groups]
+    outputs = await model_router.amap(
+        [
+            (
+                model_route(email_infos[group[0]]),
+                chain_call(get_email_generation_chain, {**chain_inputs[group[0]], "chat_history": history.messages}),
+                estimated_tokens(chain_inputs[group[0]]),
+            )
+            for group, history in zip(groups, histories)
+        ],
+        max_concurrency or GENERATION_MAX_CONCURRENCY,
+    )
+    timestamp = datetime.now().isoformat()
+    generated = []
+    for group, history, output in zip(groups, histories, outputs):
+        if isinstance(output, Exception):
+            for index in group:
+                results[index] = output
+            continue
+        model_name, email = output
+        _remember(history, chain_inputs[group[0]], _history_message(email))
+        email.timestamp = timestamp
+        for index in group:
+            results[index] = email.copy()
+        generated.append((lookups[group[0]][0], email, model_name))
+    await asyncio.to_thread(_cache_store_all, generated)
+    return results
+
+def _variants_lookup(email_info, chain_input):
+    with stage("cache_lookup"):
+        key, cached = _cached_value(email_info, chain_input)
+    if cached is None:
+        return key, None
+    timestamp = datetime.now().isoformat()
+    return key, [EmailContent(**{**variant, "timestamp": timestamp}) for variant in cached["variants"]]
+
+def _variants_store(key, variants, model_name):
+    if key is not None:
+        generation_cache.set(key, {"variants": [email.dict(exclude={"timestamp"}) for email in variants]}, model_name)
+
+async def agenerate_email_variants(email_info, variants, session_id=None):
+    """Generate ``variants`` alternative emails for one recipient in a single model call.
+
+    The instructions and uploaded content are sent once rather than once
+    per variant. Returns a list of at most ``variants`` ``EmailContent``.
+    """
+    chain_input = {**build_chain_input(email_info), "variants": variants}
+    key, cached = await asyncio.to_thread(_variants_lookup, email_info, chain_input)
+    if cached is not None:
+        return cached
+    history = _history(email_info, session_id)
+    model_name, output = await model_router.acall(
+        model_route(email_info),
+        chain_call(get_email_variants_chain, {**chain_input, "chat_history": history.messages}),
+        estimated_tokens(chain_input, output_tokens=EXPECTED_OUTPUT_TOKENS * variants),
+    )
+    result = output.variants[:variants]
+    if not result:
+        raise ValueError("The model returned no email variants")
+    _remember(history, chain_input, _variants_history_message(result))
+    timestamp = datetime.now().isoformat()
+    for email in result:
+        email.timestamp = timestamp
+    await asyncio.to_thread(_variants_store, key, result, model_name)
+    return result
+
+STREAMED_FIELDS = ("subject", "body")
+
+class _EmailStream:
+    """Turns growing partial JSON objects into per-field text deltas."""
+
+    def __init__(self):
+        self.fields = {}
+        self.partial = {}
+
+    def feed(self, chunk):
+        events = []
+        if not isinstance(chunk, dict):
+            return events
+        for field in STREAMED_FIELDS:
+            value = chunk.get(field)
+            if not isinstance(value, str):
+                continue
+            previous = self.fields.get(field, "")
+            if value.startswith(previous) and len(value) > len(previous):
+                events.append((field, value[len(previous):]))
+            self.fields[field] = value
+        self.partial = chunk
+        return events
+
+    def finish(self):
+        data = {key: value for key, value in self.partial.items() if key != "timestamp"}
+        return EmailContent(**data, timestamp=datetime.now().isoformat())
+
+def _replay(email):
+    return [(field, getattr(email, field)) for field in STREAMED_FIELDS] + [("email", email)]
+
+def _stream_setup(email_info, session_id):
+    chain_input = build_chain_input(email_info)
+    key, cached = cache_lookup(email_info, chain_input)
+    history = _history(email_info, session_id)
+    return chain_input, key, cached, history, {**chain_input, "chat_history": history.messages}
+
+def _stream_finish(chain_input, key, history, email, model_name):
+    _remember(history, chain_input, _history_message(email))
+    cache_store(key, email, model_name)
+
+def stream_email(email_info, session_id=None):
+    """Yield ("subject" | "body", text delta) pairs as the email is written, then ("email", EmailContent)."""
+    chain_input, key, cached, history, stream_input = _stream_setup(email_info, session_id)
+    if cached is not None:
+        yield from _replay(cached)
+        return
+    stream = _EmailStream()
+    # Deltas reach the client as they arrive, so a stream is neither hedged nor
+    # retried on another model; it only skips models whose breaker is open.
+    model_name = model_router.available(model_route(email_info))
+    chain = get_email_streaming_chain(model_name)
+    with model_router.track(model_name):
+        for chunk in get_llm_limiter(model_name).stream(partial(chain.stream, stream_input), estimated_tokens(chain_input)):
+            yield from stream.feed(chunk)
+    email = stream.finish()
+    _stream_finish(chain_input, key, history, email, model_name)
+    yield ("email", email)
+
+async def astream_email(email_info, session_id=None):
+    """Async counterpart of ``stream_email``."""
+    chain_input, key, cached, history, stream_input = await asyncio.to_thread(_stream_setup, email_info, session_id)
+    if cached is not None:
+        for event in _replay(cached):
+            yield event
+        return
+    stream = _EmailStream()
+    model_name = model_router.available(model_route(email_info))
+    chain = get_email_streaming_chain(model_name)
+    with model_router.track(model_name):
+        async for chunk in get_llm_limiter(model_name).astream(partial(chain.astream, stream_input), estimated_tokens(chain_input)):
+            for event in stream.feed(chunk):
+                yield event
+    email = stream.finish()
+    await asyncio.to_thread(_stream_finish, chain_input, key, history, email, model_name)
+    yield ("email", email)
@@ -1,29 +1,75 @@
+import asyncio
 import os
-import smtplib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from typing import List, Tuple
+from .metrics import stage
 from .models import EmailContent
+from .smtp_pool import SMTPConnectionPool
 
 SMTP_SERVER = os.getenv("SMTP_SERVER")
 SMTP_PORT = os.getenv("SMTP_PORT")
 SENDER_EMAIL = os.getenv("SENDER_EMAIL")
 SENDER_PASSWORD = os.getenv("SENDER_PASSWORD")
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", "4"))
+SMTP_IDLE_TIMEOUT = float(os.getenv("SMTP_IDLE_TIMEOUT", "60"))
+SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() != "false"
+
+_smtp_pool = None
+_smtp_pool_lock = threading.Lock()
+
+def get_smtp_pool() -> SMTPConnectionPool:
+    global _smtp_pool
+    if _smtp_pool is None:
+        with _smtp_pool_lock:
+            if _smtp_pool is None:
+                _smtp_pool = SMTPConnectionPool(
+                    SMTP_SERVER,
+                    int(SMTP_PORT or 0),
+                    SENDER_EMAIL,
+                    SENDER_PASSWORD,
+                    size=SMTP_POOL_SIZE,
+                    idle_timeout=SMTP_IDLE_TIMEOUT,
+                    starttls=SMTP_STARTTLS,
+                )
+    return _smtp_pool
+
+def close_smtp_pool():
+    if _smtp_pool is not None:
+        _smtp_pool.close()
+
+def _build_message(to_email: str, email_content: EmailContent) -> MIMEMultipart:
+    message = MIMEMultipart()
+    message["From"] = SENDER_EMAIL
+    message["To"] = to_email
+    message["Subject"] = email_content.subject
+    content = email_content.body.replace("\\n", "\n")
+    body = f"{content}"
+    message.attach(MIMEText(body, "plain"))
+    return message
+
+def deliver_email(to_email: str, email_content: EmailContent):
+    """Send one email, raising on failure so callers can decide whether to retry."""
+    with stage("send_email"):
+        get_smtp_pool().send_message(_build_message(to_email, email_content))
 
 def send_email(to_email: str, email_content: EmailContent) -> bool:
     try:
-        message = MIMEMultipart()
-        message["From"] = SENDER_EMAIL
-        message["To"] = to_email
-        message["Subject"] = email_content.subject
-        content = email_content.body.replace("\\n", "\n")
-        body = f"{content}"
-        message.attach(MIMEText(body, "plain"))
-
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SENDER_EMAIL, SENDER_PASSWORD)
-            server.send_message(message)
+        deliver_email(to_email, email_content)
         return True
     except Exception as e:
         print(f"Error sending email: {e}")
-        return False
\ No newline at end of file
+        return False
+
+def send_emails(emails: List[Tuple[str, EmailContent]]) -> List[bool]:
+    """Send many emails over the pooled sessions; results follow input order."""
+    if not emails:
+        return []
+    pool = get_smtp_pool()
+    with ThreadPoolExecutor(max_workers=min(pool.size, len(emails))) as executor:
+        return list(executor.map(lambda email: send_email(*email), emails))
+
+async def asend_email(to_email: str, email_content: EmailContent) -> bool:
+    return await asyncio.to_thread(send_email, to_email, email_content)
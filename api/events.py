@@ -0,0 +1,172 @@
+import csv
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from .stats import increment_stats
+from .storage import EMAIL_COLUMNS, get_connection
+from .suppression import CONTACT_EVENTS, insert_suppressions
+
+EMAIL_EVENTS = ('generated', 'queued', 'sent', 'failed', 'bounced')
+EVENT_COMPACTION_INTERVAL = float(os.getenv("EVENT_COMPACTION_INTERVAL", "30"))
+EVENT_COMPACTION_BATCH_SIZE = 5000
+# Stays below SQLite's default limit on bound parameters.
+STATE_QUERY_BATCH_SIZE = 500
+EMAIL_SNAPSHOT_FILE = os.getenv("EMAIL_SNAPSHOT_FILE")
+
+WATERMARK_KEY = 'events_compacted_through'
+
+def record_email_event(email_id: int, event: str, recipient_email: Optional[str] = None, detail: Optional[str] = None):
+    record_email_events([(email_id, event, recipient_email, detail)])
+
+def record_email_events(events: List[Tuple[int, str, Optional[str], Optional[str]]]):
+    """Append status events; this is the only write on the send path."""
+    conn = get_connection()
+    with conn:
+        insert_events(conn, events)
+
+def insert_events(conn, events):
+    """Append events and bump the matching stats counters in the caller's transaction."""
+    for event in events:
+        if event[1] not in EMAIL_EVENTS:
+            raise ValueError(f"Unknown email event: {event[1]}")
+    timestamp = datetime.now().isoformat()
+    conn.executemany(
+        "INSERT INTO email_events (email_id, event, recipient_email, detail, timestamp) VALUES (?, ?, ?, ?, ?)",
+        [(*event, timestamp) for event in events],
+    )
+    emails = {}
+    for email_id in {event[0] for event in events}:
+        row = conn.execute("SELECT email_type, user_email, timestamp, recipient_email FROM emails WHERE id = ?", (email_id,)).fetchone()
+        if row is not None:
+            emails[email_id] = row
+    increment_stats(conn, (
+        # Generation is bucketed by the email's own timestamp so that
+        # rebuild_stats() reproduces the same counters from the emails table.
+        (event[1], email['email_type'], email['user_email'], email['timestamp'] if event[1] == 'generated' else timestamp)
+        for event in events
+        if (email := emails.get(event[0])) is not None
+    ))
+    # Sent and bounced recipients go into the suppression index in the same transaction.
+    insert_suppressions(conn, (
+        (event[2] or email['recipient_email'], CONTACT_EVENTS[event[1]], event[3])
+        for event in events
+        if event[1] in CONTACT_EVENTS and (email := emails.get(event[0])) is not None and (event[2] or email['recipient_email'])
+    ))
+
+def fold_events(state: Dict, events) -> Dict:
+    """Apply events, oldest first, to an email's snapshot state."""
+    for event in events:
+        state['status'] = event['event']
+        if event['event'] == 'sent':
+            state['sent'] = True
+        if event['recipient_email']:
+            state['recipient_email'] = event['recipient_email']
+    return state
+
+def _watermark(conn) -> int:
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (WATERMARK_KEY,)).fetchone()
+    return int(row[0]) if row else 0
+
+def get_email_state(email_id: int) -> Optional[Dict]:
+    """Current state of one email: its compacted snapshot plus any newer events."""
+    return get_email_states([email_id]).get(email_id)
+
+def get_email_states(email_ids: List[int]) -> Dict[int, Dict]:
+    """``get_email_state`` for many emails at once; unknown IDs are left out."""
+    conn = get_connection()
+    states = {}
+    for start in range(0, len(email_ids), STATE_QUERY_BATCH_SIZE):
+        chunk = list(email_ids[start:start + STATE_QUERY_BATCH_SIZE])
+        placeholders = ",".join("?" * len(chunk))
+        for row in conn.execute(f"SELECT * FROM emails WHERE id IN ({placeholders})", chunk):
+            state = dict(row)
+            state['sent'] = bool(state['sent'])
+            states[state['id']] = state
+        pending = {}
+        for event in conn.execute(
+            f"SELECT email_id, event, recipient_email FROM email_events WHERE email_id IN ({placeholders}) AND id > ? ORDER BY id",
+            chunk + [_watermark(conn)],
+        ):
+            pending.setdefault(event['email_id'], []).append(event)
+        for email_id, events in pending.items():
+            if email_id in states:
+                fold_events(states[email_id], events)
+    return states
+
+def compact_email_events(batch_size: int = EVENT_COMPACTION_BATCH_SIZE) -> int:
+    """Fold events past the watermark into the emails table; returns events folded.
+
+    The watermark is advanced in the same transaction, so concurrent
+    compactors in other workers never fold an event twice.
+    """
+    conn = get_connection()
+    folded = 0
+    while True:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            events = conn.execute(
+                "SELECT id, email_id, event, recipient_email FROM email_events WHERE id > ? ORDER BY id LIMIT ?",
+                (_watermark(conn), batch_size),
+            ).fetchall()
+            if not events:
+                return folded
+            by_email = {}
+            for event in events:
+                by_email.setdefault(event['email_id'], []).append(event)
+            for email_id, email_events in by_email.items():
+                row = conn.execute("SELECT sent, status, recipient_email FROM emails WHERE id = ?", (email_id,)).fetchone()
+                if row is None:
+                    continue
+                state = fold_events({'sent': bool(row['sent']), 'status': row['status'], 'recipient_email': row['recipient_email']}, email_events)
+                conn.execute(
+                    "UPDATE emails SET sent = ?, status = ?, recipient_email = ? WHERE id = ?",
+                    (int(state['sent']), state['status'], state['recipient_email'], email_id),
+                )
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (WATERMARK_KEY, str(events[-1]['id'])),
+            )
+        folded += len(events)
+
+def export_snapshot(csv_path: str):
+    """Write the compacted email log in the legacy email_data.csv layout."""
+    conn = get_connection()
+    temp_path = f"{csv_path}.tmp"
+    with open(temp_path, 'w', newline='') as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(EMAIL_COLUMNS)
+        for row in conn.execute(f"SELECT {', '.join(EMAIL_COLUMNS)} FROM emails ORDER BY id"):
+            row = list(row)
+            row[-1] = str(bool(row[-1]))
+            writer.writerow(row)
+    os.replace(temp_path, csv_path)
+
+class EventCompactor:
+    """Background thread that periodically compacts the event log."""
+
+    def __init__(self, interval: float = EVENT_COMPACTION_INTERVAL, snapshot_file: Optional[str] = EMAIL_SNAPSHOT_FILE):
+        self.interval = interval
+        self.snapshot_file = snapshot_file
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="email-event-compactor", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.run_once()
+        self.run_once()
+
+    def run_once(self):
+        try:
+            if compact_email_events() and self.snapshot_file:
+                export_snapshot(self.snapshot_file)
+        except Exception as e:
+            print(f"Error compacting email events: {e}")
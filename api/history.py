@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import List, Sequence
+from langchain_core.chat_history import InMemoryChatMessageHistory
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+HISTORY_MAX_MESSAGES = int(os.getenv("HISTORY_MAX_MESSAGES", "6"))
+HISTORY_MAX_SESSIONS = int(os.getenv("HISTORY_MAX_SESSIONS", "1000"))
+HISTORY_TTL = float(os.getenv("HISTORY_TTL", "3600"))
+HISTORY_SUMMARIZE = os.getenv("HISTORY_SUMMARIZE", "false").lower() == "true"
+HISTORY_SUMMARY_CHARS = 500
+
+SUMMARY_PREFIX = "Summary of earlier requests: "
+
+class BoundedChatMessageHistory(InMemoryChatMessageHistory):
+    """Chat history that keeps only the most recent ``max_messages`` messages.
+
+    With ``summarize`` enabled, trimmed human turns are folded into a single
+    leading system message capped at ``HISTORY_SUMMARY_CHARS`` characters.
+    """
+
+    max_messages: int = HISTORY_MAX_MESSAGES
+    summarize: bool = HISTORY_SUMMARIZE
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        super().add_messages(messages)
+        self._trim()
+
+    def _trim(self):
+        summary, recent = _split_summary(self.messages)
+        if len(recent) <= self.max_messages:
+            return
+        evicted, recent = recent[:-self.max_messages], recent[-self.max_messages:]
+        if self.summarize:
+            summary = _summarize(summary, evicted)
+            self.messages = ([SystemMessage(content=summary)] if summary else []) + recent
+        else:
+            self.messages = recent
+
+def _split_summary(messages: List[BaseMessage]):
+    if messages and isinstance(messages[0], SystemMessage) and messages[0].content.startswith(SUMMARY_PREFIX):
+        return messages[0].content, messages[1:]
+    return "", list(messages)
+
+def _summarize(summary: str, evicted: List[BaseMessage]) -> str:
+    requests = [message.content for message in evicted if isinstance(message, HumanMessage)]
+    if not requests:
+        return summary
+    earlier = summary[len(SUMMARY_PREFIX):] if summary else ""
+    text = "; ".join(filter(None, [earlier, *requests]))
+    # Keep the newest part of the summary when it outgrows its budget.
+    return SUMMARY_PREFIX + text[-HISTORY_SUMMARY_CHARS:]
+
+class SessionHistoryStore:
+    """Per-session chat histories with LRU eviction and an idle TTL."""
+
+    def __init__(self, max_messages=HISTORY_MAX_MESSAGES, max_sessions=HISTORY_MAX_SESSIONS,
+                 ttl=HISTORY_TTL, summarize=HISTORY_SUMMARIZE):
+        self.max_messages = max_messages
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.summarize = summarize
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_history(self, session_id: str) -> BoundedChatMessageHistory:
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            entry = self._sessions.pop(session_id, None)
+            history = entry[0] if entry else BoundedChatMessageHistory(
+                max_messages=self.max_messages, summarize=self.summarize
+            )
+            self._sessions[session_id] = (history, now)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            return history
+
+    def _evict_expired(self, now):
+        # Entries are kept in access order, so expired sessions sit at the front.
+        while self._sessions:
+            session_id, (_, last_access) = next(iter(self._sessions.items()))
+            if now - last_access <= self.ttl:
+                return
+            del self._sessions[session_id]
+
+    def clear(self, session_id: str):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        return len(self._sessions)
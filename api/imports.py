@@ -0,0 +1,89 @@
+# Recipient lists uploaded as CSV or JSONL, read a row at a time from the
+# spooled upload so memory does not grow with the file.
+import codecs
+import csv
+import json
+import os
+from typing import BinaryIO, Dict, Iterator, List, Tuple, Union
+from pydantic import ValidationError
+from .models import CampaignRecipient
+
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "200"))
+
+# Accepted column names besides the CampaignRecipient field names.
+COLUMN_ALIASES = {
+    "recipient_name": "name",
+    "full_name": "name",
+    "recipient_company": "company",
+    "organization": "company",
+    "recipient_role": "role",
+    "title": "role",
+    "position": "role",
+    "recipient_email": "email",
+    "email_address": "email",
+    "specific_details": "details",
+    "notes": "details",
+}
+
+Row = Tuple[int, Union[CampaignRecipient, str]]
+
+def import_format(filename: str, content_type: str) -> str:
+    name = (filename or "").lower()
+    if name.endswith((".jsonl", ".ndjson")) or content_type in ("application/x-ndjson", "application/jsonl", "application/x-jsonlines"):
+        return "jsonl"
+    return "csv"
+
+def _column(name: str) -> str:
+    key = "_".join(str(name).strip().lower().split())
+    return COLUMN_ALIASES.get(key, key)
+
+def _normalize(raw: Dict) -> Dict:
+    row = {}
+    for name, value in raw.items():
+        if name is None or value is None:
+            continue
+        row[_column(name)] = " ".join(str(value).split())
+    if row.get("email"):
+        row["email"] = row["email"].lower()
+    return row
+
+def _error(e: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(str(part) for part in error['loc']) or 'row'}: {error['msg']}" for error in e.errors())
+
+def validate_row(raw: Dict) -> Union[CampaignRecipient, str]:
+    """A normalized recipient, or the reason the row was rejected."""
+    if not isinstance(raw, dict):
+        return "expected an object"
+    try:
+        return CampaignRecipient(**_normalize(raw))
+    except ValidationError as e:
+        return _error(e)
+
+def _raw_rows(binary: BinaryIO, file_format: str) -> Iterator[Tuple[int, Union[Dict, str]]]:
+    text = codecs.getreader("utf-8-sig")(binary, errors="replace")
+    if file_format == "jsonl":
+        for number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError as e:
+                yield number, f"invalid JSON: {e}"
+        return
+    reader = csv.DictReader(text)
+    for row in reader:
+        # Numbered by the file line a row ends on; the header is line 1.
+        yield reader.line_num, row if None not in row else "more values than columns"
+
+def iter_recipients(binary: BinaryIO, file_format: str) -> Iterator[Row]:
+    """(line number, recipient or error message) for every row of an upload."""
+    for number, raw in _raw_rows(binary, file_format):
+        yield number, raw if isinstance(raw, str) else validate_row(raw)
+
+def next_chunk(rows: Iterator[Row], size: int = IMPORT_CHUNK_SIZE) -> List[Row]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            break
+    return chunk
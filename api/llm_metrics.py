@@ -0,0 +1,72 @@
+# Imported with LangChain, on the first model call.
+import threading
+import time
+from langchain_core.callbacks import BaseCallbackHandler
+from .metrics import LLM_TOKENS, observe_stage
+
+# LangChain run types timed as stages of a chain; the model call itself is
+# timed through the chat model callbacks.
+STAGE_RUN_TYPES = {"prompt": "prompt_render", "parser": "output_parse"}
+
+def _token_usage(response):
+    """(prompt, completion) tokens from a model result, or None if not reported."""
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                return usage.get("input_tokens", 0), usage.get("output_tokens", 0)
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    return None
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Times prompt rendering, model calls and output parsing, and counts tokens."""
+
+    # Every handler method is a dict update and a clock read, so run them in
+    # the caller instead of a threadpool hop per event on async chains; sync
+    # chains may call from several threads, hence the lock.
+    run_inline = True
+
+    def __init__(self):
+        self._runs = {}
+        self._lock = threading.Lock()
+
+    def _start(self, run_id, run):
+        with self._lock:
+            self._runs[run_id] = run
+
+    def on_chain_start(self, serialized, inputs, *, run_id, run_type=None, **kwargs):
+        stage_name = STAGE_RUN_TYPES.get(run_type)
+        if stage_name:
+            self._start(run_id, (stage_name, None, time.perf_counter()))
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name") or (kwargs.get("metadata") or {}).get("ls_model_name") or "unknown"
+        self._start(run_id, ("llm_call", model, time.perf_counter()))
+
+    def _finish(self, run_id, error=False):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is not None:
+            observe_stage(run[0], time.perf_counter() - run[2], error)
+        return run
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._finish(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error=True)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._finish(run_id)
+        usage = _token_usage(response)
+        if run is not None and usage:
+            LLM_TOKENS.inc(run[1], "prompt", amount=usage[0])
+            LLM_TOKENS.inc(run[1], "completion", amount=usage[1])
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error=True)
+
+metrics_callback_handler = MetricsCallbackHandler()
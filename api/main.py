@@ -1,45 +1,488 @@
-from fastapi import FastAPI, HTTPException
-from .models import EmailRequest, EmailResponse
-from .email_generator import generate_email
-from .email_sender import send_email
-from .utils import save_email_data, update_email_data
+import json
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Annotated, List, Optional
+from fastapi import FastAPI, File, Form, HTTPException, Query, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.datastructures import UploadFile as StarletteUploadFile
+from .models import AnalyticsResponse, EmailSearchResponse, EmailRequest, RecipientImportRequest, EmailResponse, EmailVariant, SuppressionRequest, SuppressionResponse, BatchEmailRequest, BatchEmailResponse, BatchEmailResult, CampaignRequest, CampaignResponse, EmailStatsResponse, DocumentResponse, SendDraftsRequest, SendDraftResult, SendDraftsResponse, SendJobResponse
+from .analytics import ANALYTICS_EXPORT_INTERVAL, AnalyticsExporter, AnalyticsUnavailable, query_analytics
+from .campaign import generate_campaign
+from .documents import DOCUMENT_MAX_BYTES, DocumentTooLarge, get_document_text, ingest_pdf, shutdown_document_pool
+from .email_generator import agenerate_email, agenerate_email_variants, astream_email, generate_emails, generation_cache
+from .email_sender import close_smtp_pool
+from .events import EventCompactor
+from .imports import import_format, iter_recipients, next_chunk
+from .metrics import HTTP_REQUEST_SECONDS, CallbackMetric, render, span
+from .outbox import OUTBOX_WORKERS, OutboxWorker, enqueue_emails, get_job, get_outbox_counts
+from .rate_limit import get_llm_limiter_stats, is_throttled
+from .relevance import context_stats
+from .routing import MODEL_BREAKER_RESET, ModelsUnavailable, model_router
+from .search import SEARCH_MAX_LIMIT, SearchUnavailable, search_emails
+from .suppression import RecipientSuppressed, suppress, suppression_index, unsuppress
+from .utils import check_recipients, save_email_data, save_email_data_bulk, get_email_drafts, get_email_stats_breakdown
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    compactor = EventCompactor().start()
+    # With OUTBOX_WORKERS=0 the outbox is drained by `python -m api.outbox` instead.
+    outbox_worker = OutboxWorker().start() if OUTBOX_WORKERS > 0 else None
+    analytics_exporter = AnalyticsExporter().start() if ANALYTICS_EXPORT_INTERVAL > 0 else None
+    yield
+    if analytics_exporter:
+        await run_in_threadpool(analytics_exporter.stop)
+    if outbox_worker:
+        await run_in_threadpool(outbox_worker.stop)
+    await run_in_threadpool(compactor.stop)
+    await run_in_threadpool(shutdown_document_pool)
+    close_smtp_pool()
+
+app = FastAPI(lifespan=lifespan)
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    request_span = span(f"{request.method} {request.url.path}")
+    if request_span is not None:
+        request_span.__enter__()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Streaming responses are measured to their first byte.
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, request.method, getattr(route, "path", "unmatched"), status)
+        if request_span is not None:
+            request_span.__exit__(None, None, None)
+
+CallbackMetric(
+    "reachout_generation_cache_lookups_total", "Generation cache lookups by result.", "counter", ("result",),
+    lambda: {(result,): generation_cache.stats()[result] for result in ("hits", "disk_hits", "misses")},
+)
+CallbackMetric(
+    "reachout_context_tokens_total", "Uploaded-document tokens offered to and trimmed by context selection.", "counter", ("kind",),
+    lambda: {(kind,): context_stats.snapshot()[kind] for kind in ("tokens_in", "tokens_saved")},
+)
+CallbackMetric(
+    "reachout_outbox_jobs", "Outbox jobs by status.", "gauge", ("status",),
+    lambda: {(status,): count for status, count in get_outbox_counts().items()},
+)
+
+def _email_record(request, recipient_info, email_content):
+    return {
+        'timestamp': email_content.timestamp,
+        'user_email': request.sender_email,
+        'recipient_email': recipient_info.email,
+        'recipient_name': recipient_info.name,
+        'recipient_company': recipient_info.company,
+        'recipient_role': recipient_info.role,
+        'email_type': request.email_type,
+        'specific_details': request.specific_details,
+        'generated_subject': email_content.subject,
+        'generated_body': email_content.body,
+        'sent': False
+    }
+
+def _generation_error(e):
+    # Still throttled after the limiter's retries: tell the client to come back later.
+    if is_throttled(e):
+        return HTTPException(status_code=503, detail=f"Model provider is rate limiting requests: {e}", headers={"Retry-After": "30"})
+    if isinstance(e, ModelsUnavailable):
+        return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(int(MODEL_BREAKER_RESET))})
+    return HTTPException(status_code=500, detail=str(e))
+
+async def _check_recipient(request):
+    """Refuse, before any model or SMTP work, a recipient who opted out, bounced or was already sent to."""
+    email = request.recipient_info.email
+    blocked = await run_in_threadpool(check_recipients, [email], request.allow_recontact)
+    if blocked:
+        raise HTTPException(status_code=409, detail=str(RecipientSuppressed(email, blocked[email])))
+
+async def _email_info(request):
+    """Request fields as a dict, with an uploaded document's text resolved by ID."""
+    email_info = request.dict()
+    if request.document_id:
+        text = await run_in_threadpool(get_document_text, request.document_id)
+        if text is None:
+            raise HTTPException(status_code=404, detail=f"Unknown document_id: {request.document_id}")
+        email_info["uploaded_content"] = text
+    return email_info
+
+@app.post("/documents/", response_model=DocumentResponse)
+async def upload_document(file: UploadFile = File(...)):
+    if file.content_type != "application/pdf" and not (file.filename or "").lower().endswith(".pdf"):
+        raise HTTPException(status_code=415, detail="Only PDF documents are supported")
+    data = await file.read(DOCUMENT_MAX_BYTES + 1)
+    try:
+        document = await run_in_threadpool(ingest_pdf, data)
+    except DocumentTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=422, detail=f"Could not read PDF: {e}")
+    return DocumentResponse(document_id=document["document_id"], characters=document["characters"])
 
 @app.post("/generate-email/", response_model=EmailResponse)
 async def generate_email_endpoint(request: EmailRequest):
+    await _check_recipient(request)
+    email_info = await _email_info(request)
+    if request.variants > 1:
+        return await _generate_variants(request, email_info)
+    try:
+        email_content = await agenerate_email(email_info)
+        draft_id = await run_in_threadpool(save_email_data, _email_record(request, request.recipient_info, email_content))
+        return EmailResponse(subject=email_content.subject, body=email_content.body, draft_id=draft_id)
+    except Exception as e:
+        raise _generation_error(e)
+
+async def _generate_variants(request, email_info):
+    """A/B variants from one model call, each stored as its own draft under a shared variant group."""
     try:
-        email_content = generate_email(request.dict())
-        save_email_data({
-            'timestamp': email_content.timestamp,
-            'user_email': request.sender_email,
-            'recipient_email': '',
-            'recipient_name': request.recipient_info.name,
-            'recipient_company': request.recipient_info.company,
-            'recipient_role': request.recipient_info.role,
-            'email_type': request.email_type,
-            'specific_details': request.specific_details,
-            'generated_subject': email_content.subject,
-            'generated_body': email_content.body,
-            'sent': False
-        })
-        return EmailResponse(subject=email_content.subject, body=email_content.body)
+        email_contents = await agenerate_email_variants(email_info, request.variants)
+        variant_group = uuid.uuid4().hex
+        records = [
+            {**_email_record(request, request.recipient_info, email_content), 'variant_group': variant_group, 'variant': index}
+            for index, email_content in enumerate(email_contents)
+        ]
+        draft_ids = await run_in_threadpool(save_email_data_bulk, records)
+    except Exception as e:
+        raise _generation_error(e)
+    variants = [
+        EmailVariant(subject=email_content.subject, body=email_content.body, draft_id=draft_id)
+        for email_content, draft_id in zip(email_contents, draft_ids)
+    ]
+    return EmailResponse(subject=variants[0].subject, body=variants[0].body, draft_id=variants[0].draft_id, variants=variants)
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/generate-email/stream")
+async def generate_email_stream_endpoint(request: EmailRequest):
+    """Stream subject and body deltas as server-sent events, ending with the validated email."""
+    if request.variants > 1:
+        raise HTTPException(status_code=422, detail="Variants are not supported when streaming; use /generate-email/")
+    await _check_recipient(request)
+    email_info = await _email_info(request)
+
+    async def events():
+        try:
+            async for event, value in astream_email(email_info):
+                if event == "email":
+                    draft_id = await run_in_threadpool(save_email_data, _email_record(request, request.recipient_info, value))
+                    yield _sse("email", {**value.dict(), "draft_id": draft_id})
+                else:
+                    yield _sse(event, {"delta": value})
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+async def _recipient_email_infos(request, extra_fields=()):
+    campaign = await _email_info(request)
+    for field in ("recipients", "max_concurrency") + extra_fields:
+        campaign.pop(field)
+    return [{**campaign, "recipient_info": recipient.dict()} for recipient in request.recipients]
+
+async def _blocked_recipients(request):
+    return await run_in_threadpool(check_recipients, [recipient.email for recipient in request.recipients], request.allow_recontact)
+
+def _with_skipped(request, blocked, email_contents):
+    """Results for every recipient: a RecipientSuppressed for skipped ones, generated output for the rest, in order."""
+    generated = iter(email_contents)
+    return [
+        RecipientSuppressed(recipient.email, blocked[recipient.email]) if recipient.email in blocked else next(generated)
+        for recipient in request.recipients
+    ]
+
+async def _save_batch(request, email_contents):
+    """Store the generated emails and return one result per recipient."""
+    results = []
+    saved = []
+    records = []
+    for recipient, email_content in zip(request.recipients, email_contents):
+        if isinstance(email_content, Exception):
+            results.append(BatchEmailResult(recipient_email=recipient.email, error=str(email_content)))
+            continue
+        results.append(BatchEmailResult(recipient_email=recipient.email, subject=email_content.subject, body=email_content.body))
+        saved.append(results[-1])
+        records.append(_email_record(request, recipient, email_content))
+
+    try:
+        draft_ids = await run_in_threadpool(save_email_data_bulk, records)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    for result, draft_id in zip(saved, draft_ids):
+        result.draft_id = draft_id
+    return results
 
-@app.post("/send-email/")
-async def send_email_endpoint(request: EmailRequest):
+@app.post("/generate-email/batch", response_model=BatchEmailResponse)
+async def generate_emails_endpoint(request: BatchEmailRequest):
+    blocked = await _blocked_recipients(request)
+    email_infos = [email_info for email_info in await _recipient_email_infos(request) if email_info["recipient_info"]["email"] not in blocked]
+    try:
+        email_contents = await generate_emails(email_infos, max_concurrency=request.max_concurrency)
+    except Exception as e:
+        raise _generation_error(e)
+    return BatchEmailResponse(results=await _save_batch(request, _with_skipped(request, blocked, email_contents)))
+
+@app.post("/generate-email/campaign", response_model=CampaignResponse)
+async def generate_campaign_endpoint(request: CampaignRequest):
+    """Generate one skeleton per industry/role/email type/sender segment and fill it in per recipient."""
+    blocked = await _blocked_recipients(request)
+    email_infos = [
+        email_info for email_info in await _recipient_email_infos(request, ("personalize",))
+        if email_info["recipient_info"]["email"] not in blocked
+    ]
     try:
-        email_content = generate_email(request.dict())
-        if send_email(request.recipient_info.email, email_content):
-            update_email_data(request.recipient_info.email, sent=True)
-            return {"message": "Email sent successfully"}
+        email_contents, segments = await generate_campaign(email_infos, request.personalize, request.max_concurrency)
+    except Exception as e:
+        raise _generation_error(e)
+    return CampaignResponse(results=await _save_batch(request, _with_skipped(request, blocked, email_contents)), segments=segments)
+
+def _sendable(draft_id, draft, blocked):
+    """Return why a draft cannot be sent, or None."""
+    if draft is None:
+        return f"Unknown draft_id: {draft_id}"
+    if draft['sent']:
+        return f"Draft {draft_id} has already been sent"
+    if not draft['recipient_email']:
+        return f"Draft {draft_id} has no recipient"
+    if draft['recipient_email'] in blocked:
+        return f"Draft {draft_id}: {RecipientSuppressed(draft['recipient_email'], blocked[draft['recipient_email']])}"
+    return None
+
+def _draft_recipients(drafts):
+    return [draft['recipient_email'] for draft in drafts.values() if draft['recipient_email']]
+
+async def _queue_drafts(draft_ids):
+    jobs = await run_in_threadpool(enqueue_emails, draft_ids)
+    return await run_in_threadpool(lambda: {draft_id: get_job(job_id) for draft_id, job_id in jobs.items()})
+
+@app.post("/send-email/batch", response_model=SendDraftsResponse, status_code=202)
+async def send_drafts_endpoint(request: SendDraftsRequest):
+    """Queue many stored drafts for sending."""
+    draft_ids = list(dict.fromkeys(request.draft_ids))
+    try:
+        drafts = await run_in_threadpool(get_email_drafts, draft_ids)
+        blocked = await run_in_threadpool(check_recipients, _draft_recipients(drafts), request.allow_recontact)
+        errors = {}
+        queued_recipients = set()
+        for draft_id in draft_ids:
+            errors[draft_id] = _sendable(draft_id, drafts.get(draft_id), blocked)
+            if errors[draft_id] is None:
+                recipient = drafts[draft_id]['recipient_email'].lower()
+                # Two drafts to one recipient in the same request: only the first goes out.
+                if recipient in queued_recipients and not request.allow_recontact:
+                    errors[draft_id] = f"Draft {draft_id}: {RecipientSuppressed(drafts[draft_id]['recipient_email'], 'contacted')}"
+                queued_recipients.add(recipient)
+        jobs = await _queue_drafts([draft_id for draft_id in draft_ids if not errors[draft_id]])
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    return SendDraftsResponse(results=[
+        SendDraftResult(draft_id=draft_id, error=errors[draft_id]) if errors[draft_id]
+        else SendDraftResult(draft_id=draft_id, job_id=jobs[draft_id]['job_id'], status=jobs[draft_id]['status'])
+        for draft_id in draft_ids
+    ])
+
+async def _import_chunk(settings, campaign, chunk, seen):
+    """Generate (and with ``send``, queue) one chunk of an uploaded list; one result dict per row, in file order."""
+    results = [{"row": number, "recipient_email": None if isinstance(recipient, str) else recipient.email} for number, recipient in chunk]
+    wanted = []
+    for result, (_, recipient) in zip(results, chunk):
+        if isinstance(recipient, str):
+            result.update(status="invalid", error=recipient)
+        elif recipient.email in seen:
+            result.update(status="skipped", error="Duplicate recipient in this file")
         else:
-            raise HTTPException(status_code=500, detail="Failed to send email")
+            seen.add(recipient.email)
+            wanted.append((result, recipient))
+    blocked = await run_in_threadpool(check_recipients, [recipient.email for _, recipient in wanted], settings.allow_recontact)
+    for result, recipient in wanted:
+        if recipient.email in blocked:
+            result.update(status="skipped", error=str(RecipientSuppressed(recipient.email, blocked[recipient.email])))
+    wanted = [(result, recipient) for result, recipient in wanted if recipient.email not in blocked]
+    if not wanted:
+        return results
+
+    # Per-row details are added to the campaign-wide ones.
+    details = [" ".join(filter(None, (settings.specific_details, recipient.details))) for _, recipient in wanted]
+    email_infos = [
+        {**campaign, "specific_details": row_details, "recipient_info": recipient.dict()}
+        for (_, recipient), row_details in zip(wanted, details)
+    ]
+    email_contents = await generate_emails(email_infos, max_concurrency=settings.max_concurrency)
+    saved = []
+    records = []
+    for (result, recipient), row_details, email_content in zip(wanted, details, email_contents):
+        if isinstance(email_content, Exception):
+            result.update(status="failed", error=str(email_content))
+            continue
+        saved.append(result)
+        records.append({**_email_record(settings, recipient, email_content), 'specific_details': row_details})
+    draft_ids = await run_in_threadpool(save_email_data_bulk, records)
+    for result, draft_id in zip(saved, draft_ids):
+        result.update(status="generated", draft_id=draft_id)
+    if settings.send and draft_ids:
+        jobs = await _queue_drafts(draft_ids)
+        for result in saved:
+            result.update(status="queued", job_id=jobs[result["draft_id"]]["job_id"])
+    return results
+
+@app.post("/recipients/import")
+async def import_recipients_endpoint(settings: Annotated[RecipientImportRequest, Form()], request: Request):
+    """Generate a draft for every recipient in an uploaded CSV or JSONL file,
+    streaming one NDJSON result per row as each chunk completes, then a summary line.
+
+    Rows are read, validated and generated a chunk at a time, and the next
+    chunk is only read once the client has taken the previous results, so
+    memory stays flat however long the file is.
+    """
+    # FastAPI cannot mix a form model with a File parameter; the parsed form still holds the upload.
+    file = (await request.form()).get("file")
+    if not isinstance(file, StarletteUploadFile):
+        raise HTTPException(status_code=422, detail="Upload the recipient list as the 'file' field")
+    campaign = await _email_info(settings)
+    for field in ("max_concurrency", "send", "allow_recontact"):
+        campaign.pop(field)
+    rows = iter_recipients(file.file, import_format(file.filename, file.content_type))
+
+    async def results():
+        counts = {}
+        seen = set()
+        try:
+            while True:
+                chunk = await run_in_threadpool(next_chunk, rows)
+                if not chunk:
+                    break
+                for result in await _import_chunk(settings, campaign, chunk, seen):
+                    counts[result["status"]] = counts.get(result["status"], 0) + 1
+                    yield json.dumps(result) + "\n"
+        except Exception as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+        yield json.dumps({"summary": counts}) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+@app.post("/send-email/{draft_id}", response_model=SendJobResponse, status_code=202)
+async def send_draft_endpoint(draft_id: int, allow_recontact: bool = False):
+    """Queue a draft exactly as stored by /generate-email/, without calling the model again."""
+    drafts = await run_in_threadpool(get_email_drafts, [draft_id])
+    draft = drafts.get(draft_id)
+    blocked = await run_in_threadpool(check_recipients, _draft_recipients(drafts), allow_recontact)
+    error = _sendable(draft_id, draft, blocked)
+    if error:
+        raise HTTPException(status_code=404 if draft is None else 409, detail=error)
+    jobs = await _queue_drafts([draft_id])
+    return jobs[draft_id]
+
+@app.post("/send-email/", response_model=SendJobResponse, status_code=202)
+async def send_email_endpoint(request: EmailRequest):
+    """Generate and queue in one step; prefer /send-email/{draft_id} for reviewed drafts."""
+    await _check_recipient(request)
+    email_info = await _email_info(request)
+    try:
+        email_content = await agenerate_email(email_info)
+        email_id = await run_in_threadpool(save_email_data, _email_record(request, request.recipient_info, email_content))
+        jobs = await _queue_drafts([email_id])
+    except Exception as e:
+        raise _generation_error(e)
+    return jobs[email_id]
+
+@app.get("/outbox/")
+async def get_outbox_stats():
+    return await run_in_threadpool(get_outbox_counts)
+
+@app.get("/outbox/{job_id}", response_model=SendJobResponse)
+async def get_send_job(job_id: int):
+    job = await run_in_threadpool(get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job_id: {job_id}")
+    return job
+
+@app.get("/email-stats/", response_model=EmailStatsResponse)
+async def get_email_stats(hours: int = Query(24, ge=0, le=24 * 90), days: int = Query(30, ge=0, le=3650)):
+    try:
+        return await run_in_threadpool(get_email_stats_breakdown, hours, days)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/analytics/", response_model=AnalyticsResponse)
+async def get_analytics(
+    group_by: List[str] = Query(["email_type"]),
+    since: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    until: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    limit: Optional[int] = Query(None, ge=1),
+):
+    """Generated, queued, sent, failed and bounced counts grouped by any of
+    email_type, recipient_company, recipient_role, sender and day."""
+    try:
+        rows = await run_in_threadpool(query_analytics, group_by, since, until, limit)
+    except AnalyticsUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    return AnalyticsResponse(group_by=group_by, rows=rows)
+
+@app.get("/emails/search", response_model=EmailSearchResponse)
+async def search_email_history(
+    q: str = "",
+    company: Optional[str] = None,
+    role: Optional[str] = None,
+    subject: Optional[str] = None,
+    email_type: Optional[str] = None,
+    sender: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=SEARCH_MAX_LIMIT),
+    offset: int = Query(0, ge=0),
+):
+    """Generated emails matching every word of ``q`` (``"quoted"`` for phrases, ``word*`` for prefixes)
+    in subject, body, company, role or details, best match first."""
+    try:
+        results, has_more, truncated = await run_in_threadpool(
+            search_emails, q, limit, offset, email_type, sender, company=company, role=role, subject=subject,
+        )
+    except SearchUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return EmailSearchResponse(query=q, offset=offset, limit=limit, has_more=has_more, truncated=truncated, results=results)
+
+@app.get("/suppressions/")
+async def get_suppression_stats():
+    return await run_in_threadpool(suppression_index.stats)
+
+@app.post("/suppressions/", response_model=SuppressionResponse)
+async def add_suppressions(request: SuppressionRequest):
+    """Opt out addresses, or whole domains given as "example.com" or "@example.com"."""
+    return SuppressionResponse(added=await run_in_threadpool(suppress, request.addresses, request.reason))
+
+@app.delete("/suppressions/{address}")
+async def remove_suppression(address: str):
+    if not await run_in_threadpool(unsuppress, address):
+        raise HTTPException(status_code=404, detail=f"{address} is not suppressed")
+    return {"removed": address}
+
+@app.get("/generation-cache/")
+async def get_generation_cache_stats():
+    return generation_cache.stats()
+
+@app.get("/llm-limits/")
+async def get_llm_limit_stats():
+    return get_llm_limiter_stats()
+
+@app.get("/model-routing/")
+async def get_model_routing_stats():
+    return model_router.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    # Collecting the outbox gauge queries SQLite, so stay off the event loop.
+    return PlainTextResponse(await run_in_threadpool(render), media_type="text/plain; version=0.0.4")
 
-@app.get("/email-stats/")
-async def get_email_stats():
-    # Implement the email stats logic here
-    pass
\ No newline at end of file
+@app.get("/context-selection/")
+async def get_context_selection_stats():
+    return context_stats.snapshot()
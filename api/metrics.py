@@ -0,0 +1,178 @@
+# In-process metrics rendered in the Prometheus text format, without a client
+# library. Recording is a dict update under a lock, so the hot path only pays
+# for a perf_counter() pair per stage. Set METRICS_TRACING=true to also open
+# an OpenTelemetry span per stage when opentelemetry is installed.
+import bisect
+import os
+import threading
+import time
+from typing import Callable, Dict, Tuple
+
+METRICS_TRACING = os.getenv("METRICS_TRACING", "false").lower() == "true"
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+def _register(metric):
+    with _registry_lock:
+        _registry.append(metric)
+    return metric
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = description
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+        _register(self)
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _labels(self.labelnames, labels), value) for labels, value in self._values.items()]
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = description
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+        _register(self)
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(labels)
+            if series is None:
+                series = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def samples(self):
+        with self._lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self._values.items()]
+        samples = []
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                samples.append((f"{self.name}_bucket", _labels(self.labelnames, labels, [("le", le)]), cumulative))
+            samples.append((f"{self.name}_sum", _labels(self.labelnames, labels), total))
+            samples.append((f"{self.name}_count", _labels(self.labelnames, labels), cumulative))
+        return samples
+
+class CallbackMetric:
+    """A metric read from ``collect()`` at scrape time, as {label values tuple: value}.
+
+    For values another component already tracks, such as cache hit counts.
+    """
+
+    def __init__(self, name: str, description: str, kind: str, labelnames: Tuple[str, ...], collect: Callable[[], Dict[Tuple, float]]):
+        self.name = name
+        self.help = description
+        self.kind = kind
+        self.labelnames = labelnames
+        self.collect = collect
+        _register(self)
+
+    def samples(self):
+        return [(self.name, _labels(self.labelnames, labels), value) for labels, value in self.collect().items()]
+
+def render() -> str:
+    """All registered metrics in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        try:
+            samples = metric.samples()
+        except Exception as e:
+            print(f"Error collecting metric {metric.name}: {e}")
+            continue
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.kind}")
+        lines.extend(f"{name}{labels} {value}" for name, labels, value in samples)
+    return "\n".join(lines) + "\n"
+
+STAGE_SECONDS = Histogram(
+    "reachout_stage_duration_seconds",
+    "Time spent in each stage of generating, storing and sending emails.",
+    ("stage", "outcome"),
+)
+HTTP_REQUEST_SECONDS = Histogram(
+    "reachout_http_request_duration_seconds",
+    "HTTP request latency by route.",
+    ("method", "route", "status"),
+)
+LLM_TOKENS = Counter("reachout_llm_tokens_total", "Tokens reported by the model provider.", ("model", "kind"))
+LLM_REQUESTS = Counter("reachout_llm_requests_total", "Model calls by final outcome, after retries.", ("model", "outcome"))
+LLM_RETRIES = Counter("reachout_llm_retries_total", "Model calls retried by the rate limiter.", ("model", "reason"))
+
+_tracer = None
+
+def _get_tracer():
+    global _tracer
+    if _tracer is None:
+        try:
+            from opentelemetry import trace
+        except ImportError:
+            _tracer = False
+        else:
+            _tracer = trace.get_tracer("reachout-ai")
+    return _tracer
+
+def span(name: str):
+    """An OpenTelemetry span when tracing is enabled and available, else None."""
+    if not METRICS_TRACING:
+        return None
+    tracer = _get_tracer()
+    return tracer.start_as_current_span(name) if tracer else None
+
+class stage:
+    """Time a block as ``name`` in the stage histogram; failures are labelled ``outcome="error"``.
+
+        with stage("db_write"):
+            ...
+    """
+
+    __slots__ = ("name", "_start", "_span")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self._span = span(self.name)
+        if self._span is not None:
+            self._span.__enter__()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        STAGE_SECONDS.observe(time.perf_counter() - self._start, self.name, "error" if exc_type else "success")
+        if self._span is not None:
+            self._span.__exit__(exc_type, exc, traceback)
+        return False
+
+def observe_stage(name: str, seconds: float, error: bool = False):
+    STAGE_SECONDS.observe(seconds, name, "error" if error else "success")
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field
+from typing import Any, Dict, List, Optional
 
 class RecipientInfo(BaseModel):
     name: str
@@ -13,14 +13,110 @@ class EmailRequest(BaseModel):
     email_type: str
     specific_details: str
     uploaded_content: Optional[str] = None
+    document_id: Optional[str] = None
     sender_name: str
     sender_email: EmailStr
     sender_company: str
     sender_role: str
+    session_id: Optional[str] = None
+    use_cache: bool = True
+    allow_recontact: bool = False
+    variants: int = Field(default=1, ge=1, le=10)
+
+class BatchEmailRequest(BaseModel):
+    industry: str
+    recipients: List[RecipientInfo]
+    email_type: str
+    specific_details: str
+    uploaded_content: Optional[str] = None
+    document_id: Optional[str] = None
+    sender_name: str
+    sender_email: EmailStr
+    sender_company: str
+    sender_role: str
+    session_id: Optional[str] = None
+    use_cache: bool = True
+    allow_recontact: bool = False
+    max_concurrency: Optional[int] = Field(default=None, ge=1)
+
+class CampaignRecipient(RecipientInfo):
+    details: Optional[str] = None
+
+class CampaignRequest(BatchEmailRequest):
+    recipients: List[CampaignRecipient]
+    personalize: bool = False
+
+class RecipientImportRequest(BaseModel):
+    industry: str
+    email_type: str
+    specific_details: str = ""
+    document_id: Optional[str] = None
+    sender_name: str
+    sender_email: EmailStr
+    sender_company: str
+    sender_role: str
+    session_id: Optional[str] = None
+    use_cache: bool = True
+    allow_recontact: bool = False
+    max_concurrency: Optional[int] = Field(default=None, ge=1)
+    send: bool = False
+
+class DocumentResponse(BaseModel):
+    document_id: str
+    characters: int
+
+class EmailVariant(BaseModel):
+    subject: str
+    body: str
+    draft_id: Optional[int] = None
 
 class EmailResponse(BaseModel):
     subject: str
     body: str
+    draft_id: Optional[int] = None
+    variants: Optional[List[EmailVariant]] = None
+
+class BatchEmailResult(BaseModel):
+    recipient_email: EmailStr
+    subject: Optional[str] = None
+    body: Optional[str] = None
+    draft_id: Optional[int] = None
+    error: Optional[str] = None
+
+class BatchEmailResponse(BaseModel):
+    results: List[BatchEmailResult]
+
+class CampaignResponse(BatchEmailResponse):
+    segments: int
+
+class SendDraftsRequest(BaseModel):
+    draft_ids: List[int]
+    allow_recontact: bool = False
+
+class SuppressionRequest(BaseModel):
+    addresses: List[str]
+    reason: Optional[str] = None
+
+class SuppressionResponse(BaseModel):
+    added: List[str]
+
+class SendJobResponse(BaseModel):
+    job_id: int
+    draft_id: int
+    status: str
+    attempts: int
+    last_error: Optional[str] = None
+    next_attempt_at: Optional[str] = None
+    updated_at: str
+
+class SendDraftResult(BaseModel):
+    draft_id: int
+    job_id: Optional[int] = None
+    status: Optional[str] = None
+    error: Optional[str] = None
+
+class SendDraftsResponse(BaseModel):
+    results: List[SendDraftResult]
 
 class EmailContent(BaseModel):
     subject: str
@@ -28,4 +124,43 @@ class EmailContent(BaseModel):
     greeting: str
     closing: str
     tone: Optional[str] = None
-    timestamp: str
\ No newline at end of file
+    timestamp: str
+
+class EmailVariants(BaseModel):
+    variants: List[EmailContent]
+
+class EmailStatsResponse(BaseModel):
+    totals: Dict[str, int]
+    by_email_type: Dict[str, Dict[str, int]]
+    by_sender: Dict[str, Dict[str, int]]
+    by_hour: Dict[str, Dict[str, int]]
+    by_day: Dict[str, Dict[str, int]]
+
+class AnalyticsResponse(BaseModel):
+    group_by: List[str]
+    rows: List[Dict[str, Any]]
+
+class EmailSearchResult(BaseModel):
+    id: int
+    timestamp: str
+    user_email: Optional[str] = None
+    recipient_email: Optional[str] = None
+    recipient_name: Optional[str] = None
+    recipient_company: Optional[str] = None
+    recipient_role: Optional[str] = None
+    email_type: Optional[str] = None
+    specific_details: Optional[str] = None
+    generated_subject: Optional[str] = None
+    generated_body: Optional[str] = None
+    status: str
+    snippet: Optional[str] = None
+    score: float
+
+class EmailSearchResponse(BaseModel):
+    query: str
+    offset: int
+    limit: int
+    has_more: bool
+    # More matches than the ranking window: results past it are ordered by date, not relevance.
+    truncated: bool = False
+    results: List[EmailSearchResult]
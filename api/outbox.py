@@ -0,0 +1,262 @@
+import argparse
+import os
+import random
+import smtplib
+import threading
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+from .email_sender import SMTP_SERVER, deliver_email
+from .events import insert_events
+from .models import EmailContent
+from .storage import get_connection
+from .suppression import RecipientSuppressed, suppression_index
+
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "4"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_RETRY_BASE = float(os.getenv("OUTBOX_RETRY_BASE", "30"))
+OUTBOX_RETRY_MAX = float(os.getenv("OUTBOX_RETRY_MAX", "3600"))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "1"))
+# A job left 'sending' for this long belonged to a worker that died; it is
+# picked up again.
+OUTBOX_LEASE_TIMEOUT = float(os.getenv("OUTBOX_LEASE_TIMEOUT", "300"))
+# Messages per second per SMTP host, per process; 0 disables the limit.
+SMTP_RATE_LIMIT = float(os.getenv("SMTP_RATE_LIMIT", "5"))
+SMTP_RATE_BURST = int(os.getenv("SMTP_RATE_BURST", "10"))
+
+JOB_STATUSES = ('queued', 'sending', 'sent', 'dead')
+
+_work_available = threading.Condition()
+
+class TokenBucket:
+    """Allows ``rate`` acquisitions per second on average, in bursts of up to ``capacity``."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = max(capacity, 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, stop: Optional[threading.Event] = None) -> bool:
+        """Block until a token is available; returns False if ``stop`` is set first."""
+        if self.rate <= 0:
+            return True
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if stop is None:
+                time.sleep(wait)
+            elif stop.wait(wait):
+                return False
+
+_rate_limiters = {}
+_rate_limiters_lock = threading.Lock()
+
+def get_rate_limiter(host: Optional[str]) -> TokenBucket:
+    with _rate_limiters_lock:
+        limiter = _rate_limiters.get(host)
+        if limiter is None:
+            limiter = _rate_limiters[host] = TokenBucket(SMTP_RATE_LIMIT, SMTP_RATE_BURST)
+        return limiter
+
+def enqueue_emails(email_ids: List[int], smtp_host: Optional[str] = SMTP_SERVER) -> Dict[int, int]:
+    """Queue stored emails for sending; returns {email_id: job_id}.
+
+    Emails that already have a live or finished job keep it; dead-lettered
+    jobs are queued again with a fresh attempt count.
+    """
+    conn = get_connection()
+    now = time.time()
+    jobs = {}
+    queued = []
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        for email_id in email_ids:
+            row = conn.execute("SELECT id, status FROM outbox WHERE email_id = ?", (email_id,)).fetchone()
+            if row is None:
+                jobs[email_id] = conn.execute(
+                    "INSERT INTO outbox (email_id, smtp_host, status, next_attempt_at, created_at, updated_at) VALUES (?, ?, 'queued', ?, ?, ?)",
+                    (email_id, smtp_host, now, now, now),
+                ).lastrowid
+                queued.append(email_id)
+                continue
+            jobs[email_id] = row['id']
+            if row['status'] == 'dead':
+                conn.execute(
+                    "UPDATE outbox SET status = 'queued', attempts = 0, last_error = NULL, next_attempt_at = ?, updated_at = ? WHERE id = ?",
+                    (now, now, row['id']),
+                )
+                queued.append(email_id)
+        insert_events(conn, [(email_id, 'queued', None, None) for email_id in queued])
+    if queued:
+        with _work_available:
+            _work_available.notify_all()
+    return jobs
+
+def claim_jobs(limit: int = 1, lease_timeout: float = OUTBOX_LEASE_TIMEOUT) -> List[Dict]:
+    """Mark up to ``limit`` due jobs as 'sending' and return them with their email."""
+    conn = get_connection()
+    now = time.time()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        rows = conn.execute(
+            """
+            SELECT outbox.id, outbox.email_id, outbox.smtp_host, outbox.attempts,
+                   emails.recipient_email, emails.generated_subject, emails.generated_body, emails.timestamp
+            FROM outbox JOIN emails ON emails.id = outbox.email_id
+            WHERE (outbox.status = 'queued' AND outbox.next_attempt_at <= ?)
+               OR (outbox.status = 'sending' AND outbox.updated_at <= ?)
+            ORDER BY outbox.next_attempt_at
+            LIMIT ?
+            """,
+            (now, now - lease_timeout, limit),
+        ).fetchall()
+        conn.executemany(
+            "UPDATE outbox SET status = 'sending', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+            [(now, row['id']) for row in rows],
+        )
+    return [{**dict(row), 'attempts': row['attempts'] + 1} for row in rows]
+
+def retry_delay(attempts: int, base: float = OUTBOX_RETRY_BASE, maximum: float = OUTBOX_RETRY_MAX) -> float:
+    """Exponential backoff with jitter, so retries from a failed burst spread out."""
+    delay = min(maximum, base * 2 ** (attempts - 1))
+    return delay * random.uniform(0.5, 1.0)
+
+def is_permanent_failure(error: Exception) -> bool:
+    # 5xx replies about the recipient or the message will not change on retry;
+    # 4xx ones (greylisting, a full mailbox), authentication and connection
+    # problems might.
+    if isinstance(error, RecipientSuppressed):
+        return True
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return bool(error.recipients) and all(500 <= code < 600 for code, _ in error.recipients.values())
+    return isinstance(error, smtplib.SMTPDataError) and 500 <= error.smtp_code < 600
+
+def finish_job(job: Dict, error: Optional[Exception] = None, max_attempts: int = OUTBOX_MAX_ATTEMPTS):
+    """Record a send attempt: sent, retried later, or dead-lettered."""
+    conn = get_connection()
+    now = time.time()
+    with conn:
+        if error is None:
+            conn.execute("UPDATE outbox SET status = 'sent', last_error = NULL, updated_at = ? WHERE id = ?", (now, job['id']))
+            insert_events(conn, [(job['email_id'], 'sent', None, None)])
+            return
+        permanent = is_permanent_failure(error)
+        if permanent or job['attempts'] >= max_attempts:
+            conn.execute(
+                "UPDATE outbox SET status = 'dead', last_error = ?, updated_at = ? WHERE id = ?",
+                (str(error), now, job['id']),
+            )
+            bounced = permanent and not isinstance(error, RecipientSuppressed)
+            insert_events(conn, [(job['email_id'], 'bounced' if bounced else 'failed', None, str(error))])
+            return
+        conn.execute(
+            "UPDATE outbox SET status = 'queued', last_error = ?, next_attempt_at = ?, updated_at = ? WHERE id = ?",
+            (str(error), now + retry_delay(job['attempts']), now, job['id']),
+        )
+
+def release_job(job: Dict):
+    """Put a claimed job back without counting the attempt."""
+    conn = get_connection()
+    with conn:
+        conn.execute(
+            "UPDATE outbox SET status = 'queued', attempts = attempts - 1, updated_at = ? WHERE id = ? AND status = 'sending'",
+            (time.time(), job['id']),
+        )
+
+def _job_state(row) -> Dict:
+    return {
+        'job_id': row['id'],
+        'draft_id': row['email_id'],
+        'status': row['status'],
+        'attempts': row['attempts'],
+        'last_error': row['last_error'],
+        'next_attempt_at': datetime.fromtimestamp(row['next_attempt_at']).isoformat() if row['status'] == 'queued' else None,
+        'updated_at': datetime.fromtimestamp(row['updated_at']).isoformat(),
+    }
+
+def get_job(job_id: int) -> Optional[Dict]:
+    row = get_connection().execute("SELECT * FROM outbox WHERE id = ?", (job_id,)).fetchone()
+    return _job_state(row) if row else None
+
+def get_outbox_counts() -> Dict[str, int]:
+    counts = dict.fromkeys(JOB_STATUSES, 0)
+    for row in get_connection().execute("SELECT status, COUNT(*) FROM outbox GROUP BY status"):
+        counts[row[0]] = row[1]
+    return counts
+
+class OutboxWorker:
+    """Threads that drain the outbox.
+
+    Jobs are claimed in a transaction, so workers in several processes can
+    share one database.
+    """
+
+    def __init__(self, workers: int = OUTBOX_WORKERS, poll_interval: float = OUTBOX_POLL_INTERVAL):
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._threads = [threading.Thread(target=self._run, name=f"outbox-worker-{index}", daemon=True) for index in range(workers)]
+
+    def start(self):
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with _work_available:
+            _work_available.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not self.run_once():
+                with _work_available:
+                    _work_available.wait(self.poll_interval)
+
+    def run_once(self) -> bool:
+        """Send one due job; returns False when there was nothing to do."""
+        try:
+            jobs = claim_jobs()
+            if not jobs:
+                return False
+            job = jobs[0]
+            if not get_rate_limiter(job['smtp_host']).acquire(self._stop):
+                release_job(job)
+                return False
+            content = EmailContent(subject=job['generated_subject'] or "", body=job['generated_body'] or "", greeting="", closing="", timestamp=job['timestamp'])
+            # Opt-outs and bounces recorded after the job was queued still stop it.
+            blocked = suppression_index.check([job['recipient_email']], allow_recontact=True)
+            try:
+                if blocked:
+                    raise RecipientSuppressed(job['recipient_email'], blocked[job['recipient_email']])
+                deliver_email(job['recipient_email'], content)
+            except Exception as e:
+                finish_job(job, e)
+            else:
+                finish_job(job)
+            return True
+        except Exception as e:
+            print(f"Error processing outbox: {e}")
+            return False
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run outbox send workers until interrupted")
+    parser.add_argument("--workers", type=int, default=OUTBOX_WORKERS or 1)
+    args = parser.parse_args()
+    worker = OutboxWorker(args.workers).start()
+    print(f"Sending queued emails with {args.workers} workers; Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(60)
+            print(get_outbox_counts())
+    except KeyboardInterrupt:
+        worker.stop()
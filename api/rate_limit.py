@@ -0,0 +1,405 @@
+# Client-side limits for model calls. Requests and tokens per minute are
+# paced with token buckets, concurrency adapts to throttling (additive
+# increase, multiplicative decrease), and throttled or transient failures are
+# retried with jitter. Set LLM_RATE_LIMIT_SHARED=true to share the per-minute
+# budgets between worker processes through the SQLite database; the
+# concurrency limit always applies per process.
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+from .metrics import LLM_REQUESTS, LLM_RETRIES, CallbackMetric, observe_stage
+from .storage import get_connection
+
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "30"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "15000"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", "1"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "4"))
+LLM_RETRY_BASE = float(os.getenv("LLM_RETRY_BASE", "1"))
+LLM_RETRY_MAX = float(os.getenv("LLM_RETRY_MAX", "30"))
+LLM_RATE_LIMIT_SHARED = os.getenv("LLM_RATE_LIMIT_SHARED", "false").lower() == "true"
+TRANSIENT_STATUS_CODES = (500, 502, 503, 504)
+
+def _refill(tokens, updated_at, now, rate, capacity):
+    return min(capacity, tokens + max(0.0, now - updated_at) * rate)
+
+class RateBudget:
+    """Token bucket refilled at ``per_minute / 60`` per second.
+
+    ``reserve`` always succeeds but may overdraw the bucket; it returns how
+    long the caller must wait before using what it reserved, so waiters are
+    served in order without polling.
+    """
+
+    def __init__(self, name: str, per_minute: float):
+        self.name = name
+        self.rate = per_minute / 60
+        self.capacity = per_minute
+        self._tokens = per_minute
+        self._updated = time.time()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            now = time.time()
+            delay = max(0.0, self._blocked_until - now)
+            if self.rate <= 0:
+                return delay
+            self._tokens = _refill(self._tokens, self._updated, now, self.rate, self.capacity) - amount
+            self._updated = now
+            return max(delay, -self._tokens / self.rate)
+
+    def block(self, seconds: float):
+        """Hold back every reservation for ``seconds`` (e.g. a Retry-After)."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.time() + seconds)
+
+class SharedRateBudget(RateBudget):
+    """A ``RateBudget`` kept in the database, shared by every process using it."""
+
+    def reserve(self, amount: float) -> float:
+        conn = get_connection()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated_at, blocked_until FROM rate_limits WHERE name = ?", (self.name,)).fetchone()
+            tokens, updated_at, blocked_until = row if row else (self.capacity, now, 0.0)
+            delay = max(0.0, blocked_until - now)
+            if self.rate > 0:
+                tokens = _refill(tokens, updated_at, now, self.rate, self.capacity) - amount
+                delay = max(delay, -tokens / self.rate)
+            conn.execute(
+                "INSERT INTO rate_limits (name, tokens, updated_at, blocked_until) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                (self.name, tokens, now, blocked_until),
+            )
+        return delay
+
+    def block(self, seconds: float):
+        conn = get_connection()
+        until = time.time() + seconds
+        with conn:
+            conn.execute(
+                "INSERT INTO rate_limits (name, tokens, updated_at, blocked_until) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET blocked_until = MAX(blocked_until, excluded.blocked_until)",
+                (self.name, self.capacity, time.time(), until),
+            )
+
+class AdaptiveConcurrency:
+    """A concurrency limit that grows by one per window of successes and halves when throttled.
+
+    Waiters (threads or coroutines) are served first in, first out.
+    """
+
+    def __init__(self, maximum: int = LLM_MAX_CONCURRENCY, minimum: int = LLM_MIN_CONCURRENCY):
+        self.maximum = max(maximum, 1)
+        self.minimum = max(min(minimum, self.maximum), 1)
+        self.limit = float(self.maximum)
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    def _wake(self):
+        while self._waiters and self.in_flight < int(self.limit):
+            waiter = self._waiters.popleft()
+            self.in_flight += 1
+            if isinstance(waiter, threading.Event):
+                waiter.set()
+            else:
+                loop, future = waiter
+                loop.call_soon_threadsafe(self._grant, future)
+
+    def _grant(self, future):
+        if future.cancelled():
+            self.release()
+        else:
+            future.set_result(None)
+
+    def acquire(self):
+        with self._lock:
+            if not self._waiters and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+        event.wait()
+
+    async def aacquire(self):
+        with self._lock:
+            if not self._waiters and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            waiter = (loop, future)
+            self._waiters.append(waiter)
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+            # Granted already: _grant releases a cancelled future's slot,
+            # otherwise it is ours to give back.
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._wake()
+
+    def on_success(self):
+        with self._lock:
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._wake()
+
+    def on_throttle(self, started: float):
+        """Halve the limit, at most once per round trip.
+
+        Calls started before the last decrease were sent under the old limit,
+        so their throttling is not a new signal.
+        """
+        with self._lock:
+            if started >= self._last_decrease:
+                self.limit = max(self.minimum, self.limit / 2)
+                self._last_decrease = time.monotonic()
+
+def _status_code(error) -> Optional[int]:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+def retry_after(error) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return max(0.0, float(headers.get("retry-after")))
+    except (TypeError, ValueError):
+        return None
+
+def is_throttled(error) -> bool:
+    return _status_code(error) == 429 or type(error).__name__ == "RateLimitError"
+
+def is_transient(error) -> bool:
+    if _status_code(error) in TRANSIENT_STATUS_CODES:
+        return True
+    return isinstance(error, (TimeoutError, ConnectionError)) or type(error).__name__ in ("APIConnectionError", "APITimeoutError", "InternalServerError")
+
+class LLMRateLimiter:
+    """Paces, bounds and retries the calls made to one model."""
+
+    def __init__(self, name: str, requests_per_minute: float = LLM_REQUESTS_PER_MINUTE, tokens_per_minute: float = LLM_TOKENS_PER_MINUTE,
+                 max_concurrency: int = LLM_MAX_CONCURRENCY, min_concurrency: int = LLM_MIN_CONCURRENCY,
+                 max_retries: int = LLM_MAX_RETRIES, shared: bool = LLM_RATE_LIMIT_SHARED):
+        budget = SharedRateBudget if shared else RateBudget
+        self.name = name
+        self.shared = shared
+        self.requests = budget(f"{name}:requests", requests_per_minute)
+        self.tokens = budget(f"{name}:tokens", tokens_per_minute)
+        self.concurrency = AdaptiveConcurrency(max_concurrency, min_concurrency)
+        self.max_retries = max_retries
+        self.calls = 0
+        self.throttled = 0
+        self.retries = 0
+        self._stats_lock = threading.Lock()
+
+    def _reserve(self, tokens: int) -> float:
+        return max(self.requests.reserve(1), self.tokens.reserve(tokens))
+
+    def _retry_delay(self, error, attempt: int, started: float) -> Optional[float]:
+        """Return how long to wait before retrying ``error``, or None to give up."""
+        throttled = is_throttled(error)
+        if attempt >= self.max_retries or not (throttled or is_transient(error)):
+            return None
+        with self._stats_lock:
+            self.retries += 1
+            self.throttled += throttled
+        LLM_RETRIES.inc(self.name, "throttled" if throttled else "transient")
+        delay = random.uniform(0, min(LLM_RETRY_MAX, LLM_RETRY_BASE * 2 ** attempt))
+        if throttled:
+            self.concurrency.on_throttle(started)
+            wait = retry_after(error)
+            if wait is not None:
+                # Everyone waits out the provider's window, not just this call.
+                self.requests.block(wait)
+                delay = wait + random.uniform(0, LLM_RETRY_BASE)
+        return delay
+
+    def _succeeded(self):
+        self.concurrency.on_success()
+        with self._stats_lock:
+            self.calls += 1
+        LLM_REQUESTS.inc(self.name, "success")
+
+    def _failed(self):
+        LLM_REQUESTS.inc(self.name, "error")
+
+    async def _areserve(self, tokens: int) -> float:
+        # Shared budgets live in the database; keep that off the event loop.
+        if self.shared:
+            return await asyncio.to_thread(self._reserve, tokens)
+        return self._reserve(tokens)
+
+    def call(self, fn, tokens: int = 0):
+        """Run ``fn()`` within the limits, retrying throttled and transient failures."""
+        attempt = 0
+        while True:
+            waiting = time.perf_counter()
+            time.sleep(self._reserve(tokens))
+            self.concurrency.acquire()
+            observe_stage("llm_rate_limit_wait", time.perf_counter() - waiting)
+            started = time.monotonic()
+            try:
+                result = fn()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, started)
+                if delay is None:
+                    self._failed()
+                    raise
+            else:
+                self._succeeded()
+                return result
+            finally:
+                self.concurrency.release()
+            time.sleep(delay)
+            attempt += 1
+
+    async def acall(self, fn, tokens: int = 0):
+        """Async counterpart of ``call``; ``fn()`` returns an awaitable."""
+        attempt = 0
+        while True:
+            waiting = time.perf_counter()
+            await asyncio.sleep(await self._areserve(tokens))
+            await self.concurrency.aacquire()
+            observe_stage("llm_rate_limit_wait", time.perf_counter() - waiting)
+            started = time.monotonic()
+            try:
+                result = await fn()
+            except Exception as e:
+                delay = self._retry_delay(e, attempt, started)
+                if delay is None:
+                    self._failed()
+                    raise
+            else:
+                self._succeeded()
+                return result
+            finally:
+                self.concurrency.release()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def amap(self, calls, max_concurrency: Optional[int] = None) -> List:
+        """``acall`` each (fn, tokens) pair concurrently; exceptions are returned in place of results."""
+        semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+        async def run(fn, tokens):
+            if semaphore is None:
+                return await self.acall(fn, tokens)
+            async with semaphore:
+                return await self.acall(fn, tokens)
+
+        return await asyncio.gather(*(run(fn, tokens) for fn, tokens in calls), return_exceptions=True)
+
+    def stream(self, fn, tokens: int = 0):
+        """Yield from ``fn()`` within the limits; retried only until the first item arrives."""
+        attempt = 0
+        while True:
+            waiting = time.perf_counter()
+            time.sleep(self._reserve(tokens))
+            self.concurrency.acquire()
+            observe_stage("llm_rate_limit_wait", time.perf_counter() - waiting)
+            started = time.monotonic()
+            yielded = False
+            try:
+                for item in fn():
+                    yielded = True
+                    yield item
+            except Exception as e:
+                delay = None if yielded else self._retry_delay(e, attempt, started)
+                if delay is None:
+                    self._failed()
+                    raise
+            else:
+                self._succeeded()
+                return
+            finally:
+                self.concurrency.release()
+            time.sleep(delay)
+            attempt += 1
+
+    async def astream(self, fn, tokens: int = 0):
+        """Async counterpart of ``stream``; ``fn()`` returns an async iterator."""
+        attempt = 0
+        while True:
+            waiting = time.perf_counter()
+            await asyncio.sleep(await self._areserve(tokens))
+            await self.concurrency.aacquire()
+            observe_stage("llm_rate_limit_wait", time.perf_counter() - waiting)
+            started = time.monotonic()
+            yielded = False
+            try:
+                async for item in fn():
+                    yielded = True
+                    yield item
+            except Exception as e:
+                delay = None if yielded else self._retry_delay(e, attempt, started)
+                if delay is None:
+                    self._failed()
+                    raise
+            else:
+                self._succeeded()
+                return
+            finally:
+                self.concurrency.release()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            return {
+                "concurrency_limit": round(self.concurrency.limit, 2),
+                "in_flight": self.concurrency.in_flight,
+                "calls": self.calls,
+                "throttled": self.throttled,
+                "retries": self.retries,
+            }
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_llm_limiter(model_name: str) -> LLMRateLimiter:
+    """Providers rate-limit each model separately, so each gets its own limiter."""
+    with _limiters_lock:
+        limiter = _limiters.get(model_name)
+        if limiter is None:
+            limiter = _limiters[model_name] = LLMRateLimiter(model_name)
+        return limiter
+
+def configure_llm_limiter(model_name: str, **settings) -> LLMRateLimiter:
+    """Replace a model's limiter, e.g. to lift the limits for an offline benchmark."""
+    with _limiters_lock:
+        limiter = _limiters[model_name] = LLMRateLimiter(model_name, **settings)
+        return limiter
+
+def get_llm_limiter_stats() -> Dict[str, Dict]:
+    with _limiters_lock:
+        return {name: limiter.stats() for name, limiter in _limiters.items()}
+
+def _limiter_gauges():
+    return {
+        (name, key): value
+        for name, stats in get_llm_limiter_stats().items()
+        for key, value in stats.items()
+        if key in ("concurrency_limit", "in_flight")
+    }
+
+CallbackMetric("reachout_llm_concurrency", "Adaptive concurrency limit and calls in flight per model.", "gauge", ("model", "kind"), _limiter_gauges)
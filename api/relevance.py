@@ -0,0 +1,153 @@
+import math
+import os
+import re
+import threading
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+CONTEXT_CHUNK_TOKENS = int(os.getenv("CONTEXT_CHUNK_TOKENS", "120"))
+CHARS_PER_TOKEN = 4
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the their this to was were will with".split()
+)
+_WORD_RE = re.compile(r"[a-z0-9]+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def tokenize(text: str) -> List[str]:
+    return [word for word in _WORD_RE.findall(text.lower()) if word not in STOPWORDS]
+
+def _hard_split(piece: str, chunk_tokens: int) -> List[str]:
+    """Cut a piece with no usable breaks into runs of words (or characters) of at most ``chunk_tokens``."""
+    limit = max(1, chunk_tokens * CHARS_PER_TOKEN)
+    parts = []
+    current = ""
+    for word in piece.split():
+        while len(word) > limit:
+            if current:
+                parts.append(current)
+                current = ""
+            parts.append(word[:limit])
+            word = word[limit:]
+        if current and len(current) + 1 + len(word) > limit:
+            parts.append(current)
+            current = ""
+        current = f"{current} {word}" if current else word
+    if current:
+        parts.append(current)
+    return parts
+
+def split_chunks(text: str, chunk_tokens: int = CONTEXT_CHUNK_TOKENS) -> List[str]:
+    """Split on paragraphs, lines, then sentences, packing pieces into chunks of about ``chunk_tokens``.
+
+    PDF text often breaks lines without punctuation, and a piece still too
+    large on its own is cut by words, so no chunk is much over ``chunk_tokens``.
+    """
+    chunks = []
+    current = []
+    size = 0
+    for paragraph in re.split(r"\n\s*\n", text):
+        for line in paragraph.split("\n"):
+            for sentence in _SENTENCE_RE.split(line.strip()):
+                if not sentence:
+                    continue
+                pieces = [sentence] if estimate_tokens(sentence) <= chunk_tokens else _hard_split(sentence, chunk_tokens)
+                for piece in pieces:
+                    tokens = estimate_tokens(piece)
+                    if current and size + tokens > chunk_tokens:
+                        chunks.append(" ".join(current))
+                        current, size = [], 0
+                    current.append(piece)
+                    size += tokens
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+@lru_cache(maxsize=32)
+def _indexed_chunks(text: str, chunk_tokens: int) -> Tuple[Tuple[str, Counter], ...]:
+    # Campaigns reuse one document for many recipients; index it once.
+    return tuple((chunk, Counter(tokenize(chunk))) for chunk in split_chunks(text, chunk_tokens))
+
+def bm25_scores(documents: List[Counter], query: List[str]) -> List[float]:
+    if not documents:
+        return []
+    lengths = [sum(terms.values()) for terms in documents]
+    average_length = sum(lengths) / len(documents) or 1
+    scores = [0.0] * len(documents)
+    for term in set(query):
+        containing = sum(1 for terms in documents if term in terms)
+        if not containing:
+            continue
+        idf = math.log(1 + (len(documents) - containing + 0.5) / (containing + 0.5))
+        for index, terms in enumerate(documents):
+            frequency = terms.get(term, 0)
+            if frequency:
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[index] / average_length)
+                scores[index] += idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+    return scores
+
+class ContextSelectionStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.trimmed_requests = 0
+        self.tokens_in = 0
+        self.tokens_saved = 0
+
+    def record(self, original_tokens: int, selected_tokens: int):
+        with self._lock:
+            self.requests += 1
+            self.tokens_in += original_tokens
+            if selected_tokens < original_tokens:
+                self.trimmed_requests += 1
+                self.tokens_saved += original_tokens - selected_tokens
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "trimmed_requests": self.trimmed_requests,
+                "tokens_in": self.tokens_in,
+                "tokens_saved": self.tokens_saved,
+            }
+
+context_stats = ContextSelectionStats()
+
+def select_context(text: str, query: str, budget: int = CONTEXT_TOKEN_BUDGET, chunk_tokens: int = CONTEXT_CHUNK_TOKENS) -> Tuple[str, Dict]:
+    """Keep the chunks of ``text`` most relevant to ``query`` that fit within ``budget`` tokens.
+
+    Selected chunks keep their original order. Returns the text and a
+    summary with the original, selected and saved token counts.
+    """
+    original_tokens = estimate_tokens(text)
+    if original_tokens <= budget:
+        context_stats.record(original_tokens, original_tokens)
+        return text, {"original_tokens": original_tokens, "selected_tokens": original_tokens, "saved_tokens": 0}
+
+    indexed = _indexed_chunks(text, chunk_tokens)
+    scores = bm25_scores([terms for _, terms in indexed], tokenize(query))
+    ranked = sorted(range(len(indexed)), key=lambda index: (-scores[index], index))
+    selected = []
+    used = 0
+    # Counted in characters, separators included, so the joined context stays within the budget.
+    for index in ranked:
+        length = len(indexed[index][0]) + (2 if selected else 0)
+        if used + length > budget * CHARS_PER_TOKEN:
+            continue
+        selected.append(index)
+        used += length
+    if selected:
+        context = "\n\n".join(indexed[index][0] for index in sorted(selected))
+    else:
+        # Every chunk is over the budget (a budget below the chunk size): keep the start of the best one.
+        context = indexed[ranked[0]][0][:budget * CHARS_PER_TOKEN] if ranked else ""
+    selected_tokens = estimate_tokens(context)
+    context_stats.record(original_tokens, selected_tokens)
+    return context, {"original_tokens": original_tokens, "selected_tokens": selected_tokens, "saved_tokens": original_tokens - selected_tokens}
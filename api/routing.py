@@ -0,0 +1,333 @@
+# Routes model calls over an ordered list of models. A circuit breaker per
+# model skips one that keeps failing, and the next model on the route is
+# tried instead. Recent latencies per model set a hedging deadline (their
+# p95): when the answer is later than that, the next model on the route is
+# asked as well, the first answer wins and the other call is cancelled.
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Sequence
+from .metrics import CallbackMetric
+from .rate_limit import get_llm_limiter
+
+HEDGE_ENABLED = os.getenv("HEDGE_ENABLED", "true").lower() != "false"
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", "0.95"))
+# Below this many recorded calls a model's latency is not known well enough to hedge on.
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+MODEL_LATENCY_WINDOW = int(os.getenv("MODEL_LATENCY_WINDOW", "200"))
+MODEL_BREAKER_FAILURES = int(os.getenv("MODEL_BREAKER_FAILURES", "5"))
+MODEL_BREAKER_RESET = float(os.getenv("MODEL_BREAKER_RESET", "30"))
+
+class ModelsUnavailable(RuntimeError):
+    """Every model on the route has its circuit breaker open."""
+
+class CircuitBreaker:
+    """Opens after ``failures`` consecutive failures; after ``reset`` seconds
+    one trial call is let through, and its outcome closes or reopens it."""
+
+    def __init__(self, failures: int = MODEL_BREAKER_FAILURES, reset: float = MODEL_BREAKER_RESET):
+        self.failures = failures
+        self.reset = reset
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset:
+                self.state = "half_open"
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.consecutive_failures >= self.failures):
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+
+    def release(self):
+        """A trial call was cancelled before it finished; let another one through."""
+        with self._lock:
+            if self.state == "half_open":
+                self.state = "open"
+                self.opened_at = 0.0
+
+class LatencyWindow:
+    """The durations of a model's most recent calls."""
+
+    def __init__(self, size: int = MODEL_LATENCY_WINDOW):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+class ModelRouter:
+    """Calls the first healthy model on a route, with fallback and hedging."""
+
+    def __init__(self, hedge: bool = HEDGE_ENABLED, quantile: float = HEDGE_QUANTILE, min_samples: int = HEDGE_MIN_SAMPLES):
+        self.hedge = hedge
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self._breakers = {}
+        self._latencies = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def _model(self, name):
+        with self._lock:
+            if name not in self._breakers:
+                self._breakers[name] = CircuitBreaker()
+                self._latencies[name] = LatencyWindow()
+                self._counts[name] = {"calls": 0, "failures": 0, "fallbacks": 0, "hedges": 0, "hedge_wins": 0}
+            return self._breakers[name], self._latencies[name]
+
+    def _count(self, name, key):
+        with self._lock:
+            self._counts[name][key] += 1
+
+    def deadline(self, name: str) -> Optional[float]:
+        """Seconds after which a call to ``name`` is hedged, or None while there is too little data."""
+        latencies = self._model(name)[1]
+        if not self.hedge or len(latencies) < self.min_samples:
+            return None
+        return latencies.quantile(self.quantile)
+
+    def available(self, route: Sequence[str]) -> str:
+        """The first model on the route whose breaker lets a call through."""
+        for name in route:
+            if self._model(name)[0].allow():
+                return name
+        raise ModelsUnavailable(f"No model available; circuit open for {', '.join(route)}")
+
+    def record(self, name: str, error: bool = False):
+        """Feed a call's outcome into the model's breaker."""
+        breaker = self._model(name)[0]
+        self._count(name, "calls")
+        if error:
+            self._count(name, "failures")
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    @contextmanager
+    def track(self, name: str):
+        """Record the outcome of a call made to ``name`` outside the router, such as a stream."""
+        try:
+            yield
+        except Exception:
+            self.record(name, error=True)
+            raise
+        except BaseException:
+            self._model(name)[0].release()
+            raise
+        self.record(name)
+
+    def _timed(self, name, fn, started):
+        async def call():
+            started.set()
+            # Only the model call itself: time queued in the rate limiter says nothing about the model.
+            start = time.perf_counter()
+            try:
+                result = await fn()
+            except asyncio.CancelledError:
+                # A hedged call that lost still took at least this long; leaving
+                # it out would pull the p95, and so the deadline, ever lower.
+                self._model(name)[1].add(time.perf_counter() - start)
+                raise
+            self._model(name)[1].add(time.perf_counter() - start)
+            return result
+        return call
+
+    async def _attempt(self, name, call_for, tokens, started):
+        try:
+            result = await get_llm_limiter(name).acall(self._timed(name, call_for(name), started), tokens)
+        except asyncio.CancelledError:
+            self._model(name)[0].release()
+            raise
+        except Exception:
+            self.record(name, error=True)
+            raise
+        self.record(name)
+        return result
+
+    async def _deadline(self, name, started):
+        await started.wait()
+        await asyncio.sleep(self.deadline(name))
+
+    def _saturated(self, name):
+        # Hedging into a model that is already at its concurrency limit only queues more work behind it.
+        concurrency = get_llm_limiter(name).concurrency
+        return concurrency.in_flight >= int(concurrency.limit)
+
+    async def acall(self, route: Sequence[str], call_for: Callable, tokens: int = 0):
+        """Run ``call_for(model)()`` for the first healthy model on ``route``, through that model's rate limiter.
+
+        A failed call falls back to the next model. A call slower than its
+        model's p95 is hedged with the next model (or the same one, for a
+        single-model route); the first result wins and the other call is
+        cancelled.
+        """
+        untried = list(route)
+        calls = {}
+        timer = None
+        error = None
+
+        def next_model():
+            # Models whose breaker is open are passed over for good.
+            while untried:
+                name = untried.pop(0)
+                if self._model(name)[0].allow():
+                    return name
+            return None
+
+        def launch(name, hedge=False):
+            started = asyncio.Event()
+            calls[asyncio.ensure_future(self._attempt(name, call_for, tokens, started))] = (name, started, hedge)
+            return started
+
+        primary = next_model()
+        if primary is None:
+            raise ModelsUnavailable(f"No model available; circuit open for {', '.join(route)}")
+        try:
+            started = launch(primary)
+            if self.deadline(primary) is not None:
+                timer = asyncio.ensure_future(self._deadline(primary, started))
+            while calls:
+                done, _ = await asyncio.wait(list(calls) + ([timer] if timer else []), return_when=asyncio.FIRST_COMPLETED)
+                fired = timer is not None and timer in done
+                for task in done:
+                    if task not in calls:
+                        continue
+                    name, _, hedge = calls.pop(task)
+                    if task.exception() is None:
+                        if hedge:
+                            self._count(name, "hedge_wins")
+                        return task.result()
+                    error = task.exception()
+                    # The deadline was the failed call's; a fallback is not hedged against it.
+                    if timer is not None:
+                        timer.cancel()
+                        timer = None
+                    if not calls and untried:
+                        fallback = next_model()
+                        if fallback is not None:
+                            self._count(name, "fallbacks")
+                            launch(fallback)
+                if fired and timer is not None:
+                    timer = None
+                    # The hedge goes to the model a fallback would, or to the primary again on a single-model route.
+                    if untried:
+                        hedge_model = next_model()
+                    else:
+                        hedge_model = primary if self._model(primary)[0].allow() else None
+                    if hedge_model is not None and self._saturated(hedge_model):
+                        # Not called after all: undo the breaker's trial and keep the model for a fallback.
+                        self._model(hedge_model)[0].release()
+                        if hedge_model != primary:
+                            untried.insert(0, hedge_model)
+                    elif hedge_model is not None:
+                        launch(hedge_model, hedge=True)
+                        self._count(primary, "hedges")
+        finally:
+            for task in list(calls) + ([timer] if timer else []):
+                task.cancel()
+        raise error or ModelsUnavailable(f"No model available; circuit open for {', '.join(route)}")
+
+    async def amap(self, calls, max_concurrency: Optional[int] = None) -> List:
+        """``acall`` each (route, call_for, tokens) concurrently; exceptions are returned in place of results."""
+        semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+
+        async def run(route, call_for, tokens):
+            if semaphore is None:
+                return await self.acall(route, call_for, tokens)
+            async with semaphore:
+                return await self.acall(route, call_for, tokens)
+
+        return await asyncio.gather(*(run(*call) for call in calls), return_exceptions=True)
+
+    def call(self, route: Sequence[str], call_for: Callable, tokens: int = 0):
+        """Blocking counterpart of ``acall``, with fallback but without hedging."""
+        error = None
+        for name in route:
+            if not self._model(name)[0].allow():
+                continue
+            if error is not None:
+                self._count(name, "fallbacks")
+            fn = call_for(name)
+
+            def timed():
+                start = time.perf_counter()
+                result = fn()
+                self._model(name)[1].add(time.perf_counter() - start)
+                return result
+
+            try:
+                result = get_llm_limiter(name).call(timed, tokens)
+            except Exception as e:
+                self.record(name, error=True)
+                error = e
+                continue
+            self.record(name)
+            return result
+        raise error or ModelsUnavailable(f"No model available; circuit open for {', '.join(route)}")
+
+    def stats(self) -> Dict[str, Dict]:
+        with self._lock:
+            names = list(self._breakers)
+        stats = {}
+        for name in names:
+            breaker, latencies = self._model(name)
+            p50, p95 = latencies.quantile(0.5), latencies.quantile(self.quantile)
+            with self._lock:
+                counts = dict(self._counts[name])
+            stats[name] = {
+                **counts,
+                "breaker": breaker.state,
+                "breaker_opened": breaker.times_opened,
+                "latency_samples": len(latencies),
+                "p50_seconds": round(p50, 3) if p50 is not None else None,
+                "p95_seconds": round(p95, 3) if p95 is not None else None,
+                "hedge_deadline_seconds": round(self.deadline(name), 3) if self.deadline(name) is not None else None,
+            }
+        return stats
+
+model_router = ModelRouter()
+
+CallbackMetric(
+    "reachout_model_breaker_open", "1 while a model's circuit breaker is open or half open.", "gauge", ("model",),
+    lambda: {(name,): int(stats["breaker"] != "closed") for name, stats in model_router.stats().items()},
+)
+CallbackMetric(
+    "reachout_model_calls_total", "Routed model calls by outcome.", "counter", ("model", "kind"),
+    lambda: {
+        (name, kind): stats[kind]
+        for name, stats in model_router.stats().items()
+        for kind in ("calls", "failures", "fallbacks", "hedges", "hedge_wins")
+    },
+)
@@ -0,0 +1,112 @@
+# Full-text search over generated emails, answered from the emails_fts index
+# (see storage.SEARCH_SCHEMA) that triggers keep in step with every write.
+import os
+import re
+import sqlite3
+import sys
+from typing import Dict, List, Optional, Tuple
+from .storage import SEARCH_COLUMNS
+from .utils import get_email_connection
+
+SEARCH_MAX_LIMIT = 100
+# Only the newest this many matches are ranked; older ones follow by date.
+# Scoring is linear in the matches, so a word found in most emails would
+# otherwise score them all; rarer queries, the usual kind, are ranked over
+# every match.
+SEARCH_RANK_WINDOW = int(os.getenv("SEARCH_RANK_WINDOW", "5000"))
+SNIPPET_TOKENS = 24
+# Filter name -> indexed column it restricts the query to.
+SEARCH_FILTERS = {'company': 'recipient_company', 'role': 'recipient_role', 'subject': 'generated_subject'}
+
+_TERMS = re.compile(r'"([^"]*)"|(\S+)')
+
+class SearchUnavailable(RuntimeError):
+    pass
+
+def _phrase(text: str) -> str:
+    prefix = text.endswith("*")
+    text = text.rstrip("*").replace('"', '""').strip()
+    return f'"{text}"*' if prefix and text else (f'"{text}"' if text else "")
+
+def match_expression(query: str = "", **filters: Optional[str]) -> str:
+    """An FTS5 query from free text: every word must match, "quoted text" as a phrase,
+    a trailing * as a prefix. Filters (see SEARCH_FILTERS) restrict their words to one column.
+
+    Terms are quoted, so FTS5 operators and punctuation in the input are searched
+    for as text rather than parsed.
+    """
+    parts = []
+    for name, text in [("", query)] + [(name, value) for name, value in filters.items() if value]:
+        if name and name not in SEARCH_FILTERS:
+            raise ValueError(f"Unknown search filter: {name}")
+        phrases = [phrase for phrase in (_phrase(quoted or word) for quoted, word in _TERMS.findall(text or "")) if phrase]
+        if phrases:
+            parts.append(f"{SEARCH_FILTERS[name]} : ({' '.join(phrases)})" if name else " ".join(phrases))
+    if not parts:
+        raise ValueError("Give search text or a company, role or subject filter")
+    return " AND ".join(f"({part})" for part in parts)
+
+def search_emails(query: str = "", limit: int = 20, offset: int = 0, email_type: Optional[str] = None,
+                  sender: Optional[str] = None, **filters: Optional[str]) -> Tuple[List[Dict], bool, bool]:
+    """Emails matching ``query``; whether there are more after this page; and whether
+    there were more matches than the ranking window.
+
+    The newest ``SEARCH_RANK_WINDOW`` matches come first, ranked by bm25 with
+    subjects, companies and roles weighted above body text; any older matches
+    follow, newest first. Each result carries a snippet of the body around
+    the matches.
+    """
+    expression = match_expression(query, **filters)
+    limit = max(1, min(limit, SEARCH_MAX_LIMIT))
+    offset = max(0, offset)
+    conditions = ["emails_fts MATCH ?"]
+    params = [expression]
+    for column, value in (("e.email_type", email_type), ("e.user_email", sender)):
+        if value:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    where = " AND ".join(conditions)
+    select = (
+        "SELECT e.id, e.timestamp, e.user_email, e.recipient_email, e.recipient_name, e.recipient_company, e.recipient_role, "
+        "e.email_type, e.specific_details, e.generated_subject, e.generated_body, e.status, "
+        f"snippet(emails_fts, {SEARCH_COLUMNS.index('generated_body')}, '[', ']', '…', {SNIPPET_TOKENS}) AS snippet, rank AS score "
+        f"FROM emails_fts JOIN emails e ON e.id = emails_fts.rowid WHERE {where} "
+    )
+    conn = get_email_connection()
+    try:
+        # Doclists are stored in rowid order, so the newest matches are found without scoring anything.
+        ranked, oldest = conn.execute(
+            f"SELECT count(*), coalesce(min(id), 0) FROM (SELECT emails_fts.rowid AS id FROM emails_fts JOIN emails e ON e.id = emails_fts.rowid "
+            f"WHERE {where} ORDER BY emails_fts.rowid DESC LIMIT ?)",
+            params + [SEARCH_RANK_WINDOW],
+        ).fetchone()
+        rows = []
+        if offset < ranked:
+            rows = conn.execute(
+                select + "AND emails_fts.rowid >= ? ORDER BY rank LIMIT ? OFFSET ?", params + [oldest, limit + 1, offset],
+            ).fetchall()
+        truncated = ranked >= SEARCH_RANK_WINDOW
+        if truncated and len(rows) <= limit:
+            rows += conn.execute(
+                select + "AND emails_fts.rowid < ? ORDER BY emails_fts.rowid DESC LIMIT ? OFFSET ?",
+                params + [oldest, limit + 1 - len(rows), max(0, offset - ranked)],
+            ).fetchall()
+    except sqlite3.OperationalError as e:
+        if "no such table" in str(e):
+            raise SearchUnavailable("Full-text search needs SQLite with FTS5")
+        raise ValueError(f"Invalid search: {e}")
+    # One row past the page tells whether another page exists, without counting every match.
+    return [dict(row) for row in rows[:limit]], len(rows) > limit, truncated
+
+def rebuild_search_index():
+    """Reindex every stored email and merge the index into as few segments as possible."""
+    conn = get_email_connection()
+    with conn:
+        conn.execute("INSERT INTO emails_fts (emails_fts) VALUES ('rebuild')")
+        conn.execute("INSERT INTO emails_fts (emails_fts) VALUES ('optimize')")
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python -m api.search rebuild")
+    rebuild_search_index()
+    print("Rebuilt the email search index")
@@ -0,0 +1,136 @@
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from queue import Empty, LifoQueue
+from .metrics import stage
+
+# Replies meaning the server is dropping the session (421) or cannot secure or
+# authenticate it (454), as opposed to refusing one message.
+CONNECTION_ERROR_CODES = (421, 454)
+
+class PooledSMTP(smtplib.SMTP):
+    """An SMTP session that notes whether the current message reached DATA."""
+
+    sent_data = False
+
+    def data(self, msg):
+        self.sent_data = True
+        return super().data(msg)
+
+class SMTPConnectionPool:
+    """A small pool of authenticated SMTP sessions shared across threads.
+
+    Sessions idle for longer than ``noop_interval`` are health-checked with
+    NOOP before reuse, and sessions idle for longer than ``idle_timeout``
+    are closed and replaced, since most providers drop them anyway.
+    """
+
+    def __init__(self, host, port, username=None, password=None, size=4,
+                 idle_timeout=60.0, noop_interval=5.0, starttls=True, timeout=30.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self.noop_interval = noop_interval
+        self.starttls = starttls
+        self.timeout = timeout
+        self._idle = LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        with stage("smtp_connect"):
+            server = PooledSMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            if self.starttls:
+                with stage("smtp_starttls"):
+                    server.starttls()
+            if self.username:
+                with stage("smtp_login"):
+                    server.login(self.username, self.password)
+        except Exception:
+            _quietly_close(server)
+            raise
+        return server
+
+    def _is_usable(self, server, last_used):
+        idle = time.monotonic() - last_used
+        if idle > self.idle_timeout:
+            return False
+        if idle < self.noop_interval:
+            return True
+        try:
+            return server.noop()[0] == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def _checkout(self):
+        while True:
+            try:
+                server, last_used = self._idle.get_nowait()
+            except Empty:
+                return self._connect()
+            if self._is_usable(server, last_used):
+                return server
+            _quietly_close(server)
+
+    @contextmanager
+    def connection(self):
+        self._slots.acquire()
+        try:
+            server = self._checkout()
+            try:
+                yield server
+            except Exception as e:
+                if _is_connection_error(e):
+                    _quietly_close(server)
+                    raise
+                # smtplib resets a refused transaction, so the session can send the next message.
+                self._idle.put((server, time.monotonic()))
+                raise
+            self._idle.put((server, time.monotonic()))
+        finally:
+            self._slots.release()
+
+    def send_message(self, message):
+        server = None
+        try:
+            with self.connection() as server, stage("smtp_send"):
+                server.sent_data = False
+                return server.send_message(message)
+        except smtplib.SMTPServerDisconnected:
+            # Once DATA went out the server may have accepted the message, and
+            # a retry could deliver it twice; the caller's backoff decides.
+            if server is not None and server.sent_data:
+                raise
+            # A pooled session can be dropped between the health check and
+            # the envelope; retry once on a fresh one.
+            with self.connection() as server, stage("smtp_send"):
+                server.sent_data = False
+                return server.send_message(message)
+
+    def close(self):
+        while True:
+            try:
+                server, _ = self._idle.get_nowait()
+            except Empty:
+                return
+            _quietly_close(server)
+
+def _is_connection_error(error):
+    # SMTPException subclasses OSError, so the SMTP cases come first.
+    if isinstance(error, smtplib.SMTPServerDisconnected):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code in CONNECTION_ERROR_CODES
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return any(code in CONNECTION_ERROR_CODES for code, _ in error.recipients.values())
+    return isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException)
+
+def _quietly_close(server):
+    try:
+        server.quit()
+    except (smtplib.SMTPException, OSError):
+        server.close()
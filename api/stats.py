@@ -0,0 +1,101 @@
+import sys
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Tuple
+from .storage import get_connection
+
+STATS_DIMENSIONS = ('total', 'email_type', 'sender', 'hour', 'day')
+
+def _stat_keys(email_type, sender, timestamp):
+    timestamp = timestamp or ''
+    return (
+        ('total', ''),
+        ('email_type', email_type or ''),
+        ('sender', sender or ''),
+        ('hour', timestamp[:13]),
+        ('day', timestamp[:10]),
+    )
+
+def _count(counts: Counter, metric, email_type, sender, timestamp, amount=1):
+    for dimension, key in _stat_keys(email_type, sender, timestamp):
+        counts[(dimension, key, metric)] += amount
+
+def increment_stats(conn, items: Iterable[Tuple[str, str, str, str]]):
+    """Bump counters for (metric, email_type, sender, timestamp) items inside the caller's transaction."""
+    counts = Counter()
+    for metric, email_type, sender, timestamp in items:
+        _count(counts, metric, email_type, sender, timestamp)
+    _write_counts(conn, counts)
+
+def _write_counts(conn, counts: Counter):
+    conn.executemany(
+        "INSERT INTO email_stats (dimension, key, metric, count) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(dimension, key, metric) DO UPDATE SET count = count + excluded.count",
+        [(*key, amount) for key, amount in counts.items()],
+    )
+
+def rebuild_stats() -> int:
+    """Recompute every counter from the email log and event history."""
+    conn = get_connection()
+    counts = Counter()
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        for row in conn.execute("SELECT email_type, user_email, timestamp FROM emails"):
+            _count(counts, 'generated', *row)
+        for row in conn.execute(
+            "SELECT ev.event, e.email_type, e.user_email, ev.timestamp FROM email_events ev "
+            "JOIN emails e ON e.id = ev.email_id WHERE ev.event != 'generated'"
+        ):
+            _count(counts, *row)
+        # Rows imported from the legacy CSV were marked sent without an event.
+        for row in conn.execute(
+            "SELECT email_type, user_email, timestamp FROM emails e WHERE sent = 1 AND NOT EXISTS "
+            "(SELECT 1 FROM email_events ev WHERE ev.email_id = e.id AND ev.event = 'sent')"
+        ):
+            _count(counts, 'sent', *row)
+        conn.execute("DELETE FROM email_stats")
+        _write_counts(conn, counts)
+    return len(counts)
+
+def ensure_stats():
+    """Build the counters for a log that predates them."""
+    conn = get_connection()
+    if conn.execute("SELECT 1 FROM email_stats LIMIT 1").fetchone() is None and conn.execute("SELECT 1 FROM emails LIMIT 1").fetchone() is not None:
+        rebuild_stats()
+
+def get_stat_totals() -> Dict[str, int]:
+    rows = get_connection().execute("SELECT metric, count FROM email_stats WHERE dimension = 'total' AND key = ''")
+    return {metric: count for metric, count in rows}
+
+def _by_key(rows) -> Dict[str, Dict[str, int]]:
+    grouped = {}
+    for key, metric, count in rows:
+        grouped.setdefault(key, {})[metric] = count
+    return grouped
+
+def get_stats(hours: int = 24, days: int = 30) -> Dict:
+    conn = get_connection()
+    now = datetime.now()
+    since = {
+        'hour': (now - timedelta(hours=hours)).isoformat()[:13],
+        'day': (now - timedelta(days=days)).isoformat()[:10],
+    }
+    stats = {'total': {'': get_stat_totals()}}
+    for dimension in STATS_DIMENSIONS[1:]:
+        rows = conn.execute(
+            "SELECT key, metric, count FROM email_stats WHERE dimension = ? AND key >= ? ORDER BY key",
+            (dimension, since.get(dimension, '')),
+        )
+        stats[dimension] = _by_key(rows)
+    return {
+        'totals': stats['total'].get('', {}),
+        'by_email_type': stats['email_type'],
+        'by_sender': stats['sender'],
+        'by_hour': stats['hour'],
+        'by_day': stats['day'],
+    }
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["rebuild"]:
+        sys.exit("usage: python -m api.stats rebuild")
+    print(f"Rebuilt {rebuild_stats()} counters")
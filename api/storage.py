@@ -0,0 +1,226 @@
+import csv
+import os
+import sqlite3
+import sys
+import threading
+
+EMAIL_DB_FILE = os.getenv("EMAIL_DB_FILE", "./email_data.db")
+MIGRATION_BATCH_SIZE = 1000
+
+EMAIL_COLUMNS = ['timestamp', 'user_email', 'recipient_email', 'recipient_name', 'recipient_company', 'recipient_role', 'email_type', 'specific_details', 'generated_subject', 'generated_body', 'sent']
+# Set only for A/B variants generated together; not part of the legacy CSV layout.
+VARIANT_COLUMNS = ['variant_group', 'variant']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS emails (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT NOT NULL,
+    user_email TEXT,
+    recipient_email TEXT,
+    recipient_name TEXT,
+    recipient_company TEXT,
+    recipient_role TEXT,
+    email_type TEXT,
+    specific_details TEXT,
+    generated_subject TEXT,
+    generated_body TEXT,
+    sent INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'generated',
+    variant_group TEXT,
+    variant INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_emails_user_email ON emails(user_email);
+CREATE INDEX IF NOT EXISTS idx_emails_recipient_email ON emails(recipient_email);
+CREATE INDEX IF NOT EXISTS idx_emails_timestamp ON emails(timestamp);
+CREATE INDEX IF NOT EXISTS idx_emails_sent ON emails(sent);
+CREATE INDEX IF NOT EXISTS idx_emails_variant_group ON emails(variant_group);
+CREATE TABLE IF NOT EXISTS email_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email_id INTEGER NOT NULL,
+    event TEXT NOT NULL,
+    recipient_email TEXT,
+    detail TEXT,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_email_events_email_id ON email_events(email_id);
+CREATE TABLE IF NOT EXISTS email_stats (
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dimension, key, metric)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS generation_cache (
+    key TEXT PRIMARY KEY,
+    model TEXT,
+    value TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_generation_cache_created_at ON generation_cache(created_at);
+CREATE TABLE IF NOT EXISTS documents (
+    id TEXT PRIMARY KEY,
+    text TEXT NOT NULL,
+    pages INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    email_id INTEGER NOT NULL UNIQUE,
+    smtp_host TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_status_next_attempt ON outbox(status, next_attempt_at);
+CREATE TABLE IF NOT EXISTS rate_limits (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    blocked_until REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS suppressions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    address TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    reason TEXT,
+    created_at REAL NOT NULL,
+    UNIQUE (address, kind)
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# Full-text index over the searchable email fields, kept in step with the
+# emails table by triggers. Statements run one by one (trigger bodies contain
+# semicolons) inside the transaction that creates the index.
+SEARCH_COLUMNS = ['generated_subject', 'generated_body', 'recipient_company', 'recipient_role', 'specific_details']
+# bm25 weight per search column: subjects, companies and roles count for more than body text.
+SEARCH_WEIGHTS = [5.0, 1.0, 3.0, 3.0, 1.0]
+_search_columns = ", ".join(SEARCH_COLUMNS)
+_new_values = ", ".join(f"new.{column}" for column in SEARCH_COLUMNS)
+_old_values = ", ".join(f"old.{column}" for column in SEARCH_COLUMNS)
+SEARCH_SCHEMA = [
+    f"CREATE VIRTUAL TABLE emails_fts USING fts5({_search_columns}, content='emails', content_rowid='id', tokenize='porter unicode61')",
+    f"INSERT INTO emails_fts (emails_fts, rank) VALUES ('rank', 'bm25({', '.join(str(weight) for weight in SEARCH_WEIGHTS)})')",
+    f"CREATE TRIGGER emails_fts_insert AFTER INSERT ON emails BEGIN "
+    f"INSERT INTO emails_fts (rowid, {_search_columns}) VALUES (new.id, {_new_values}); END",
+    f"CREATE TRIGGER emails_fts_delete AFTER DELETE ON emails BEGIN "
+    f"INSERT INTO emails_fts (emails_fts, rowid, {_search_columns}) VALUES ('delete', old.id, {_old_values}); END",
+    # Only edits to indexed text reindex a row, not status changes.
+    f"CREATE TRIGGER emails_fts_update AFTER UPDATE OF {_search_columns} ON emails BEGIN "
+    f"INSERT INTO emails_fts (emails_fts, rowid, {_search_columns}) VALUES ('delete', old.id, {_old_values}); "
+    f"INSERT INTO emails_fts (rowid, {_search_columns}) VALUES (new.id, {_new_values}); END",
+    # Emails stored before the index existed.
+    "INSERT INTO emails_fts (emails_fts) VALUES ('rebuild')",
+]
+
+# Columns added after the first release of the schema, applied in place to
+# existing databases.
+ADDED_COLUMNS = {
+    'emails': [
+        ('status', "TEXT NOT NULL DEFAULT 'generated'", "UPDATE emails SET status = 'sent' WHERE sent = 1"),
+        ('variant_group', "TEXT", None),
+        ('variant', "INTEGER", None),
+    ],
+}
+
+_local = threading.local()
+_initialized = set()
+_init_lock = threading.Lock()
+
+def get_connection(path=None) -> sqlite3.Connection:
+    """Return this thread's connection to the email database, creating it on first use."""
+    path = path or EMAIL_DB_FILE
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(path)
+    if conn is None:
+        conn = sqlite3.connect(path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with _init_lock:
+            if path not in _initialized:
+                _apply_added_columns(conn)
+                conn.executescript(SCHEMA)
+                _apply_search_schema(conn)
+                _initialized.add(path)
+        connections[path] = conn
+    return conn
+
+def _apply_added_columns(conn):
+    with conn:
+        for table, columns in ADDED_COLUMNS.items():
+            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if not existing:
+                continue
+            for name, definition, backfill in columns:
+                if name not in existing:
+                    conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+                    if backfill:
+                        conn.execute(backfill)
+
+def _apply_search_schema(conn):
+    try:
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'emails_fts'").fetchone() is None:
+                for statement in SEARCH_SCHEMA:
+                    conn.execute(statement)
+    except sqlite3.OperationalError as e:
+        # SQLite builds without FTS5 still store emails; only search is unavailable.
+        print(f"Full-text search index unavailable: {e}")
+
+def _email_values(email_data):
+    values = [email_data.get(column) for column in EMAIL_COLUMNS]
+    values[-1] = int(_as_bool(values[-1]))
+    return values
+
+def _as_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() == 'true'
+    return bool(value)
+
+def insert_emails(conn, rows):
+    placeholders = ", ".join("?" for _ in EMAIL_COLUMNS + VARIANT_COLUMNS)
+    sql = f"INSERT INTO emails ({', '.join(EMAIL_COLUMNS + VARIANT_COLUMNS)}, status) VALUES ({placeholders}, ?)"
+    ids = []
+    for row in rows:
+        values = _email_values(row)
+        status = 'sent' if values[-1] else 'generated'
+        ids.append(conn.execute(sql, values + [row.get(column) for column in VARIANT_COLUMNS] + [status]).lastrowid)
+    return ids
+
+def migrate_csv(csv_path, path=None) -> int:
+    """Import a legacy email_data.csv once; returns the number of rows imported."""
+    conn = get_connection(path)
+    if not os.path.isfile(csv_path):
+        return 0
+    marker = f"migrated:{os.path.abspath(csv_path)}"
+    with conn:
+        conn.execute("BEGIN IMMEDIATE")
+        if conn.execute("SELECT 1 FROM meta WHERE key = ?", (marker,)).fetchone():
+            return 0
+        imported = 0
+        with open(csv_path, 'r', newline='') as csvfile:
+            batch = []
+            for row in csv.DictReader(csvfile):
+                batch.append(row)
+                if len(batch) >= MIGRATION_BATCH_SIZE:
+                    imported += len(insert_emails(conn, batch))
+                    batch = []
+            imported += len(insert_emails(conn, batch))
+        conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (marker, str(imported)))
+    return imported
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] != "migrate":
+        sys.exit("usage: python -m api.storage migrate <email_data.csv>")
+    print(f"Imported {migrate_csv(sys.argv[2])} rows into {EMAIL_DB_FILE}")
@@ -0,0 +1,228 @@
+# Addresses and domains not to generate for or send to: opted out
+# ('suppressed'), bounced, or already sent to ('contacted'). The suppressions
+# table is the exact set; an in-memory Bloom filter in front of it answers
+# the common "never seen" case without touching the database.
+import hashlib
+import math
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from .storage import get_connection
+
+SUPPRESSION_ENABLED = os.getenv("SUPPRESSION_ENABLED", "true").lower() != "false"
+SUPPRESSION_BLOOM_ERROR_RATE = float(os.getenv("SUPPRESSION_BLOOM_ERROR_RATE", "0.001"))
+# Entries added by other processes reach this one's filter after at most this many seconds.
+SUPPRESSION_REFRESH_INTERVAL = float(os.getenv("SUPPRESSION_REFRESH_INTERVAL", "5"))
+SUPPRESSION_MIN_CAPACITY = 100_000
+
+# Strongest first: the reported reason for an address on several lists.
+SUPPRESSION_KINDS = ('suppressed', 'bounced', 'contacted')
+# Kinds that block even when recontacting is allowed.
+HARD_KINDS = ('suppressed', 'bounced')
+# Email events that add their recipient to the index, and as which kind.
+CONTACT_EVENTS = {'sent': 'contacted', 'bounced': 'bounced'}
+# Stays below SQLite's default limit on bound parameters.
+LOOKUP_BATCH_SIZE = 500
+BACKFILL_KEY = 'suppressions_backfilled'
+
+class RecipientSuppressed(ValueError):
+    def __init__(self, address: str, kind: str):
+        super().__init__(f"Recipient {address} is {kind}" if kind != 'contacted' else f"Recipient {address} has already been contacted")
+        self.address = address
+        self.kind = kind
+
+def normalize_address(address: str) -> str:
+    return address.strip().lower()
+
+def _keys(address: str) -> Tuple[str, ...]:
+    """The entries that match an address: itself and its domain ("@example.com")."""
+    domain = address.rpartition("@")[2]
+    return (address, f"@{domain}") if domain and domain != address else (address,)
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, with double hashing."""
+
+    def __init__(self, capacity: int, error_rate: float = SUPPRESSION_BLOOM_ERROR_RATE):
+        self.capacity = capacity
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, value: str):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(first + index * second) % self.size for index in range(self.hashes)]
+
+    def add(self, value: str):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+def insert_suppressions(conn, entries: Iterable[Tuple[str, str, Optional[str]]]) -> List[str]:
+    """Add (address, kind, reason) entries in the caller's transaction; returns the new addresses."""
+    now = time.time()
+    added = []
+    for address, kind, reason in entries:
+        address = normalize_address(address)
+        if not address:
+            continue
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO suppressions (address, kind, reason, created_at) VALUES (?, ?, ?, ?)",
+            (address, kind, reason, now),
+        )
+        if cursor.rowcount:
+            added.append(address)
+    suppression_index.remember(added)
+    return added
+
+def backfill_suppressions(conn) -> int:
+    """Add everyone the email log shows as sent to or bounced; safe to run again."""
+    now = time.time()
+    added = 0
+    with conn:
+        added += conn.execute(
+            "INSERT OR IGNORE INTO suppressions (address, kind, created_at) "
+            "SELECT DISTINCT lower(trim(recipient_email)), 'contacted', ? FROM emails WHERE sent = 1 AND coalesce(recipient_email, '') != ''",
+            (now,),
+        ).rowcount
+        for event, kind in CONTACT_EVENTS.items():
+            added += conn.execute(
+                "INSERT OR IGNORE INTO suppressions (address, kind, created_at) "
+                "SELECT DISTINCT lower(trim(coalesce(ev.recipient_email, e.recipient_email))), ?, ? "
+                "FROM email_events ev JOIN emails e ON e.id = ev.email_id "
+                "WHERE ev.event = ? AND coalesce(ev.recipient_email, e.recipient_email, '') != ''",
+                (kind, now, event),
+            ).rowcount
+        conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, '1') ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (BACKFILL_KEY,),
+        )
+    return added
+
+class SuppressionIndex:
+    """Membership checks against the suppressions table, screened by a Bloom filter.
+
+    A filter miss is definite; a hit is confirmed against the table, so
+    false positives and removed entries never block anyone.
+    """
+
+    def __init__(self, error_rate: float = SUPPRESSION_BLOOM_ERROR_RATE, refresh_interval: float = SUPPRESSION_REFRESH_INTERVAL):
+        self.error_rate = error_rate
+        self.refresh_interval = refresh_interval
+        self._bloom = None
+        self._last_id = 0
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.bloom_hits = 0
+        self.false_positives = 0
+
+    def _load(self):
+        conn = get_connection()
+        if conn.execute("SELECT 1 FROM meta WHERE key = ?", (BACKFILL_KEY,)).fetchone() is None:
+            backfill_suppressions(conn)
+        entries, last_id = conn.execute("SELECT COUNT(*), coalesce(MAX(id), 0) FROM suppressions").fetchone()
+        bloom = BloomFilter(max(SUPPRESSION_MIN_CAPACITY, entries * 2), self.error_rate)
+        for (address,) in conn.execute("SELECT address FROM suppressions WHERE id <= ?", (last_id,)):
+            bloom.add(address)
+        self._bloom, self._last_id, self._refreshed_at = bloom, last_id, time.monotonic()
+
+    def _refresh(self):
+        """Load the filter on first use, then pick up entries other processes added."""
+        with self._lock:
+            if self._bloom is None:
+                self._load()
+                return
+            if time.monotonic() - self._refreshed_at < self.refresh_interval:
+                return
+            rows = get_connection().execute("SELECT id, address FROM suppressions WHERE id > ? ORDER BY id", (self._last_id,)).fetchall()
+            for row in rows:
+                self._bloom.add(row['address'])
+            if rows:
+                self._last_id = rows[-1]['id']
+            self._refreshed_at = time.monotonic()
+            if self._bloom.count > self._bloom.capacity:
+                # Past its capacity the filter's error rate climbs; start over at twice the size.
+                self._load()
+
+    def remember(self, addresses: Iterable[str]):
+        """Add entries this process just wrote, without waiting for a refresh."""
+        with self._lock:
+            if self._bloom is not None:
+                for address in addresses:
+                    self._bloom.add(address)
+
+    def check(self, addresses: Iterable[str], allow_recontact: bool = False) -> Dict[str, str]:
+        """Return {address: kind} for the addresses that must be skipped."""
+        if not SUPPRESSION_ENABLED:
+            return {}
+        self._refresh()
+        bloom = self._bloom
+        candidates = {}
+        checked = 0
+        for address in addresses:
+            checked += 1
+            normalized = normalize_address(address)
+            keys = [key for key in _keys(normalized) if key in bloom]
+            if keys:
+                candidates[address] = keys
+        with self._lock:
+            self.checks += checked
+            self.bloom_hits += len(candidates)
+        if not candidates:
+            return {}
+        kinds = HARD_KINDS if allow_recontact else SUPPRESSION_KINDS
+        found = {}
+        keys = list({key for keys in candidates.values() for key in keys})
+        conn = get_connection()
+        for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+            chunk = keys[start:start + LOOKUP_BATCH_SIZE]
+            for row in conn.execute(f"SELECT address, kind FROM suppressions WHERE address IN ({','.join('?' * len(chunk))})", chunk):
+                found.setdefault(row['address'], set()).add(row['kind'])
+        blocked = {}
+        for address, keys in candidates.items():
+            matched = set().union(*(found.get(key, set()) for key in keys))
+            kind = next((kind for kind in kinds if kind in matched), None)
+            if kind:
+                blocked[address] = kind
+            elif not matched:
+                with self._lock:
+                    self.false_positives += 1
+        return blocked
+
+    def stats(self) -> Dict:
+        with self._lock:
+            bloom = self._bloom
+            return {
+                "enabled": SUPPRESSION_ENABLED,
+                "entries_indexed": bloom.count if bloom else 0,
+                "bloom_bytes": len(bloom.bits) if bloom else 0,
+                "bloom_capacity": bloom.capacity if bloom else 0,
+                "checks": self.checks,
+                "bloom_hits": self.bloom_hits,
+                "false_positives": self.false_positives,
+            }
+
+suppression_index = SuppressionIndex()
+
+def suppress(addresses: Iterable[str], reason: Optional[str] = None) -> List[str]:
+    """Opt addresses out; an entry without a local part ("example.com" or "@example.com") covers the whole domain.
+
+    Returns the entries that were not already suppressed.
+    """
+    entries = [(address if "@" in address else f"@{address.strip()}", 'suppressed', reason) for address in addresses]
+    conn = get_connection()
+    with conn:
+        return insert_suppressions(conn, entries)
+
+def unsuppress(address: str) -> bool:
+    """Remove an opt-out. The filter keeps its bits; lookups fall through to the table."""
+    address = normalize_address(address if "@" in address else f"@{address}")
+    conn = get_connection()
+    with conn:
+        return conn.execute("DELETE FROM suppressions WHERE address = ? AND kind = 'suppressed'", (address,)).rowcount > 0
@@ -1,50 +1,68 @@
-import csv
-import os
-from typing import Dict
+import threading
+from typing import Dict, List, Optional
+from .events import get_email_states, insert_events, record_email_event
+from .metrics import stage
+from .stats import ensure_stats, get_stat_totals, get_stats, rebuild_stats
+from .storage import get_connection, insert_emails, migrate_csv
+from .suppression import backfill_suppressions, suppression_index
 
 EMAIL_DATA_FILE = './email_data.csv'
-TEMP_EMAIL_DATA_FILE = './temp_email_data.csv'
-
-def save_email_data(email_data: Dict):
-    fieldnames = ['timestamp', 'user_email', 'recipient_email', 'recipient_name', 'recipient_company', 'recipient_role', 'email_type', 'specific_details', 'generated_subject', 'generated_body', 'sent']
-    file_exists = os.path.isfile(EMAIL_DATA_FILE)
-    
-    with open(EMAIL_DATA_FILE, 'a', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        
-        if not file_exists:
-            writer.writeheader()
-        
-        writer.writerow(email_data)
-
-def update_email_data(recipient_email: str, sent: bool = False):
-    fieldnames = ['timestamp', 'user_email', 'recipient_email', 'recipient_name', 'recipient_company', 'recipient_role', 'email_type', 'specific_details', 'generated_subject', 'generated_body', 'sent']
-    
-    with open(EMAIL_DATA_FILE, 'r') as csvfile, open(TEMP_EMAIL_DATA_FILE, 'w', newline='') as tempfile:
-        reader = csv.DictReader(csvfile)
-        writer = csv.DictWriter(tempfile, fieldnames=fieldnames)
-        writer.writeheader()
-        
-        for row in reader:
-            if row['recipient_email'] == '':
-                row['recipient_email'] = recipient_email
-                row['sent'] = str(sent)
-            writer.writerow(row)
-    
-    os.replace(TEMP_EMAIL_DATA_FILE, EMAIL_DATA_FILE)
+
+_migrated = False
+_migration_lock = threading.Lock()
+
+def get_email_connection():
+    """This thread's connection to the email database, with legacy CSV data migrated on first use."""
+    global _migrated
+    conn = get_connection()
+    if not _migrated:
+        with _migration_lock:
+            if not _migrated:
+                if migrate_csv(EMAIL_DATA_FILE):
+                    rebuild_stats()
+                    backfill_suppressions(conn)
+                else:
+                    ensure_stats()
+                _migrated = True
+    return conn
+
+def save_email_data(email_data: Dict) -> int:
+    return save_email_data_bulk([email_data])[0]
+
+def save_email_data_bulk(rows: List[Dict]) -> List[int]:
+    if not rows:
+        return []
+    conn = get_email_connection()
+    with stage("db_write"), conn:
+        email_ids = insert_emails(conn, rows)
+        insert_events(conn, [(email_id, 'generated', row.get('recipient_email') or None, None) for email_id, row in zip(email_ids, rows)])
+    return email_ids
+
+def update_email_data(email_id: int, sent: bool = False, recipient_email: Optional[str] = None, detail: Optional[str] = None):
+    get_email_connection()
+    with stage("db_event_write"):
+        record_email_event(email_id, 'sent' if sent else 'failed', recipient_email, detail)
+
+def get_email_drafts(email_ids: List[int]) -> Dict[int, Dict]:
+    """Stored emails by ID, with their current status; unknown IDs are left out."""
+    get_email_connection()
+    return get_email_states(email_ids)
+
+def check_recipients(recipient_emails: List[str], allow_recontact: bool = False) -> Dict[str, str]:
+    """Recipients to skip, as {address: 'suppressed' | 'bounced' | 'contacted'}."""
+    get_email_connection()
+    return suppression_index.check(recipient_emails, allow_recontact)
 
 def get_email_stats():
-    emails_generated = 0
-    emails_sent = 0
-    
-    if os.path.isfile(EMAIL_DATA_FILE):
-        with open(EMAIL_DATA_FILE, 'r') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                emails_generated += 1
-                if row['sent'] == 'True':
-                    emails_sent += 1
-    
+    get_email_connection()
+    totals = get_stat_totals()
+    emails_generated = totals.get('generated', 0)
+    emails_sent = totals.get('sent', 0)
+
     response_rate = (emails_sent / emails_generated * 100) if emails_generated > 0 else 0
-    
-    return emails_generated, emails_sent, f"{response_rate:.2f}%"
\ No newline at end of file
+
+    return emails_generated, emails_sent, f"{response_rate:.2f}%"
+
+def get_email_stats_breakdown(hours: int = 24, days: int = 30) -> Dict:
+    get_email_connection()
+    return get_stats(hours, days)
@@ -0,0 +1,47 @@
+"""Synthetic email_data.csv files in the legacy layout.
+
+    python -m benchmarks.datasets --rows 100000 --out /tmp/email_data.csv
+"""
+import argparse
+import csv
+import random
+from datetime import datetime, timedelta
+
+from api.storage import EMAIL_COLUMNS
+
+EMAIL_TYPES = ["Sales Pitch", "Networking Introduction", "Job Enquiry", "Event Invitation", "Job Application"]
+ROLES = ["CTO", "VP Engineering", "Head of Sales", "Recruiter", "Founder"]
+SENDERS = [f"sender{index}@example.com" for index in range(50)]
+BODY = "Hi there,\n\nI wanted to reach out about an opportunity that fits your team. " * 4
+
+def write_email_data(path, rows, seed=0, days=365):
+    """Write ``rows`` synthetic emails spread over the last ``days`` days; about a third are marked sent."""
+    rng = random.Random(seed)
+    start = datetime.now() - timedelta(days=days)
+    span_seconds = days * 24 * 3600
+    with open(path, "w", newline="") as csvfile:
+        writer = csv.writer(csvfile)
+        writer.writerow(EMAIL_COLUMNS)
+        for index in range(rows):
+            writer.writerow([
+                (start + timedelta(seconds=rng.randrange(span_seconds))).isoformat(),
+                rng.choice(SENDERS),
+                f"recipient{index}@example.com",
+                f"Recipient {index}",
+                f"Company {index % 5000}",
+                rng.choice(ROLES),
+                rng.choice(EMAIL_TYPES),
+                "Synthetic benchmark row",
+                f"Subject {index}",
+                BODY,
+                str(rng.random() < 0.33),
+            ])
+    return path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1000)
+    parser.add_argument("--out", default="email_data.csv")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(write_email_data(args.out, args.rows, args.seed))
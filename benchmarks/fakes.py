@@ -0,0 +1,148 @@
+"""Offline stand-ins for Groq and an SMTP server, shared by the benchmarks."""
+import asyncio
+import json
+import re
+import socketserver
+import threading
+import time
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from api import email_generator, email_sender, outbox
+from api.rate_limit import configure_llm_limiter
+
+EMAIL_ARGS = {
+    "subject": "Benchmark subject",
+    "body": "Benchmark body",
+    "greeting": "Hi",
+    "closing": "Best",
+    "tone": "professional",
+    "timestamp": "",
+}
+STREAM_CHUNK_CHARACTERS = 16
+VARIANTS_RE = re.compile(r"write (\d+) distinct variants")
+
+class FakeChatModel(BaseChatModel):
+    """Answers every prompt with the same email after ``latency`` seconds.
+
+    Works with structured output (tool calls), JSON streaming and plain text
+    chains, and reports token usage like the real provider.
+    """
+
+    latency: float = 0.0
+    tool_name: str = "EmailContent"
+
+    @property
+    def _llm_type(self):
+        return "fake"
+
+    def bind_tools(self, tools, **kwargs):
+        return self.copy(update={"tool_name": getattr(tools[0], "__name__", self.tool_name)})
+
+    def _tool_args(self, prompt):
+        if self.tool_name != "EmailVariants":
+            return EMAIL_ARGS
+        match = VARIANTS_RE.search(prompt)
+        count = int(match.group(1)) if match else 2
+        return {"variants": [{**EMAIL_ARGS, "subject": f"Benchmark subject {index}"} for index in range(count)]}
+
+    def _message(self, messages):
+        prompt = "".join(str(message.content) for message in messages)
+        prompt_tokens = len(prompt) // 4
+        return AIMessage(
+            content=json.dumps(EMAIL_ARGS),
+            tool_calls=[{"name": self.tool_name, "args": self._tool_args(prompt), "id": "call_0"}],
+            usage_metadata={"input_tokens": prompt_tokens, "output_tokens": 40, "total_tokens": prompt_tokens + 40},
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        return ChatResult(generations=[ChatGeneration(message=self._message(messages))])
+
+    def _chunks(self):
+        text = json.dumps(EMAIL_ARGS)
+        return [text[start:start + STREAM_CHUNK_CHARACTERS] for start in range(0, len(text), STREAM_CHUNK_CHARACTERS)]
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        time.sleep(self.latency)
+        for chunk in self._chunks():
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        for chunk in self._chunks():
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+
+def install_fake_model(latency):
+    email_generator.use_model(FakeChatModel(latency=latency))
+    # The fake model has no provider limits; measure the server, not the pacing.
+    for model_name in {*email_generator.GENERATION_MODELS, email_generator.FAST_MODEL_NAME, email_generator.PERSONALIZATION_MODEL_NAME}:
+        configure_llm_limiter(model_name, requests_per_minute=0, tokens_per_minute=0, max_concurrency=100_000)
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    def _reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.server.connections += 1
+        self._reply("220 benchmark sink")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip().upper()
+            if command.startswith("EHLO"):
+                self._reply("250-benchmark sink")
+                self._reply("250 AUTH PLAIN LOGIN")
+            elif command.startswith("AUTH"):
+                self._reply("235 Authentication successful")
+            elif command == "DATA":
+                self._reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                time.sleep(self.server.latency)
+                with self.server.lock:
+                    self.server.messages += 1
+                self._reply("250 Queued")
+            elif command == "QUIT":
+                self._reply("221 Bye")
+                return
+            else:
+                self._reply("250 OK")
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """A local SMTP server that accepts and counts every message."""
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, latency=0.0):
+        super().__init__(("127.0.0.1", 0), _SMTPHandler)
+        self.latency = latency
+        self.connections = 0
+        self.messages = 0
+        self.lock = threading.Lock()
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="smtp-sink", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+def use_smtp_sink(sink):
+    """Point the sender and the outbox at ``sink`` with no send rate limit."""
+    email_sender.close_smtp_pool()
+    email_sender.SMTP_SERVER, email_sender.SMTP_PORT = sink.server_address[0], str(sink.server_address[1])
+    email_sender.SENDER_EMAIL, email_sender.SENDER_PASSWORD = "benchmark@example.com", "benchmark"
+    email_sender.SMTP_STARTTLS = False
+    email_sender._smtp_pool = None
+    outbox.SMTP_RATE_LIMIT = 0
+    outbox._rate_limiters.clear()
@@ -0,0 +1,78 @@
+"""Concurrency load test for the generation endpoint.
+
+Runs /generate-email/ in-process against a fake chat model with a fixed
+latency, so no Groq key is needed. Compare the async path with the old
+blocking behaviour:
+
+    python -m benchmarks.load_test --requests 50 --latency 1.0
+    python -m benchmarks.load_test --requests 50 --latency 1.0 --blocking
+
+Requires httpx (installed alongside FastAPI's test client).
+"""
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+import httpx
+
+from api import email_generator, main
+from benchmarks.fakes import install_fake_model
+
+def use_blocking_generation():
+    async def blocking_generate(email_info, session_id=None):
+        return email_generator.generate_email(email_info, session_id)
+    main.agenerate_email = blocking_generate
+
+def email_request(i):
+    return {
+        "industry": "Software",
+        "recipient_info": {"name": f"Recipient {i}", "company": "Acme", "role": "CTO", "email": f"recipient{i}@example.com"},
+        "email_type": "Sales Pitch",
+        "specific_details": "Benchmark run",
+        "sender_name": "Sender",
+        "sender_email": "sender@example.com",
+        "sender_company": "ReachOut",
+        "sender_role": "Founder",
+    }
+
+async def run(requests, latency):
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+        start = time.perf_counter()
+        responses = await asyncio.gather(*(client.post("/generate-email/", json=email_request(i)) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    failures = sum(1 for response in responses if response.status_code != 200)
+    return {
+        "requests": requests,
+        "failures": failures,
+        "latency_s": latency,
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_s": round(requests / elapsed, 2),
+        "effective_concurrency": round(requests * latency / elapsed, 2) if latency else None,
+    }
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=1.0, help="fake LLM latency in seconds")
+    parser.add_argument("--blocking", action="store_true", help="call the synchronous generate_email inside the handler")
+    args = parser.parse_args()
+
+    install_fake_model(args.latency)
+    if args.blocking:
+        use_blocking_generation()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        result = asyncio.run(run(args.requests, args.latency))
+    result["mode"] = "blocking" if args.blocking else "async"
+    print(json.dumps(result, indent=2))
+
+if __name__ == "__main__":
+    main_cli()
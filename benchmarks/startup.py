@@ -0,0 +1,104 @@
+"""Cold-start benchmark for the API.
+
+Reports the `python -X importtime` cost of importing api.main, the
+slowest modules it pulls in, and the time from a fresh interpreter to the
+first /email-stats/ response. Fails (exit status 1) when a budget is
+exceeded or a module listed in --forbid is imported at startup:
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --max-import-ms 600 --max-first-response-ms 1500
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Heavy dependencies that only the generation path should load.
+DEFAULT_FORBIDDEN = ["langchain_groq", "langchain_core", "langchain_community", "PyPDF2"]
+
+FIRST_RESPONSE_SCRIPT = """
+import time
+start = time.perf_counter()
+from fastapi.testclient import TestClient
+from api.main import app
+response = TestClient(app).get("/email-stats/")
+response.raise_for_status()
+print((time.perf_counter() - start) * 1000)
+"""
+
+def _env():
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [REPO_ROOT, env.get("PYTHONPATH")]))
+    env.setdefault("GROQ_API_KEY", "benchmark")
+    return env
+
+def import_profile(workdir):
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import api.main"],
+        cwd=workdir, env=_env(), capture_output=True, text=True, check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        # Lines look like "import time:       412 |       1093 |   api.models".
+        if not line.startswith("import time:"):
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line[len("import time:"):].split("|")]
+        if not cumulative_us.isdigit():
+            continue
+        modules.append({"module": name, "self_us": int(self_us), "cumulative_us": int(cumulative_us)})
+    return modules
+
+def first_response_ms(workdir):
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_RESPONSE_SCRIPT],
+        cwd=workdir, env=_env(), capture_output=True, text=True, check=True,
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="take the best of this many runs")
+    parser.add_argument("--top", type=int, default=15, help="number of slowest modules to report")
+    parser.add_argument("--max-import-ms", type=float, help="fail if importing api.main takes longer")
+    parser.add_argument("--max-first-response-ms", type=float, help="fail if the first response takes longer")
+    parser.add_argument("--forbid", nargs="*", default=DEFAULT_FORBIDDEN, help="modules that must not be imported at startup")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        profiles = [import_profile(workdir) for _ in range(args.runs)]
+        first_responses = [first_response_ms(workdir) for _ in range(args.runs)]
+
+    def total_us(profile):
+        return next(module["cumulative_us"] for module in profile if module["module"] == "api.main")
+
+    profile = min(profiles, key=total_us)
+    imported = {module["module"] for module in profile}
+    forbidden = sorted(name for name in args.forbid if name in imported)
+    report = {
+        "import_ms": round(total_us(profile) / 1000, 1),
+        "first_response_ms": round(min(first_responses), 1),
+        "modules_imported": len(imported),
+        "forbidden_imported": forbidden,
+        "slowest_modules": [
+            {"module": module["module"], "cumulative_ms": round(module["cumulative_us"] / 1000, 1)}
+            for module in sorted(profile, key=lambda module: module["cumulative_us"], reverse=True)[:args.top]
+        ],
+    }
+    print(json.dumps(report, indent=2))
+
+    failures = []
+    if forbidden:
+        failures.append(f"heavy modules imported at startup: {', '.join(forbidden)}")
+    if args.max_import_ms is not None and report["import_ms"] > args.max_import_ms:
+        failures.append(f"import took {report['import_ms']}ms (budget {args.max_import_ms}ms)")
+    if args.max_first_response_ms is not None and report["first_response_ms"] > args.max_first_response_ms:
+        failures.append(f"first response took {report['first_response_ms']}ms (budget {args.max_first_response_ms}ms)")
+    if failures:
+        sys.exit("; ".join(failures))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""Offline benchmark suite: API latency, storage scaling and history memory.
+
+Everything runs locally against a fake chat model and an in-process SMTP
+sink, so no Groq key or mail server is needed. Results are printed as JSON
+(and written to --out) so runs can be compared:
+
+    python -m benchmarks.suite
+    python -m benchmarks.suite --only storage --sizes 1000 100000 1000000
+    python -m benchmarks.suite --requests 500 --concurrency 50 --latency 0.5 --out results.json
+
+Storage sizes each run in a fresh subprocess and working directory, so one
+size's database and caches never affect another's numbers.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+os.environ.setdefault("GROQ_API_KEY", "benchmark")
+
+SCENARIOS = ("api", "storage", "history")
+
+def summarize(samples):
+    """Latency summary in milliseconds for a list of durations in seconds."""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    percentile = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+        "p50_ms": round(percentile(0.50) * 1000, 3),
+        "p99_ms": round(percentile(0.99) * 1000, 3),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def email_request(index):
+    return {
+        "industry": "Software",
+        "recipient_info": {"name": f"Recipient {index}", "company": "Acme", "role": "CTO", "email": f"recipient{index}@example.com"},
+        "email_type": "Sales Pitch",
+        "specific_details": "Benchmark run",
+        "sender_name": "Sender",
+        "sender_email": "sender@example.com",
+        "sender_company": "ReachOut",
+        "sender_role": "Founder",
+    }
+
+async def _load(client, requests, concurrency, call):
+    """Run ``call(client, index)`` ``requests`` times, ``concurrency`` at a time."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    responses = []
+
+    async def one(index):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await call(client, index)
+            latencies.append(time.perf_counter() - start)
+            responses.append(response)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(index) for index in range(requests)))
+    elapsed = time.perf_counter() - start
+    return {
+        **summarize(latencies),
+        "failures": sum(1 for response in responses if response.status_code >= 400),
+        "requests_per_s": round(requests / elapsed, 2),
+    }, responses
+
+async def _api(requests, concurrency, latency, smtp_latency):
+    import httpx
+    from api import main
+    from api.outbox import get_outbox_counts
+    from benchmarks.fakes import SMTPSink, install_fake_model, use_smtp_sink
+
+    install_fake_model(latency)
+    sink = SMTPSink(smtp_latency).start()
+    use_smtp_sink(sink)
+    results = {"requests": requests, "concurrency": concurrency, "llm_latency_s": latency, "smtp_latency_s": smtp_latency}
+    try:
+        async with main.lifespan(main.app):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+                results["generate_email"], responses = await _load(
+                    client, requests, concurrency, lambda client, index: client.post("/generate-email/", json=email_request(index))
+                )
+                draft_ids = [response.json()["draft_id"] for response in responses if response.status_code == 200]
+                sent_before = sink.messages
+                drain_start = time.perf_counter()
+                results["send_draft"], _ = await _load(
+                    client, len(draft_ids), concurrency, lambda client, index: client.post(f"/send-email/{draft_ids[index]}")
+                )
+                results["send_email"], _ = await _load(
+                    client, requests, concurrency, lambda client, index: client.post("/send-email/", json=email_request(requests + index))
+                )
+                expected = len(draft_ids) + requests
+                while sink.messages - sent_before < expected:
+                    counts = await asyncio.to_thread(get_outbox_counts)
+                    if not counts["queued"] and not counts["sending"]:
+                        break
+                    await asyncio.sleep(0.05)
+                drained = time.perf_counter() - drain_start
+                results["outbox_drain"] = {
+                    "messages": sink.messages - sent_before,
+                    "elapsed_s": round(drained, 3),
+                    "messages_per_s": round((sink.messages - sent_before) / drained, 2),
+                    "smtp_connections": sink.connections,
+                }
+    finally:
+        sink.stop()
+    return results
+
+def run_api(requests, concurrency, latency, smtp_latency):
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        return asyncio.run(_api(requests, concurrency, latency, smtp_latency))
+
+def storage_worker(rows, repeat):
+    """Measure storage operations against a fresh ``rows``-row dataset in the current directory."""
+    from api import utils
+    from api.events import compact_email_events
+    from benchmarks.datasets import write_email_data
+
+    results = {"rows": rows}
+    start = time.perf_counter()
+    write_email_data(utils.EMAIL_DATA_FILE, rows)
+    results["write_csv_s"] = round(time.perf_counter() - start, 3)
+
+    start = time.perf_counter()
+    utils.get_email_stats()
+    results["first_use_with_migration_s"] = round(time.perf_counter() - start, 3)
+
+    results["get_email_stats"] = summarize(timed(utils.get_email_stats, repeat))
+    results["get_email_stats_breakdown"] = summarize(timed(utils.get_email_stats_breakdown, max(repeat // 5, 1)))
+    rng = random.Random(0)
+    results["update_email_data"] = summarize(timed(lambda: utils.update_email_data(rng.randrange(1, rows + 1), sent=True), repeat))
+    record = {
+        "timestamp": datetime.now().isoformat(), "user_email": "sender@example.com", "recipient_email": "new@example.com",
+        "recipient_name": "New", "recipient_company": "Acme", "recipient_role": "CTO", "email_type": "Sales Pitch",
+        "specific_details": "", "generated_subject": "Subject", "generated_body": "Body", "sent": False,
+    }
+    results["save_email_data"] = summarize(timed(lambda: utils.save_email_data(record), repeat))
+
+    start = time.perf_counter()
+    folded = compact_email_events()
+    results["compact_events"] = {"events": folded, "elapsed_s": round(time.perf_counter() - start, 3)}
+    results["db_bytes"] = sum(os.path.getsize(name) for name in os.listdir(".") if name.startswith("email_data.db"))
+    return results
+
+def run_storage(sizes, repeat):
+    results = {}
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as workdir:
+            env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [os.getcwd(), os.environ.get("PYTHONPATH")])))
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.suite", "--storage-worker", str(rows), "--repeat", str(repeat)],
+                cwd=workdir, env=env, capture_output=True, text=True, check=True,
+            ).stdout
+            results[str(rows)] = json.loads(output.strip().splitlines()[-1])
+    return results
+
+def run_history(session_counts, turns):
+    """Memory held by the conversation history store as sessions accumulate."""
+    from langchain_core.messages import AIMessage, HumanMessage
+    from api.history import SessionHistoryStore
+
+    results = []
+    for sessions in session_counts:
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        store = SessionHistoryStore()
+        for session in range(sessions):
+            history = store.get_history(f"session-{session}")
+            for turn in range(turns):
+                history.add_messages([
+                    HumanMessage(content=f"Generate an email for Software industry, CTO role, with details: turn {turn} " + "x" * 200),
+                    AIMessage(content=f"Generated email with subject: Subject {turn}"),
+                ])
+        held = tracemalloc.get_traced_memory()[0] - baseline
+        tracemalloc.stop()
+        results.append({
+            "sessions": sessions,
+            "turns_per_session": turns,
+            "sessions_kept": len(store),
+            "bytes": held,
+            "bytes_per_session_added": round(held / sessions),
+        })
+    return results
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", nargs="*", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.2, help="fake LLM latency in seconds")
+    parser.add_argument("--smtp-latency", type=float, default=0.0, help="SMTP sink delay per message in seconds")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[1000, 100000], help="dataset rows for the storage scenario")
+    parser.add_argument("--repeat", type=int, default=100, help="repetitions per storage operation")
+    parser.add_argument("--sessions", type=int, nargs="*", default=[100, 1000, 5000], help="session counts for the history scenario")
+    parser.add_argument("--turns", type=int, default=20, help="turns per session for the history scenario")
+    parser.add_argument("--out", help="also write the results to this JSON file")
+    parser.add_argument("--storage-worker", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.storage_worker is not None:
+        print(json.dumps(storage_worker(args.storage_worker, args.repeat)))
+        return
+
+    out = os.path.abspath(args.out) if args.out else None
+    results = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": {key: value for key, value in vars(args).items() if key not in ("out", "storage_worker")},
+        },
+    }
+    if "storage" in args.only:
+        results["storage"] = run_storage(args.sizes, args.repeat)
+    if "history" in args.only:
+        results["history"] = run_history(args.sessions, args.turns)
+    if "api" in args.only:
+        results["api"] = run_api(args.requests, args.concurrency, args.latency, args.smtp_latency)
+
+    report = json.dumps(results, indent=2)
+    print(report)
+    if out:
+        with open(out, "w") as f:
+            f.write(report + "\n")
+
+if __name__ == "__main__":
+    main_cli()
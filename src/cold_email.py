@@ -1,179 +1,32 @@
 import os
+import sys
+import uuid
 from dotenv import load_dotenv
 import streamlit as st
-from langchain_openai import ChatOpenAI
-from langchain_core.prompts.chat import ChatPromptTemplate
-from langchain_core.runnables import RunnablePassthrough
-from langchain_community.chat_message_histories import ChatMessageHistory
-from langchain_core.runnables.history import RunnableWithMessageHistory
-import PyPDF2
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from pydantic import BaseModel, Field
-from typing import Optional
-import csv
 from datetime import datetime
-import json
 
 # Load environment variables
 load_dotenv()
-from langchain_groq import ChatGroq
 
-# Initialize the Groq model
-AI_MODEL = ChatGroq(
-    model="llama3-groq-70b-8192-tool-use-preview",
-    temperature=0,
-    base_url="https://api.groq.com/"
-)
+# The shared API package lives one level up from this script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from api.email_generator import EMAIL_TEMPLATES, stream_email
+from api.documents import DOCUMENT_CACHE_MAX_ENTRIES, DocumentTooLarge, extract_pdf_text
+from api.email_sender import send_email
+from api.utils import save_email_data, update_email_data, get_email_stats
 
-# Configurable variables
-# AI_MODEL = ChatOpenAI(model_name="gpt-4o")
-SMTP_SERVER = os.getenv("SMTP_SERVER")
-SMTP_PORT = os.getenv("SMTP_PORT")
-SENDER_EMAIL = os.getenv("SENDER_EMAIL")
-SENDER_PASSWORD = os.getenv("SENDER_PASSWORD")
-EMAIL_DATA_FILE = './email_data.csv'
-TEMP_EMAIL_DATA_FILE = './email_data.csv'
+# Streamlit reruns this script on every interaction; these keep that rerun cheap.
+STATS_CACHE_TTL = int(os.getenv("STREAMLIT_STATS_TTL", "30"))
+DOCUMENT_CACHE_TTL = int(os.getenv("STREAMLIT_DOCUMENT_TTL", "3600"))
 
-EMAIL_TEMPLATES = {
-    "Sales Pitch": """
-        Create a persuasive sales email that highlights the value proposition for the recipient's industry. 
-        Focus on addressing pain points and offering solutions.
-    """,
-    "Networking Introduction": """
-        Craft a friendly networking email that establishes common ground and suggests a mutually beneficial connection.
-    """,
-    "Job Enquiry": """
-        Compose an engaging recruitment email that showcases the opportunity and appeals to the candidate's background and aspirations.
-    """,
-    "Event Invitation": """
-        Create a compelling invitation email that highlights the value of attending the event and encourages participation.
-    """,
-    "Job Application": """
-        Write a professional job application email that highlights the applicant's qualifications, experience, and enthusiasm for the role.
-    """,
-}
+@st.cache_data(ttl=STATS_CACHE_TTL)
+def load_email_stats():
+    return get_email_stats()
 
-class EmailContent(BaseModel):
-    """Structured email content."""
-    subject: str = Field(description="The subject line of the email")
-    body: str = Field(description="The main content of the email")
-    greeting: str = Field(description="The greeting or salutation of the email")
-    closing: str = Field(description="The closing or signature of the email")
-    tone: Optional[str] = Field(default=None, description="The overall tone of the email")
-
-EMAIL_GENERATION_INSTRUCTIONS = """
-    You are ReachOut AI, an AI-powered email generator designed to craft personalized cold outreach emails.
-
-    You will be provided with the following information:
-    - Industry: {industry}
-    - Recipient Role: {recipient_role}
-    - Company/Personal Details: {details}
-    - Email Purpose: {purpose}
-    - Email Type: {email_type}
-    - Tone: {tone}
-    - Word Limit: {word_limit}
-    - Previous conversation: {chat_history}
-    - Uploaded Document Content: {uploaded_content}
-    - Sender Name: {sender_name}
-    - Sender Email: {sender_email}
-    - Sender Company: {sender_company}
-    - Sender Role: {sender_role}
-
-    To generate the most effective email, follow these steps:
-
-    1. Analyze the provided information, including the uploaded document content if available. make use of the uploaded content to make the email more personal if its a available.
-    2. Choose the appropriate email structure.
-    3. Craft the email content, incorporating relevant details from the uploaded document if provided.
-    4. Refine the email.
-    5. Perform final checks.
-
-    Based on this process, craft the email content according to the following template:
-    {template}
-    
-    Generate the email content without any explanations or additional suggestions.
-    
-    format the output in json format in the following format:
-    {{
-        "subject": "...",
-        "body": "...",
-        "greeting": "...",
-        "closing": "...",
-        "tone": "..."
-    }}
-"""
-
-email_template = ChatPromptTemplate.from_messages([
-    ("system", EMAIL_GENERATION_INSTRUCTIONS)
-])
-
-email_generation_chain = email_template | AI_MODEL.with_structured_output(EmailContent)
-
-conversation_history = ChatMessageHistory()
-
-email_generator_with_history = RunnableWithMessageHistory(
-    email_generation_chain,
-    lambda session_id: conversation_history,
-    input_messages_key="user_input",
-    history_messages_key="chat_history",
-)
-
-def read_pdf(file):
-    pdf_reader = PyPDF2.PdfReader(file)
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text()
-    return text
-
-def generate_email(email_info, session_id="email_session"):
-    return email_generator_with_history.invoke(
-        {
-            "industry": email_info["industry"],
-            "recipient_role": email_info["recipient_role"],
-            "details": email_info["details"],
-            "purpose": email_info["purpose"],
-            "email_type": email_info["email_type"],
-            "tone": email_info["tone"],
-            "word_limit": email_info["word_limit"] if email_info["word_limit"] else "No limit",
-            "template": EMAIL_TEMPLATES.get(email_info["email_type"], ""),
-            "uploaded_content": email_info.get("uploaded_content", "No uploaded content"),
-            "sender_name": email_info["sender_name"],
-            "sender_email": email_info["sender_email"],
-            "sender_company": email_info["sender_company"],
-            "sender_role": email_info["sender_role"],
-            "user_input": f"Generate an email for {email_info['industry']} industry, {email_info['recipient_role']} role, with details: {email_info['details']}, purpose: {email_info['purpose']}, type: {email_info['email_type']}, tone: {email_info['tone']}, word limit: {email_info['word_limit'] if email_info['word_limit'] else 'No limit'}"
-        },
-        {"configurable": {"session_id": session_id}}
-    )
-
-def save_email_data(email_data):
-    fieldnames = ['timestamp', 'user_email', 'recipient_email', 'recipient_name', 'recipient_company', 'recipient_role', 'email_type', 'specific_details', 'generated_subject', 'generated_body', 'sent']
-    file_exists = os.path.isfile(EMAIL_DATA_FILE)
-    
-    with open(EMAIL_DATA_FILE, 'a', newline='') as csvfile:
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        
-        if not file_exists:
-            writer.writeheader()
-        
-        writer.writerow(email_data)
-
-def get_email_stats():
-    emails_generated = 0
-    emails_sent = 0
-    
-    if os.path.isfile(EMAIL_DATA_FILE):
-        with open(EMAIL_DATA_FILE, 'r') as csvfile:
-            reader = csv.DictReader(csvfile)
-            for row in reader:
-                emails_generated += 1
-                if row['sent'] == 'True':
-                    emails_sent += 1
-    
-    response_rate = (emails_sent / emails_generated * 100) if emails_generated > 0 else 0
-    
-    return emails_generated, emails_sent, f"{response_rate:.2f}%"
+@st.cache_data(ttl=DOCUMENT_CACHE_TTL, max_entries=DOCUMENT_CACHE_MAX_ENTRIES)
+def parse_pdf(file_id, _data):
+    # Keyed by the upload's ID, so reruns skip hashing the file bytes
+    return extract_pdf_text(_data)
 
 def main():
     st.set_page_config(page_title="ReachOut AI", page_icon="️", layout="wide")
@@ -207,6 +60,8 @@ def main():
         st.session_state.current_step = "home"
     if 'uploaded_content' not in st.session_state:
         st.session_state.uploaded_content = None
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = str(uuid.uuid4())
     
     st.title("ReachOut AI")
     
@@ -230,14 +85,15 @@ def display_home_page():
     
     # Add a dashboard or overview here
     st.subheader("Performance Metrics")
-    emails_generated, emails_sent, response_rate = get_email_stats()
+    emails_generated, emails_sent, send_rate = load_email_stats()
     col1, col2, col3 = st.columns(3)
     with col1:
         st.metric("Total Emails Generated", emails_generated)
     with col2:
         st.metric("Emails Successfully Sent", emails_sent)
     with col3:
-        st.metric("Current Response Rate", response_rate)
+        # Sent / generated; replies are not tracked
+        st.metric("Send Rate", send_rate)
     
     if st.button("Start Email Creation"):
         st.session_state.current_step = "registration"
@@ -285,7 +141,10 @@ def display_personalize_page():
     uploaded_file = st.file_uploader("Upload your resume or any pertinent document", type=["pdf", "docx"])
     if uploaded_file is not None:
         if uploaded_file.type == "application/pdf":
-            st.session_state.uploaded_content = read_pdf(uploaded_file)
+            try:
+                st.session_state.uploaded_content = parse_pdf(uploaded_file.file_id, uploaded_file.getvalue())
+            except DocumentTooLarge as e:
+                st.error(str(e))
         else:
             st.warning("Document processing for non-PDF files is currently not supported.")
     
@@ -319,12 +178,13 @@ def display_generate_page():
     if st.button("Generate Email"):
         email_info = {
             "industry": st.session_state.user_info.get('industry', ''),
-            "recipient_role": recipient_role,
-            "details": f"Recipient: {recipient_name}, Company: {recipient_company}, Role: {recipient_role}. Additional details: {specific_details}",
-            "purpose": email_type,
+            "recipient_info": {
+                "name": recipient_name,
+                "company": recipient_company,
+                "role": recipient_role
+            },
             "email_type": email_type,
-            "tone": "professional",
-            "word_limit": "",
+            "specific_details": specific_details,
             "uploaded_content": st.session_state.uploaded_content or "No uploaded content",
             "sender_name": st.session_state.user_info.get('name', ''),
             "sender_email": st.session_state.user_info.get('email', ''),
@@ -332,8 +192,22 @@ def display_generate_page():
             "sender_role": st.session_state.user_info.get('role', '')
         }
         try:
-            generated_email = generate_email(email_info)
-            print(generated_email)
+            # Render the subject and body as they stream in
+            subject_placeholder = st.empty()
+            body_placeholder = st.empty()
+            streamed = {"subject": "", "body": ""}
+            generated_email = None
+            for event, value in stream_email(email_info, session_id=st.session_state.session_id):
+                if event == "email":
+                    generated_email = value
+                    continue
+                streamed[event] += value
+                if event == "subject":
+                    subject_placeholder.markdown(f"**Subject:** {streamed['subject']}")
+                else:
+                    body_placeholder.text(streamed["body"].replace("\\n", "\n"))
+            subject_placeholder.empty()
+            body_placeholder.empty()
             st.session_state.generated_email = generated_email
             
             # Save email data
@@ -350,7 +224,8 @@ def display_generate_page():
                 'generated_body': generated_email.body,
                 'sent': False
             }
-            save_email_data(email_data)
+            st.session_state.generated_email_id = save_email_data(email_data)
+            load_email_stats.clear()
             
             # Display the generated email content
             st.subheader("Generated Email Content")
@@ -381,7 +256,8 @@ def display_send_page():
         if send_email(recipient_email, generated_email):
             st.success("Email sent successfully!")
             # Update email data
-            update_email_data(recipient_email, sent=True)
+            update_email_data(st.session_state.generated_email_id, sent=True, recipient_email=recipient_email)
+            load_email_stats.clear()
         else:
             st.error("Failed to send email. Please check your settings and try again.")
     
@@ -389,40 +265,5 @@ def display_send_page():
         st.session_state.current_step = "home"
         st.rerun()
 
-def send_email(to_email, email_content):
-    try:
-        message = MIMEMultipart()
-        message["From"] = SENDER_EMAIL
-        message["To"] = to_email
-        message["Subject"] = email_content.subject
-        content = email_content.body.replace("\\n", "\n")
-        body = f"{content}"
-        message.attach(MIMEText(body, "plain"))
-
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(SENDER_EMAIL, SENDER_PASSWORD)
-            server.send_message(message)
-        return True
-    except Exception as e:
-        print(f"Error sending email: {e}")
-        return False
-
-def update_email_data(recipient_email, sent=False):
-    fieldnames = ['timestamp', 'user_email', 'recipient_email', 'recipient_name', 'recipient_company', 'recipient_role', 'email_type', 'specific_details', 'generated_subject', 'generated_body', 'sent']
-    
-    with open(EMAIL_DATA_FILE, 'r') as csvfile, open(TEMP_EMAIL_DATA_FILE, 'w', newline='') as tempfile:
-        reader = csv.DictReader(csvfile)
-        writer = csv.DictWriter(tempfile, fieldnames=fieldnames)
-        writer.writeheader()
-        
-        for row in reader:
-            if row['recipient_email'] == '':
-                row['recipient_email'] = recipient_email
-                row['sent'] = str(sent)
-            writer.writerow(row)
-    
-    os.replace(TEMP_EMAIL_DATA_FILE, EMAIL_DATA_FILE)
-
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,16 @@
+import pytest
+from api import storage, utils
+
+@pytest.fixture
+def emails(tmp_path, monkeypatch):
+    """A fresh email database; returns a function saving ``count`` emails and their IDs."""
+    monkeypatch.setattr(storage, "EMAIL_DB_FILE", str(tmp_path / "emails.db"))
+    monkeypatch.setattr(utils, "EMAIL_DATA_FILE", str(tmp_path / "missing.csv"))
+
+    def save(count, **fields):
+        return utils.save_email_data_bulk([
+            {"timestamp": "2026-01-01T00:00:00", "user_email": "me@example.com", "recipient_email": f"r{index}@example.com",
+             "email_type": "Sales Pitch", "generated_subject": "Hello", "generated_body": "cloud platform", **fields}
+            for index in range(count)
+        ])
+    return save
@@ -0,0 +1,36 @@
+import os
+import pytest
+from api import analytics
+
+pytest.importorskip("pyarrow")
+
+def _generated(directory):
+    return sum(row["generated"] for row in analytics.query_analytics([], directory=directory))
+
+def test_queries_only_read_what_was_exported(emails, tmp_path):
+    directory = str(tmp_path / "analytics")
+    emails(3)
+    assert _generated(directory) == 0
+    assert not os.path.exists(directory)
+    assert analytics.export_analytics(directory)["emails"] == 3
+    emails(2)
+    assert _generated(directory) == 3
+
+def test_export_grows_the_tail_part_until_it_is_full(emails, tmp_path):
+    directory = str(tmp_path / "analytics")
+    emails(3)
+    analytics.export_analytics(directory, batch_size=4)
+    assert analytics.export_analytics(directory, batch_size=4)["emails"] == 0
+    emails(3)
+    assert analytics.export_analytics(directory, batch_size=4)["emails"] == 3
+    parts = sorted(name for name in os.listdir(os.path.join(directory, "emails")) if not name.startswith("."))
+    assert parts == ["part-000000000001-000000000004.parquet", "part-000000000005-000000000006.parquet"]
+    assert _generated(directory) == 6
+
+def test_exporter_stops_when_analytics_are_unavailable(monkeypatch):
+    def unavailable(directory):
+        raise analytics.AnalyticsUnavailable("no pyarrow")
+    monkeypatch.setattr(analytics, "export_analytics", unavailable)
+    exporter = analytics.AnalyticsExporter(interval=60, directory="unused").start()
+    exporter._thread.join(timeout=5)
+    assert not exporter._thread.is_alive()
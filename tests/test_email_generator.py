@@ -0,0 +1,50 @@
+import asyncio
+import pytest
+from api import email_generator
+from api.cache import GenerationCache
+from api.models import EmailContent
+from api.rate_limit import configure_llm_limiter
+from api.routing import ModelRouter
+from api.storage import get_connection
+
+EMAIL_INFO = {
+    "industry": "Software", "recipient_info": {"name": "Ada", "company": "Acme", "role": "CTO"},
+    "specific_details": "cloud migration", "email_type": "Sales Pitch", "sender_name": "Sam",
+    "sender_email": "sam@example.com", "sender_company": "Reachout", "sender_role": "AE",
+}
+
+class Chain:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = 0
+
+    async def ainvoke(self, chain_input):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("model down")
+        return EmailContent(subject="Hello", body="Body", greeting="Hi", closing="Best", tone="professional", timestamp="")
+
+@pytest.fixture
+def generator(emails, monkeypatch):
+    for name in ("cache-a", "cache-b"):
+        configure_llm_limiter(name, requests_per_minute=0, tokens_per_minute=0, max_concurrency=1000, max_retries=0)
+    chains = {"cache-a": Chain(fail=True), "cache-b": Chain()}
+    monkeypatch.setattr(email_generator, "model_router", ModelRouter(hedge=False))
+    monkeypatch.setattr(email_generator, "get_email_generation_chain", chains.__getitem__)
+    monkeypatch.setattr(email_generator, "generation_cache", GenerationCache(enabled=True))
+    return chains
+
+def test_cache_records_the_model_that_answered(generator, monkeypatch):
+    monkeypatch.setattr(email_generator, "model_route", lambda email_info: ["cache-a", "cache-b"])
+    asyncio.run(email_generator.agenerate_email(EMAIL_INFO, session_id="cache-model"))
+    models = [row[0] for row in get_connection().execute("SELECT model FROM generation_cache")]
+    assert models == ["cache-b"]
+    asyncio.run(email_generator.agenerate_email(EMAIL_INFO, session_id="cache-model"))
+    assert generator["cache-b"].calls == 1
+
+def test_cache_is_not_shared_across_routes(generator, monkeypatch):
+    monkeypatch.setattr(email_generator, "model_route", lambda email_info: ["cache-b"])
+    asyncio.run(email_generator.agenerate_email(EMAIL_INFO, session_id="cache-route"))
+    monkeypatch.setattr(email_generator, "model_route", lambda email_info: ["cache-a", "cache-b"])
+    asyncio.run(email_generator.agenerate_email(EMAIL_INFO, session_id="cache-route"))
+    assert generator["cache-b"].calls == 2
@@ -0,0 +1,26 @@
+import smtplib
+from api import outbox
+from api.storage import get_connection
+
+def _send_fails(emails, error):
+    email_id = emails(1)[0]
+    outbox.enqueue_emails([email_id])
+    job = outbox.claim_jobs()[0]
+    outbox.finish_job(job, error)
+    status = get_connection().execute("SELECT status FROM outbox WHERE id = ?", (job['id'],)).fetchone()[0]
+    events = [row[0] for row in get_connection().execute("SELECT event FROM email_events WHERE email_id = ? ORDER BY id", (email_id,))]
+    return status, events
+
+def test_greylisted_recipient_is_retried(emails):
+    error = smtplib.SMTPRecipientsRefused({"r0@example.com": (450, b"Greylisted, try again later")})
+    assert not outbox.is_permanent_failure(error)
+    assert _send_fails(emails, error) == ("queued", ["generated", "queued"])
+
+def test_rejected_recipient_bounces(emails):
+    error = smtplib.SMTPRecipientsRefused({"r0@example.com": (550, b"No such user")})
+    assert outbox.is_permanent_failure(error)
+    assert _send_fails(emails, error) == ("dead", ["generated", "queued", "bounced"])
+
+def test_partly_greylisted_refusal_is_retried():
+    error = smtplib.SMTPRecipientsRefused({"a@example.com": (550, b"No such user"), "b@example.com": (451, b"Try later")})
+    assert not outbox.is_permanent_failure(error)
@@ -0,0 +1,24 @@
+from api.relevance import estimate_tokens, select_context, split_chunks
+
+def test_unpunctuated_lines_are_chunked():
+    text = "\n".join(f"- bullet point number {index} about cloud data pipelines" for index in range(2000))
+    chunks = split_chunks(text, 120)
+    assert len(chunks) > 1
+    assert max(estimate_tokens(chunk) for chunk in chunks) <= 125
+
+def test_long_unbroken_text_keeps_some_context():
+    for text in ("\n".join(f"- bullet point number {index} about cloud data pipelines" for index in range(2000)), "word " * 12000):
+        context, summary = select_context(text, "cloud data", budget=2000, chunk_tokens=120)
+        assert context
+        assert 0 < summary["selected_tokens"] <= 2000
+
+def test_single_huge_word_is_split():
+    chunks = split_chunks("x" * 5000, 120)
+    assert all(estimate_tokens(chunk) <= 120 for chunk in chunks)
+    assert "".join(chunks) == "x" * 5000
+
+def test_budget_below_chunk_size_truncates_best_chunk():
+    text = "alpha beta gamma. " * 400
+    context, summary = select_context(text, "gamma", budget=10, chunk_tokens=120)
+    assert context
+    assert summary["selected_tokens"] <= 10
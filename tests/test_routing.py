@@ -0,0 +1,172 @@
+import asyncio
+import time
+import pytest
+from api import email_generator
+from api.models import EmailContent
+from api.rate_limit import configure_llm_limiter
+from api.routing import CircuitBreaker, ModelRouter, ModelsUnavailable
+
+def _unlimited(*names):
+    for name in names:
+        configure_llm_limiter(name, requests_per_minute=0, tokens_per_minute=0, max_concurrency=1000, max_retries=0)
+
+def _model(log, seconds=0.0, fail=False, cancelled=None):
+    def call_for(name):
+        async def call():
+            log.append(name)
+            try:
+                await asyncio.sleep(seconds)
+            except asyncio.CancelledError:
+                if cancelled is not None:
+                    cancelled.append(name)
+                raise
+            if fail:
+                raise RuntimeError(f"{name} failed")
+            return name
+        return call
+    return call_for
+
+def _route(models):
+    """A call_for dispatching each model name to its own fake."""
+    return lambda name: models[name](name)
+
+async def _warm(router, name, calls=3):
+    for _ in range(calls):
+        await router.acall([name], _model([], 0.01))
+
+def test_slow_call_is_hedged_and_the_loser_cancelled():
+    _unlimited("hedge-a", "hedge-b")
+    router = ModelRouter(hedge=True, min_samples=3)
+    log, cancelled = [], []
+
+    async def run():
+        await _warm(router, "hedge-a")
+        start = time.perf_counter()
+        result = await router.acall(["hedge-a", "hedge-b"], _route({
+            "hedge-a": _model(log, 2, cancelled=cancelled), "hedge-b": _model(log, 0.01),
+        }))
+        await asyncio.sleep(0)
+        return result, time.perf_counter() - start
+
+    result, elapsed = asyncio.run(run())
+    assert result == "hedge-b" and elapsed < 1
+    assert log == ["hedge-a", "hedge-b"] and cancelled == ["hedge-a"]
+    stats = router.stats()
+    assert stats["hedge-a"]["hedges"] == 1 and stats["hedge-b"]["hedge_wins"] == 1
+
+def test_hedge_skips_open_breakers_before_checking_saturation(monkeypatch):
+    _unlimited("skip-a", "skip-b", "skip-c")
+    router = ModelRouter(hedge=True, min_samples=3)
+    for _ in range(router._model("skip-b")[0].failures):
+        router.record("skip-b", error=True)
+    checked = []
+
+    def saturated(name):
+        checked.append(name)
+        return name == "skip-c"
+    monkeypatch.setattr(router, "_saturated", saturated)
+    log = []
+
+    async def run():
+        await _warm(router, "skip-a")
+        return await router.acall(["skip-a", "skip-b", "skip-c"], _route({
+            "skip-a": _model(log, 0.2), "skip-b": _model(log), "skip-c": _model(log),
+        }))
+
+    assert asyncio.run(run()) == "skip-a"
+    assert checked == ["skip-c"] and log == ["skip-a"]
+    assert router.stats()["skip-a"]["hedges"] == 0
+
+def test_failure_falls_back_without_relaunching_the_failed_model():
+    _unlimited("fallback-a", "fallback-b")
+    router = ModelRouter(hedge=True, min_samples=3)
+    log = []
+
+    async def run():
+        await _warm(router, "fallback-a")
+        # The fallback outlasts the failed call's hedge deadline.
+        return await router.acall(["fallback-a", "fallback-b"], _route({
+            "fallback-a": _model(log, fail=True), "fallback-b": _model(log, 0.2),
+        }))
+
+    assert asyncio.run(run()) == "fallback-b"
+    assert log == ["fallback-a", "fallback-b"]
+    stats = router.stats()
+    assert stats["fallback-a"]["fallbacks"] == 1 and stats["fallback-a"]["hedges"] == 0
+
+def test_every_model_failing_raises_the_last_error():
+    _unlimited("failing-a", "failing-b")
+    router = ModelRouter(hedge=False)
+    with pytest.raises(RuntimeError, match="failing-b failed"):
+        asyncio.run(router.acall(["failing-a", "failing-b"], _model([], fail=True)))
+
+def test_breaker_opens_then_lets_one_trial_through():
+    breaker = CircuitBreaker(failures=2, reset=0.05)
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+    time.sleep(0.06)
+    assert breaker.allow() and breaker.state == "half_open"
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.times_opened == 2
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+def test_cancelled_trial_releases_the_breaker():
+    breaker = CircuitBreaker(failures=1, reset=60)
+    breaker.record_failure()
+    breaker.opened_at -= 60
+    assert breaker.allow() and breaker.state == "half_open"
+    breaker.release()
+    assert breaker.state == "open" and breaker.allow()
+
+def test_open_breakers_are_skipped():
+    _unlimited("open-a", "open-b")
+    router = ModelRouter(hedge=False)
+    for _ in range(router._model("open-a")[0].failures):
+        router.record("open-a", error=True)
+    log = []
+    assert asyncio.run(router.acall(["open-a", "open-b"], _model(log))) == "open-b"
+    assert log == ["open-b"]
+    for _ in range(router._model("open-b")[0].failures):
+        router.record("open-b", error=True)
+    with pytest.raises(ModelsUnavailable):
+        asyncio.run(router.acall(["open-a", "open-b"], _model(log)))
+
+def test_hedged_generation_writes_history_once(monkeypatch):
+    _unlimited("history-a", "history-b")
+    router = ModelRouter(hedge=True, min_samples=3)
+    prompts = []
+
+    class Chain:
+        def __init__(self, seconds):
+            self.seconds = seconds
+
+        async def ainvoke(self, chain_input):
+            prompts.append(list(chain_input["chat_history"]))
+            await asyncio.sleep(self.seconds)
+            return EmailContent(subject="Hello", body="Body", greeting="Hi", closing="Best", tone="professional", timestamp="")
+
+    chains = {"history-a": Chain(1), "history-b": Chain(0.01)}
+    monkeypatch.setattr(email_generator, "model_router", router)
+    monkeypatch.setattr(email_generator, "model_route", lambda email_info: ["history-a", "history-b"])
+    monkeypatch.setattr(email_generator, "get_email_generation_chain", chains.__getitem__)
+    monkeypatch.setattr(email_generator.generation_cache, "enabled", False)
+    email_info = {
+        "industry": "Software", "recipient_info": {"name": "Ada", "company": "Acme", "role": "CTO"},
+        "specific_details": "cloud migration", "email_type": "Sales Pitch", "sender_name": "Sam",
+        "sender_email": "sam@example.com", "sender_company": "Reachout", "sender_role": "AE",
+    }
+
+    async def run():
+        await _warm(router, "history-a")
+        return await email_generator.agenerate_email(email_info, session_id="hedged-history")
+
+    assert asyncio.run(run()).subject == "Hello"
+    assert prompts == [[], []]
+    history = email_generator.get_history_store().get_history("hedged-history")
+    assert [message.type for message in history.messages] == ["human", "ai"]
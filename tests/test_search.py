@@ -0,0 +1,30 @@
+import pytest
+from api import search
+
+@pytest.fixture(autouse=True)
+def rank_window(monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_RANK_WINDOW", 10)
+
+def test_filters_apply_before_the_window(emails):
+    emails(3, email_type="Referral", generated_body="cloud referral")
+    emails(20)
+    results, has_more, truncated = search.search_emails("cloud", email_type="Referral")
+    assert len(results) == 3
+    assert not has_more and not truncated
+
+def test_paging_past_the_window(emails):
+    ids = emails(25)
+    seen = []
+    offset = 0
+    while True:
+        results, has_more, truncated = search.search_emails("cloud", limit=7, offset=offset)
+        seen += [result["id"] for result in results]
+        if not has_more:
+            break
+        offset += 7
+    assert sorted(seen) == ids
+
+def test_truncated_when_older_matches_are_not_ranked(emails):
+    emails(25)
+    results, has_more, truncated = search.search_emails("cloud", limit=5)
+    assert len(results) == 5 and has_more and truncated
@@ -0,0 +1,84 @@
+import smtplib
+import pytest
+from api.smtp_pool import SMTPConnectionPool
+
+class FakeSMTP:
+    def __init__(self):
+        self.error = None
+        self.error_after_data = False
+        self.closed = False
+
+    def send_message(self, message):
+        self.sent_data = self.error_after_data
+        if self.error is not None:
+            raise self.error
+        return {}
+
+    def noop(self):
+        return (250, b"OK")
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = SMTPConnectionPool("smtp.example.com", 587, size=1)
+    pool.servers = []
+
+    def connect():
+        pool.servers.append(FakeSMTP())
+        return pool.servers[-1]
+    monkeypatch.setattr(pool, "_connect", connect)
+    return pool
+
+@pytest.mark.parametrize("error", [
+    smtplib.SMTPRecipientsRefused({"a@example.com": (550, b"No such user")}),
+    smtplib.SMTPDataError(552, b"Message too large"),
+    smtplib.SMTPSenderRefused(553, b"Sender rejected", "me@example.com"),
+])
+def test_message_errors_keep_the_session(pool, error):
+    with pytest.raises(type(error)):
+        with pool.connection() as server:
+            server.error = error
+            server.send_message(None)
+    server.error = None
+    pool.send_message(None)
+    assert len(pool.servers) == 1 and not server.closed
+
+@pytest.mark.parametrize("error", [
+    smtplib.SMTPServerDisconnected("gone"),
+    smtplib.SMTPResponseException(421, b"Closing connection"),
+    smtplib.SMTPRecipientsRefused({"a@example.com": (421, b"Closing connection")}),
+    ConnectionResetError(),
+])
+def test_connection_errors_discard_the_session(pool, error):
+    with pytest.raises(type(error)):
+        with pool.connection() as server:
+            server.error = error
+            server.send_message(None)
+    pool.send_message(None)
+    assert len(pool.servers) == 2 and server.closed
+
+def _drops_once(pool, after_data):
+    def connect():
+        server = FakeSMTP()
+        if not pool.servers:
+            server.error = smtplib.SMTPServerDisconnected("gone")
+            server.error_after_data = after_data
+        pool.servers.append(server)
+        return server
+    pool._connect = connect
+
+def test_disconnect_before_data_is_retried(pool):
+    _drops_once(pool, after_data=False)
+    assert pool.send_message(None) == {}
+    assert len(pool.servers) == 2
+
+def test_disconnect_after_data_is_not_retried(pool):
+    _drops_once(pool, after_data=True)
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        pool.send_message(None)
+    assert len(pool.servers) == 1